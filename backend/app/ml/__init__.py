@@ -0,0 +1 @@
+# ML package
@@ -0,0 +1,16 @@
+"""Detection settings, mirroring ``ML_CONFIG`` in lib/ml/constants.ts."""
+import os
+
+MODEL_PATH = os.getenv("DETECTION_MODEL_PATH", "../public/models/yolov8n.onnx")
+CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.5"))
+NMS_IOU_THRESHOLD = 0.45
+MODEL_INPUT_SIZE = 640
+
+# Detection classes (we only support car and bike)
+CLASS_NAMES = ["car", "bike"]
+
+# The stock COCO export has 80 classes; fold the vehicle ones onto ours
+COCO_CLASS_MAP = {1: "bike", 2: "car", 3: "bike"}
+
+# Boxes smaller than this (pixels, either side) are dropped, as on the client
+MIN_BOX_SIZE = 10
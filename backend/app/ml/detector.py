@@ -0,0 +1,81 @@
+"""CPU vehicle detection with YOLOv8 on onnxruntime.
+
+Server-side counterpart of lib/ml/yoloInference.ts: same model, same
+letterboxed 640x640 input, confidence threshold and class-agnostic NMS.
+Images are letterboxed into one preallocated NCHW buffer per
+``session.run`` call (see ``app.ml.ops``); models exported with a fixed
+batch size are fed in chunks of that size.
+"""
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+
+from app.ml.config import CLASS_NAMES, COCO_CLASS_MAP, MODEL_INPUT_SIZE, MODEL_PATH
+from app.ml.ops import InputBuffer, decode_batch
+
+DETECTION_THREADS = int(os.getenv("DETECTION_THREADS", "0"))  # 0: onnxruntime default
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "8"))
+
+
+@dataclass
+class Detection:
+    x: float
+    y: float
+    width: float
+    height: float
+    confidence: float
+    class_name: str
+
+
+def class_names_for(num_classes: int) -> List[Optional[str]]:
+    """Map model class ids to our class names (None: ignored class)."""
+    if num_classes == len(CLASS_NAMES):
+        return list(CLASS_NAMES)
+    return [COCO_CLASS_MAP.get(class_id) for class_id in range(num_classes)]
+
+
+class Detector:
+    """An onnxruntime session plus the YOLOv8 pre- and post-processing."""
+
+    def __init__(self, model_path: str = MODEL_PATH, threads: int = DETECTION_THREADS):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # A symbolic batch dimension accepts any batch size
+        batch = model_input.shape[0]
+        self.max_batch = batch if isinstance(batch, int) and batch > 0 else None
+        self.buffer = InputBuffer(self.max_batch or DETECTION_BATCH_SIZE, MODEL_INPUT_SIZE)
+
+    def detect(self, images: Sequence[Image.Image]) -> List[List[Detection]]:
+        """Detect vehicles in each image, one inference call per batch."""
+        results = []
+        step = self.max_batch or max(len(images), 1)
+        for start in range(0, len(images), step):
+            chunk = [np.asarray(image.convert("RGB")) for image in images[start:start + step]]
+            # Fixed-batch exports get the last chunk padded with blank images
+            batch, geometry = self.buffer.fill(chunk, pad_to=self.max_batch)
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+            names = class_names_for(outputs.shape[1] - 4)
+            for detections in decode_batch(outputs, geometry, names):
+                results.append([
+                    Detection(
+                        x=float(x1),
+                        y=float(y1),
+                        width=float(x2 - x1),
+                        height=float(y2 - y1),
+                        confidence=float(confidence),
+                        class_name=names[int(class_id)],
+                    )
+                    for x1, y1, x2, y2, confidence, class_id in detections
+                ])
+        return results
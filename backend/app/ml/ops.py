@@ -0,0 +1,172 @@
+"""Vectorized YOLOv8 pre- and post-processing.
+
+Everything here works on whole arrays: letterboxing is one gather per
+image written straight into a reusable float32 input buffer, decoding runs
+over the boxes of every image in a batch at once, and NMS over the boxes
+of each image. ``app.ml.reference`` has plain loop versions to check them
+against.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ml.config import CONFIDENCE_THRESHOLD, MIN_BOX_SIZE, MODEL_INPUT_SIZE, NMS_IOU_THRESHOLD
+
+# Highest-scoring candidates per image that enter NMS, bounding its O(n^2) cost
+MAX_NMS_CANDIDATES = 300
+
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+def letterbox_into(pixels: np.ndarray, out: np.ndarray) -> Tuple[float, int, int]:
+    """Letterbox an ``(h, w, 3)`` uint8 image into ``out`` (``(3, s, s)`` float32).
+
+    Uses nearest-neighbour sampling like lib/ml/yoloInference.ts, scales to
+    ``[0, 1]`` and zeroes only the padding. Returns ``(scale, pad_x, pad_y)``
+    where ``scale`` maps model pixels back to image pixels.
+    """
+    height, width = pixels.shape[:2]
+    size = out.shape[-1]
+    scale = max(width, height) / size
+    scaled_width = max(1, min(size, int(width / scale)))
+    scaled_height = max(1, min(size, int(height / scale)))
+    pad_x = (size - scaled_width) // 2
+    pad_y = (size - scaled_height) // 2
+
+    rows = np.minimum((np.arange(scaled_height) * scale).astype(np.intp), height - 1)
+    cols = np.minimum((np.arange(scaled_width) * scale).astype(np.intp), width - 1)
+    sampled = pixels[rows[:, None], cols[None, :]]  # (sh, sw, 3), one gather
+
+    out[:, :pad_y] = 0
+    out[:, pad_y + scaled_height:] = 0
+    out[:, pad_y:pad_y + scaled_height, :pad_x] = 0
+    out[:, pad_y:pad_y + scaled_height, pad_x + scaled_width:] = 0
+    np.multiply(
+        sampled.transpose(2, 0, 1),
+        _INV_255,
+        out=out[:, pad_y:pad_y + scaled_height, pad_x:pad_x + scaled_width],
+        casting="unsafe",
+    )
+    return scale, pad_x, pad_y
+
+
+class InputBuffer:
+    """A preallocated ``(batch, 3, size, size)`` model input, reused per call."""
+
+    def __init__(self, batch_size: int, size: int = MODEL_INPUT_SIZE):
+        self.size = size
+        self.array = np.zeros((batch_size, 3, size, size), dtype=np.float32)
+
+    def fill(self, images: Sequence[np.ndarray], pad_to: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Letterbox ``images`` into the buffer.
+
+        Returns the filled batch (a view, padded with blank images up to
+        ``pad_to``) and an ``(n, 5)`` array of ``scale, pad_x, pad_y, width,
+        height`` per image for :func:`decode_batch`.
+        """
+        count = len(images)
+        batch = max(count, pad_to or 0)
+        if batch > len(self.array):
+            self.array = np.zeros((batch, 3, self.size, self.size), dtype=np.float32)
+
+        geometry = np.empty((count, 5), dtype=np.float32)
+        for i, pixels in enumerate(images):
+            scale, pad_x, pad_y = letterbox_into(pixels, self.array[i])
+            geometry[i] = (scale, pad_x, pad_y, pixels.shape[1], pixels.shape[0])
+        self.array[count:batch] = 0
+        return self.array[:batch], geometry
+
+
+def box_iou(boxes: np.ndarray) -> np.ndarray:
+    """Pairwise IoU matrix of ``(n, 4)`` ``x1, y1, x2, y2`` boxes."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    width = np.clip(np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1), 0, None)
+    height = np.clip(np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1), 0, None)
+    intersection = width * height
+    return intersection / np.maximum(areas[:, None] + areas - intersection, 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = NMS_IOU_THRESHOLD) -> np.ndarray:
+    """Greedy NMS over the ``(n, 4)`` boxes of one image.
+
+    Returns kept indices, highest score first.
+    """
+    order = np.argsort(-scores, kind="stable")
+    overlaps = box_iou(boxes[order]) > iou_threshold
+
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if not suppressed[i]:
+            # Everything after i that overlaps it loses to it
+            suppressed[i + 1:] |= overlaps[i, i + 1:]
+    return order[~suppressed]
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, groups: np.ndarray,
+                iou_threshold: float = NMS_IOU_THRESHOLD) -> np.ndarray:
+    """Greedy NMS within each group (image) of a batch.
+
+    Boxes only compete inside their own group, so each group gets its own
+    IoU matrix: the cost is the sum of the squared group sizes rather than
+    the square of the batch total. Returns kept indices, highest score
+    first.
+    """
+    if not len(boxes):
+        return np.empty(0, dtype=np.intp)
+    by_group = np.argsort(groups, kind="stable")  # already sorted coming from decode_batch
+    bounds = np.flatnonzero(np.diff(groups[by_group])) + 1
+    kept = np.concatenate([
+        block[nms(boxes[block], scores[block], iou_threshold)]
+        for block in np.split(by_group, bounds)
+    ])
+    kept.sort()
+    return kept[np.argsort(-scores[kept], kind="stable")]
+
+
+def decode_batch(outputs: np.ndarray, geometry: np.ndarray, names: Sequence[Optional[str]],
+                 confidence_threshold: float = CONFIDENCE_THRESHOLD) -> List[np.ndarray]:
+    """Decode ``(batch, 4 + classes, anchors)`` YOLOv8 output for every image.
+
+    Returns per image an ``(k, 6)`` array of ``x1, y1, x2, y2, confidence,
+    class id`` in original image pixels, after thresholding and NMS.
+    """
+    count = len(geometry)
+    outputs = outputs[:count]
+    scores = outputs[:, 4:, :]
+    class_ids = scores.argmax(axis=1)                            # (b, anchors)
+    confidences = np.take_along_axis(scores, class_ids[:, None], axis=1)[:, 0]
+
+    wanted = np.array([name is not None for name in names])
+    mask = (confidences > confidence_threshold) & wanted[class_ids]
+    image_index, anchor = np.nonzero(mask)
+
+    # Keep the best MAX_NMS_CANDIDATES per image before the quadratic NMS
+    if len(anchor):
+        ranked = np.lexsort((-confidences[image_index, anchor], image_index))
+        image_index, anchor = image_index[ranked], anchor[ranked]
+        starts = np.searchsorted(image_index, image_index, side="left")
+        keep = (np.arange(len(anchor)) - starts) < MAX_NMS_CANDIDATES
+        image_index, anchor = image_index[keep], anchor[keep]
+
+    cx, cy, w, h = (outputs[image_index, row, anchor] for row in range(4))
+    scale, pad_x, pad_y, width, height = geometry[image_index].T
+    # Undo the letterbox: remove the padding, then scale to the original
+    boxes = np.stack([
+        np.clip((cx - w / 2 - pad_x) * scale, 0, width),
+        np.clip((cy - h / 2 - pad_y) * scale, 0, height),
+        np.clip((cx + w / 2 - pad_x) * scale, 0, width),
+        np.clip((cy + h / 2 - pad_y) * scale, 0, height),
+    ], axis=1)
+    confidence = confidences[image_index, anchor]
+    class_id = class_ids[image_index, anchor]
+
+    large = ((boxes[:, 2] - boxes[:, 0]) > MIN_BOX_SIZE) & ((boxes[:, 3] - boxes[:, 1]) > MIN_BOX_SIZE)
+    boxes, confidence, class_id, image_index = boxes[large], confidence[large], class_id[large], image_index[large]
+
+    kept = batched_nms(boxes, confidence, image_index)
+    detections = np.concatenate(
+        [boxes[kept], confidence[kept, None], class_id[kept, None].astype(boxes.dtype)], axis=1
+    )
+    kept_images = image_index[kept]
+    return [detections[kept_images == i] for i in range(count)]
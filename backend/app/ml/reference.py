@@ -0,0 +1,83 @@
+"""Plain loop versions of the pre- and post-processing in ``app.ml.ops``.
+
+One pixel, anchor and box at a time, in the shape of
+lib/ml/yoloInference.ts. Far too slow to serve with; tests check the
+vectorized code against these, and ``benchmarks.ml_ops`` times both.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ml.config import CONFIDENCE_THRESHOLD, MIN_BOX_SIZE, NMS_IOU_THRESHOLD
+
+
+def letterbox(pixels: np.ndarray, size: int) -> Tuple[np.ndarray, Tuple[float, int, int]]:
+    """Letterbox an ``(h, w, 3)`` uint8 image into a new ``(3, size, size)`` array."""
+    height, width = pixels.shape[:2]
+    scale = max(width, height) / size
+    scaled_width = max(1, min(size, int(width / scale)))
+    scaled_height = max(1, min(size, int(height / scale)))
+    pad_x = (size - scaled_width) // 2
+    pad_y = (size - scaled_height) // 2
+
+    out = np.zeros((3, size, size), dtype=np.float32)
+    for y in range(scaled_height):
+        src_y = min(int(y * scale), height - 1)
+        for x in range(scaled_width):
+            src_x = min(int(x * scale), width - 1)
+            for channel in range(3):
+                out[channel, pad_y + y, pad_x + x] = np.float32(pixels[src_y, src_x, channel]) / np.float32(255)
+    return out, (scale, pad_x, pad_y)
+
+
+def iou(a: Sequence[float], b: Sequence[float]) -> float:
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / max(union, 1e-9)
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, groups: np.ndarray,
+                iou_threshold: float = NMS_IOU_THRESHOLD) -> List[int]:
+    """Greedy NMS per group; kept indices, highest score first."""
+    order = sorted(range(len(boxes)), key=lambda i: -scores[i])
+    kept = []
+    for i in order:
+        if all(groups[j] != groups[i] or iou(boxes[i], boxes[j]) <= iou_threshold for j in kept):
+            kept.append(i)
+    return kept
+
+
+def decode(outputs: np.ndarray, geometry: np.ndarray, names: Sequence[Optional[str]],
+           confidence_threshold: float = CONFIDENCE_THRESHOLD,
+           max_candidates: int = 300) -> List[np.ndarray]:
+    """Decode YOLOv8 output image by image; see ``app.ml.ops.decode_batch``."""
+    results = []
+    for image in range(len(geometry)):
+        scale, pad_x, pad_y, width, height = (float(value) for value in geometry[image])
+        candidates = []
+        for anchor in range(outputs.shape[2]):
+            scores = outputs[image, 4:, anchor]
+            class_id = int(np.argmax(scores))
+            confidence = float(scores[class_id])
+            if confidence <= confidence_threshold or names[class_id] is None:
+                continue
+            candidates.append((confidence, anchor, class_id))
+        candidates.sort(key=lambda candidate: -candidate[0])
+
+        detections = []
+        for confidence, anchor, class_id in candidates[:max_candidates]:
+            cx, cy, w, h = (float(value) for value in outputs[image, :4, anchor])
+            box = (
+                min(max((cx - w / 2 - pad_x) * scale, 0), width),
+                min(max((cy - h / 2 - pad_y) * scale, 0), height),
+                min(max((cx + w / 2 - pad_x) * scale, 0), width),
+                min(max((cy + h / 2 - pad_y) * scale, 0), height),
+            )
+            if box[2] - box[0] > MIN_BOX_SIZE and box[3] - box[1] > MIN_BOX_SIZE:
+                detections.append((*box, confidence, class_id))
+
+        kept = batched_nms([d[:4] for d in detections], [d[4] for d in detections], [0] * len(detections))
+        results.append(np.array([detections[i] for i in kept], dtype=np.float64).reshape(-1, 6))
+    return results
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Integer, Float, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, JSON, DateTime, Date, Boolean, Integer, Float, Index, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -32,6 +32,14 @@ class User(Base):
 
 class Report(Base):
     __tablename__ = "reports"
+    __table_args__ = (
+        # Keyset pagination of the verification queue: status filter + (created_at, id) order
+        Index("ix_reports_status_created_at_id", "status", "created_at", "id"),
+        # Spatial queries: geohash prefix range scans per status
+        Index("ix_reports_status_geohash", "status", "geohash"),
+        # Offline sync: a replayed client key maps back to the report it created
+        Index("uq_reports_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
 
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, index=True)
@@ -39,12 +47,258 @@ class Report(Base):
     location = Column(String, index=True)
     description = Column(String, nullable=True)
     image_url = Column(String, nullable=True)
+    image_hash = Column(String(64), nullable=True)  # media_blobs.content_hash
     status = Column(SQLEnum(ReportStatus), default=ReportStatus.PENDING, index=True)
     detection_confidence = Column(Float, default=0.0)
+    detected_class = Column(String, nullable=True)  # set by the detection worker
+    detected_at = Column(DateTime(timezone=True), nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True)  # app.utils.geo.encode(latitude, longitude)
+    cluster_id = Column(String, index=True, nullable=True)  # hotspot_clusters.id once verified
+    phash = Column(String(16), nullable=True)  # app.utils.phash.dhash of the image, hex
+    duplicate_of = Column(String, index=True, nullable=True)  # earliest near-identical report nearby
+    idempotency_key = Column(String(64), nullable=True)  # client supplied, unique per user
     points_awarded = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     verified_at = Column(DateTime(timezone=True), nullable=True)
     verified_by = Column(String, nullable=True)
+
+
+# Spatial queries on PostgreSQL: box containment on point(longitude, latitude)
+# (see app.services.spatial); other databases use ix_reports_status_geohash
+Index(
+    "ix_reports_location_gist",
+    func.point(Report.longitude, Report.latitude),
+    postgresql_using="gist",
+).ddl_if(dialect="postgresql")
+
+
+class HotspotCluster(Base):
+    """A Hall of Shame hotspot: verified reports within a few metres of each other.
+
+    Reports with coordinates join the cluster whose centroid is within
+    ``CLUSTER_RADIUS_M``; ``cell`` is the geohash cell of the centroid for
+    neighbourhood lookups. Reports without coordinates are grouped by their
+    normalized location text (``location_key``) instead.
+    """
+    __tablename__ = "hotspot_clusters"
+
+    id = Column(String, primary_key=True)
+    cell = Column(String(12), index=True, nullable=True)
+    location_key = Column(String, index=True, nullable=True)
+    label = Column(String)  # address of the first report
+    member_count = Column(Integer, default=0)  # reports with coordinates
+    lat_sum = Column(Float, default=0.0)
+    lng_sum = Column(Float, default=0.0)
+    centroid_lat = Column(Float, nullable=True)
+    centroid_lng = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class ReportFingerprint(Base):
+    """One 16-bit segment of a report's perceptual hash, for duplicate lookups.
+
+    Each image report has one row per segment (``app.utils.phash``);
+    ``cell`` is the report's coarse geohash cell, or its normalized location
+    text when it has no coordinates, so lookups stay local.
+    """
+    __tablename__ = "report_fingerprints"
+    __table_args__ = (
+        Index("ix_report_fingerprints_lookup", "segment", "value", "cell", "created_at"),
+    )
+
+    report_id = Column(String, primary_key=True)
+    segment = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False)
+    cell = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class RewardType(str, enum.Enum):
+    VERIFIED_REPORT = "verified_report"
+    BONUS = "bonus"
+    REDEEMED = "redeemed"
+
+
+class UserReward(Base):
+    """One entry of the append-only points ledger.
+
+    Rows are only ever inserted by the code awarding points; the rollup in
+    ``app.services.rewards`` folds them into ``users.total_points`` and
+    ``user_points_periods`` and stamps ``rollup_id`` on the rows it took.
+    """
+    __tablename__ = "user_rewards"
+    __table_args__ = (
+        Index("ix_user_rewards_user_created", "user_id", "created_at"),
+        Index("ix_user_rewards_rollup", "rollup_id", "created_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    report_id = Column(String, nullable=True)
+    points_earned = Column(Integer, nullable=False)  # negative for redemptions
+    transaction_type = Column(SQLEnum(RewardType), nullable=False)
+    description = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    rollup_id = Column(String, nullable=True)  # NULL until rolled up
+
+
+class UserPointsPeriod(Base):
+    """Points a user earned in one day, ISO week or month, rolled up from ``user_rewards``."""
+    __tablename__ = "user_points_periods"
+
+    user_id = Column(String, primary_key=True)
+    period = Column(String(10), primary_key=True)  # day, week or month
+    period_start = Column(Date, primary_key=True)
+    points = Column(Integer, default=0, nullable=False)
+
+
+# In ranking order: a page is one index range, and a rank counts index
+# entries only (see app.services.rewards.period_user_rank)
+Index(
+    "ix_user_points_periods_ranking",
+    UserPointsPeriod.period,
+    UserPointsPeriod.period_start,
+    UserPointsPeriod.points.desc(),
+    UserPointsPeriod.user_id,
+)
+
+
+class OffenderStatistic(Base):
+    """Verified report counts per (hotspot cluster, violation type, day).
+
+    Maintained incrementally when reports are verified so the Hall of Shame
+    can sum a handful of buckets instead of scanning ``reports``.
+    """
+    __tablename__ = "offender_statistics"
+    __table_args__ = (
+        UniqueConstraint(
+            "cluster_id", "detected_object_type", "bucket_date",
+            name="uq_offender_statistics_bucket",
+        ),
+    )
+
+    id = Column(String, primary_key=True)
+    cluster_id = Column(String, index=True)
+    detected_object_type = Column(String, index=True)  # car or bike
+    detected_at_location = Column(String, index=True)
+    bucket_date = Column(Date, index=True)
+    total_violations = Column(Integer, default=0)
+    confidence_sum = Column(Float, default=0.0)
+    points_sum = Column(Integer, default=0)
+    most_recent_violation_date = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ViolationCounter(Base):
+    """Reports per (hour or day, location, violation type, status).
+
+    Buckets follow the time a report was submitted and its current status:
+    submitting adds one to ``pending`` and verification moves it to
+    ``verified`` or ``rejected``, so a window is answered by summing
+    buckets. ``location`` is the normalized address, "" when missing.
+    """
+    __tablename__ = "violation_counters"
+
+    granularity = Column(String(4), primary_key=True)  # hour or day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    location = Column(String, primary_key=True)
+    violation_type = Column(String, primary_key=True)
+    status = Column(String(10), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class LeaderboardEntry(Base):
+    """Materialized reporter ranking, refreshed from ``users``/``reports``."""
+    __tablename__ = "leaderboard_entries"
+
+    user_id = Column(String, primary_key=True)
+    rank = Column(Integer, unique=True, index=True)
+    name = Column(String)
+    total_points = Column(Integer, default=0)
+    report_count = Column(Integer, default=0)
+    verified_count = Column(Integer, default=0)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class MediaBlob(Base):
+    """A stored file, addressed by the SHA-256 of its content.
+
+    ``ref_count`` counts the ``report_media`` rows pointing at it, so
+    identical uploads are stored once. A blob whose last reference went
+    away keeps ``ref_count`` 0 and ``released_at`` until the media sweep
+    removes it.
+    """
+    __tablename__ = "media_blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    storage_key = Column(String, nullable=False)
+    mime_type = Column(String)
+    file_size = Column(Integer)
+    ref_count = Column(Integer, default=0)
+    released_at = Column(DateTime(timezone=True), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReportMedia(Base):
+    __tablename__ = "report_media"
+
+    id = Column(String, primary_key=True)
+    report_id = Column(String, index=True, nullable=False)
+    media_type = Column(String)  # image or video
+    file_path = Column(String)  # storage key of the blob
+    file_size = Column(Integer)
+    duration = Column(Integer, nullable=True)  # for videos, in seconds
+    content_hash = Column(String(64), index=True)
+    uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    title = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String(50))  # report_verified, report_rejected, points_awarded or system
+    is_read = Column(Boolean, default=False, index=True)
+    report_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """A unit of post-commit work for ``python -m app.services.jobs``.
+
+    ``run_at`` is when the job may next be claimed: its scheduled time while
+    queued, and the end of the current lease while running, so a job whose
+    worker died becomes claimable again once the lease runs out.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    lease = Column(String, nullable=True)  # token of the claim currently holding the job
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
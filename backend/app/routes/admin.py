@@ -1,93 +1,246 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, tuple_
 from datetime import datetime
-from app.database import get_db
-from app.models.models import Report, User, ReportStatus, UserRole
-from app.schemas.schemas import ReportVerification, AdminReportResponse
+from typing import Optional, Tuple
+from collections import Counter
+import json
+import time
+from app.database import get_db, AsyncSessionLocal
+from app.models.models import Report, ReportStatus
+from app.schemas.schemas import ReportVerification, BulkReportVerification, AdminReportResponse
 from app.utils.security import get_current_user
+from app.utils.auth_context import ADMIN_ROLES, Principal, resolve_role
+from app.services.verification import apply_verifications
+from app.services.events import ADMIN_TOPIC, event_bus, publish_verification_results
+from app.routes.events import event_stream
+from app.utils.response_cache import response_cache
+from app.services.derivatives import derivative_url, original_url
+from app.services.reporters import load_reporter_names, ANONYMOUS_REPORTER
+from app.utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter()
 
 
 async def get_current_admin(
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """Verify the current user is an admin."""
-    user = db.query(User).filter(User.id == user_id).first()
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """Verify the current user is an admin.
+
+    Whatever the token's role claim says, access is decided by the cached
+    current role, so promotions and demotions take effect before the token
+    expires; the cache keeps this to one query per user per TTL.
+    """
+    return await _require_admin(db, principal)
+
+
+async def get_streaming_admin(principal: Principal = Depends(get_current_user)) -> Principal:
+    """``get_current_admin`` for long-lived responses.
+
+    The role is resolved in a session of its own that closes before the
+    response starts, instead of holding a request session (and its pool
+    connection) open for as long as the client stays connected.
+    """
+    async with AsyncSessionLocal() as db:
+        return await _require_admin(db, principal)
 
-    if not user or user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+
+async def _require_admin(db: AsyncSession, principal: Principal) -> Principal:
+    role = await resolve_role(db, principal.user_id)
+
+    if role not in ADMIN_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
 
-    return user_id
+    return Principal(user_id=principal.user_id, role=role)
+
+
+PENDING_PAGE_SIZE = 50
+MAX_PENDING_PAGE_SIZE = 500
+
+
+async def _pending_page(db: AsyncSession, limit: int, after: Optional[Tuple[datetime, str]] = None,
+                        hide_duplicates: bool = False):
+    """Fetch one keyset page of the verification queue, oldest first.
+
+    Served by ``ix_reports_status_created_at_id`` as an index range scan.
+    """
+    query = select(Report).where(Report.status == ReportStatus.PENDING)
+    if hide_duplicates:
+        query = query.where(Report.duplicate_of.is_(None))
+    if after is not None:
+        created_at, report_id = after
+        # Re-read the anchor's stored timestamp so the comparison uses the
+        # database's own representation (SQLite stores CURRENT_TIMESTAMP
+        # without microseconds); fall back to the cursor value if it is gone.
+        anchor = (
+            select(Report.created_at)
+            .where(Report.id == report_id)
+            .scalar_subquery()
+        )
+        query = query.where(
+            tuple_(Report.created_at, Report.id)
+            > tuple_(func.coalesce(anchor, created_at), report_id)
+        )
+    query = query.order_by(Report.created_at, Report.id).limit(limit)
+    return (await db.scalars(query)).all()
+
+
+def _serialize_pending(report: Report, reporter_names: dict) -> dict:
+    return {
+        "id": report.id,
+        "user_id": report.user_id,
+        "reporter_name": reporter_names.get(report.user_id, ANONYMOUS_REPORTER),
+        "violation_type": report.violation_type,
+        "location": report.location,
+        "description": report.description,
+        # Previews only; the original is fetched explicitly via original_url
+        "image_url": derivative_url(report.image_hash, "medium"),
+        "thumbnail_url": derivative_url(report.image_hash, "thumb"),
+        "original_url": original_url(report.image_hash),
+        "status": report.status,
+        "detection_confidence": report.detection_confidence,
+        "detected_class": report.detected_class,
+        "duplicate_of": report.duplicate_of,
+        "latitude": report.latitude,
+        "longitude": report.longitude,
+        "created_at": report.created_at,
+    }
+
+
+async def _queue_stats(db: AsyncSession) -> dict:
+    """Derive the dashboard counters from a single grouped COUNT."""
+    counts = dict((await db.execute(
+        select(Report.status, func.count(Report.id)).group_by(Report.status)
+    )).all())
+    return {
+        "totalReports": sum(counts.values()),
+        "verifiedReports": counts.get(ReportStatus.VERIFIED, 0),
+        "pendingReports": counts.get(ReportStatus.PENDING, 0),
+    }
 
 
 @router.get("/verify")
 async def get_pending_reports(
-    admin_id: str = Depends(get_current_admin),
-    db: Session = Depends(get_db),
+    limit: int = Query(PENDING_PAGE_SIZE, ge=1, le=MAX_PENDING_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    hide_duplicates: bool = Query(False),
+    admin: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Get all pending reports for verification."""
-    pending_reports = db.query(Report).filter(
-        Report.status == ReportStatus.PENDING
-    ).all()
-
-    total_reports = db.query(func.count(Report.id)).scalar()
-    verified_reports = db.query(func.count(Report.id)).filter(
-        Report.status == ReportStatus.VERIFIED
-    ).scalar()
-    pending_count = len(pending_reports)
-
-    stats = {
-        "totalReports": total_reports,
-        "verifiedReports": verified_reports,
-        "pendingReports": pending_count,
-    }
+    """Get pending reports for verification, one keyset page at a time.
+
+    Pass ``nextCursor`` back as ``cursor`` to fetch the following page. With
+    ``format=ndjson`` the remaining queue is streamed one report per line,
+    fetched from the database ``limit`` rows at a time. Near-duplicates of
+    earlier reports carry ``duplicate_of``; ``hide_duplicates`` leaves them out.
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    if format == "ndjson":
+        async def stream():
+            # The stream outlives the request scoped session, so it owns one
+            async with AsyncSessionLocal() as stream_db:
+                position = after
+                while True:
+                    page = await _pending_page(stream_db, limit, position, hide_duplicates)
+                    if not page:
+                        break
+                    reporter_names = await load_reporter_names(stream_db, page)
+                    for report in page:
+                        item = jsonable_encoder(_serialize_pending(report, reporter_names))
+                        yield json.dumps(item) + "\n"
+                    position = (page[-1].created_at, page[-1].id)
+                    # Release the ORM objects of the page we just sent
+                    stream_db.expunge_all()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    page = await _pending_page(db, limit + 1, after, hide_duplicates)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    reporter_names = await load_reporter_names(db, page)
 
     return {
-        "pendingReports": pending_reports,
-        "stats": stats,
+        "pendingReports": [_serialize_pending(report, reporter_names) for report in page],
+        "stats": await _queue_stats(db),
+        "nextCursor": next_cursor,
     }
 
 
 @router.post("/verify")
 async def verify_report(
     verification: ReportVerification,
-    admin_id: str = Depends(get_current_admin),
-    db: Session = Depends(get_db),
+    admin: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db),
 ):
     """Verify or reject a report."""
-    report = db.query(Report).filter(Report.id == verification.report_id).first()
+    [result] = await apply_verifications(db, admin.user_id, {verification.report_id: verification.verified})
 
-    if not report:
+    if result["status"] == "not_found":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Report not found"
         )
 
-    if verification.verified:
-        report.status = ReportStatus.VERIFIED
-        report.verified_by = admin_id
-        report.verified_at = datetime.utcnow()
-        report.points_awarded = 10  # Award points for verified report
-
-        # Update user points
-        user = db.query(User).filter(User.id == report.user_id).first()
-        if user:
-            user.total_points += 10
-    else:
-        report.status = ReportStatus.REJECTED
-        report.verified_by = admin_id
-        report.verified_at = datetime.utcnow()
-
-    db.commit()
-    db.refresh(report)
+    await db.commit()
+    await publish_verification_results(db, [result])
+    await response_cache.invalidate()
+    report = await db.get(Report, verification.report_id, populate_existing=True)
 
     return {
         "message": "Report updated successfully",
         "report": report,
     }
+
+
+@router.post("/verify/bulk")
+async def verify_reports_bulk(
+    request: BulkReportVerification,
+    admin: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """Verify or reject many reports in a single transaction."""
+    started = time.perf_counter()
+
+    # Later decisions for the same report win
+    decisions = {item.report_id: item.verified for item in request.items}
+    results = await apply_verifications(db, admin.user_id, decisions)
+    await db.commit()
+    await publish_verification_results(db, results)
+    await response_cache.invalidate()
+
+    outcomes = Counter(result["status"] for result in results)
+    return {
+        "results": results,
+        "summary": {
+            "requested": len(request.items),
+            "verified": outcomes["verified"],
+            "rejected": outcomes["rejected"],
+            "unchanged": outcomes["unchanged"],
+            "not_found": outcomes["not_found"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    }
+
+
+@router.get("/events")
+async def admin_events(
+    last_event_id: Optional[str] = Header(None),
+    admin: Principal = Depends(get_streaming_admin),
+):
+    """Live verification queue changes as server-sent events.
+
+    Emits ``report.created``, ``report.verified`` and ``report.rejected``;
+    on ``resync`` the client should reload the queue.
+    """
+    return event_stream(ADMIN_TOPIC, last_event_id)
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import uuid4
 from app.database import get_db
 from app.models.models import User, UserRole
 from app.schemas.schemas import UserRegister, UserLogin, TokenResponse
+from app.utils.auth_context import Principal
 from app.utils.security import (
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     create_access_token,
     get_current_user,
 )
@@ -15,10 +17,10 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=TokenResponse)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -30,16 +32,16 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         id=str(uuid4()),
         name=user_data.name,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
         role=UserRole.USER,
         total_points=0
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Create access token
-    access_token = create_access_token(data={"sub": new_user.id, "role": new_user.role})
+    access_token = create_access_token(data={"sub": new_user.id, "role": new_user.role.value})
 
     return {
         "token": access_token,
@@ -48,18 +50,18 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user and return JWT token."""
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = await db.scalar(select(User).where(User.email == user_data.email))
 
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user or not await verify_password_async(user_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
 
     # Create access token
-    access_token = create_access_token(data={"sub": user.id, "role": user.role})
+    access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
 
     return {
         "token": access_token,
@@ -74,10 +76,10 @@ async def logout():
 
 
 @router.get("/me", response_model=dict)
-async def me(user_id: str = Depends(get_current_user), db: Session = Depends(get_db)):
+async def me(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Get current authenticated user's profile."""
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, current_user.user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from app.services.events import event_bus
+
+
+def event_stream(topic: str, last_event_id: Optional[str]) -> StreamingResponse:
+    """Stream ``topic`` as ``text/event-stream``."""
+    if event_bus.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live subscribers, retry later",
+            headers={"Retry-After": "10"},
+        )
+
+    return StreamingResponse(
+        event_bus.stream(topic, last_event_id or None),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx style proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,131 @@
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import StreamingResponse
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.models.models import MediaBlob
+from app.routes.admin import get_current_admin
+from app.utils.auth_context import Principal
+from app.services import derivatives
+from app.services.media import get_media_backend
+
+router = APIRouter()
+
+# Derivative URLs are content addressed, so any cached copy stays valid
+DERIVATIVE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ORIGINAL_CACHE_CONTROL = "private, max-age=3600"
+
+# Content hashes are hex SHA-256 digests, as stored by app.services.media
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    # Only exact tags: a 304 for "*" would vouch for media never looked up
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return etag in {candidate.strip() for candidate in header.split(",")}
+
+
+def _check_hash(content_hash: str):
+    # Reject anything else before it reaches a storage path
+    if not CONTENT_HASH.fullmatch(content_hash):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+
+
+async def _get_blob(db: AsyncSession, content_hash: str) -> MediaBlob:
+    blob = await db.get(MediaBlob, content_hash)
+    if not blob:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+    return blob
+
+
+@router.get("/{content_hash}/original")
+async def get_original(
+    content_hash: str,
+    request: Request,
+    admin: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream a full-resolution original (admin only)."""
+    _check_hash(content_hash)
+    etag = f'"{content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": ORIGINAL_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    blob = await _get_blob(db, content_hash)
+    stored = await run_in_threadpool(get_media_backend().open, blob.storage_key)
+    headers["Content-Length"] = str(blob.file_size)
+    return StreamingResponse(
+        iterate_in_threadpool(_chunks(stored)),
+        media_type=blob.mime_type,
+        headers=headers,
+    )
+
+
+def _chunks(stored, chunk_size: int = 64 * 1024):
+    with stored:
+        while chunk := stored.read(chunk_size):
+            yield chunk
+
+
+@router.get("/{content_hash}/{variant}.{extension}")
+async def get_derivative(
+    content_hash: str,
+    variant: str,
+    extension: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    """Serve a resized preview, rendering it on the first request if needed."""
+    _check_hash(content_hash)
+    if variant not in derivatives.VARIANTS or extension not in derivatives.FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown derivative"
+        )
+
+    etag = derivatives.derivative_etag(content_hash, variant, extension)
+    headers = {"ETag": etag, "Cache-Control": DERIVATIVE_CACHE_CONTROL}
+    # The ETag is derived from the URL alone, so revalidation costs no I/O
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = await run_in_threadpool(derivatives.read_derivative, content_hash, variant, extension)
+    if data is None:
+        blob = await _get_blob(db, content_hash)
+        if blob.mime_type not in derivatives.IMAGE_MIME_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No previews for this media type"
+            )
+        try:
+            data = await run_in_threadpool(
+                derivatives.generate_derivative, content_hash, blob.storage_key, variant, extension
+            )
+        except OSError:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Image could not be decoded"
+            )
+        except Image.DecompressionBombError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Image is too large to preview"
+            )
+
+    return Response(
+        content=data,
+        media_type=derivatives.FORMATS[extension][1],
+        headers=headers,
+    )
@@ -1,19 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, status, File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from uuid import uuid4
-from typing import Optional
+from typing import List, Optional
 from app.database import get_db
 from app.models.models import Report, User, ReportStatus
-from app.schemas.schemas import ReportCreate, ReportResponse
+from app.schemas.schemas import ReportBatchItem, ReportCreate, ReportResponse
 from app.utils.security import get_current_user
-import os
+from app.utils.auth_context import Principal
+from app.services import derivatives, duplicates, media, trends
+from app.services.ingestion import REPORT_BATCH_MAX_ITEMS, ingest_batch
+from app.services.tasks import enqueue_derivatives
+from app.services.events import publish_report_created
+from app.services.spatial import reports_near
+from app.utils.geo import encode as geohash_encode
+from app.utils.response_cache import response_cache
 
-router = APIRouter()
+router = APIRouter(route_class=media.UploadRoute)
 
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+REPORT_BATCH_ADAPTER = TypeAdapter(List[ReportBatchItem])
 
 
 @router.post("/", response_model=ReportResponse)
@@ -21,64 +30,153 @@ async def create_report(
     violation_type: str = Form(...),
     location: str = Form(...),
     description: Optional[str] = Form(None),
-    latitude: Optional[float] = Form(None),
-    longitude: Optional[float] = Form(None),
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180),
     image: Optional[UploadFile] = File(None),
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """Create a new traffic violation report."""
     image_url = None
+    blob = None
+    image_phash = None
     if image:
-        # Save image
-        file_extension = image.filename.split(".")[-1]
-        unique_filename = f"{uuid4()}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        with open(file_path, "wb") as f:
-            content = await image.read()
-            f.write(content)
-
-        image_url = f"/uploads/{unique_filename}"
+        # Stream the image into the deduplicating media store
+        blob = await media.store_upload(db, image)
+        image_url = derivatives.media_url(blob)
+        if blob.mime_type in derivatives.IMAGE_MIME_TYPES:
+            image_phash = await run_in_threadpool(
+                duplicates.compute_phash, blob.storage_key, media.pending_path(db, blob))
 
     # Create report
     new_report = Report(
         id=str(uuid4()),
-        user_id=user_id,
+        user_id=current_user.user_id,
         violation_type=violation_type,
         location=location,
         description=description,
         image_url=image_url,
+        image_hash=blob.content_hash if blob else None,
+        phash=image_phash,
         latitude=latitude,
         longitude=longitude,
+        geohash=geohash_encode(latitude, longitude) if latitude is not None and longitude is not None else None,
         status=ReportStatus.PENDING,
+        # Set here rather than by the database so the trend buckets match it
+        created_at=datetime.utcnow(),
     )
 
     db.add(new_report)
-    db.commit()
-    db.refresh(new_report)
+    if blob is not None:
+        media.attach_to_report(db, new_report.id, blob)
+        # Previews are rendered by the job worker once this commits
+        enqueue_derivatives(db, [blob])
+    # Burst shots and several reporters at one scene: flag instead of queueing twice
+    await duplicates.link_duplicate(db, new_report)
+    await trends.record_new_reports(db, [new_report])
+    await db.commit()
+    await media.promote_pending(db)
+    # The cached trend series count pending reports too
+    await response_cache.invalidate()
+    await db.refresh(new_report)
+    await publish_report_created(db, new_report)
 
     return new_report
 
 
+@router.post("/batch")
+async def create_reports_batch(
+    items: str = Form(...),
+    images: List[UploadFile] = File([]),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Create queued offline reports in one request.
+
+    ``items`` is a JSON array of reports, each with a client generated
+    ``idempotency_key`` and optionally the ``image_index`` of its file among
+    ``images``. Keys already used by this user are not stored again, so a
+    failed upload can simply be retried; each item gets its own status.
+    """
+    try:
+        batch = REPORT_BATCH_ADAPTER.validate_json(items)
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=jsonable_encoder(exc.errors(include_url=False, include_context=False)),
+        )
+    if not batch or len(batch) > REPORT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch holds between 1 and {REPORT_BATCH_MAX_ITEMS} reports",
+        )
+
+    outcome = await ingest_batch(db, current_user.user_id, batch, images)
+    enqueue_derivatives(db, outcome.blobs)
+    await db.commit()
+    await media.promote_pending(db)
+    if outcome.created:
+        await response_cache.invalidate()
+
+    for report in outcome.created:
+        await publish_report_created(db, report)
+
+    return {
+        "results": outcome.results,
+        "created": len(outcome.created),
+    }
+
+
 @router.get("/", response_model=list[ReportResponse])
 async def get_user_reports(
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get all reports for the current user."""
-    reports = db.query(Report).filter(Report.user_id == user_id).all()
+    reports = (await db.scalars(select(Report).where(Report.user_id == current_user.user_id))).all()
     return reports
 
 
+# Declared before /{report_id} so "nearby" is not taken for a report id
+@router.get("/nearby")
+async def get_nearby_reports(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(500, gt=0, le=5000),
+    vehicle_type: str = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get verified reports within ``radius`` metres of a point, nearest first."""
+    nearby = await reports_near(db, lat, lng, radius, vehicle_type, limit)
+    return {
+        "reports": [
+            {
+                "id": report.id,
+                "violation_type": report.violation_type,
+                "location": {
+                    "address": report.location,
+                    "latitude": report.latitude,
+                    "longitude": report.longitude,
+                },
+                "distance_m": round(distance, 1),
+                "timestamp": report.created_at,
+                "detection_confidence": report.detection_confidence,
+            }
+            for report, distance in nearby
+        ]
+    }
+
+
 @router.get("/{report_id}", response_model=ReportResponse)
 async def get_report(
     report_id: str,
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get a specific report."""
-    report = db.query(Report).filter(Report.id == report_id).first()
+    report = await db.get(Report, report_id)
 
     if not report:
         raise HTTPException(
@@ -86,7 +184,7 @@ async def get_report(
             detail="Report not found"
         )
 
-    if report.user_id != user_id:
+    if report.user_id != current_user.user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this report"
@@ -1,167 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-from app.database import get_db
-from app.models.models import Report, User
-from app.schemas.schemas import LeaderboardUser, UserRank
-
-router = APIRouter()
-
-
-@router.get("/top-offenders")
-async def top_offenders(limit: int = 10, db: Session = Depends(get_db)):
-    """Return top offender locations and basic stats (mocked/aggregated)."""
-    # Basic aggregation by location
-    rows = (
-        db.query(Report.location, Report.violation_type, func.count(Report.id).label('count'))
-        .filter(Report.status == 'verified')
-        .group_by(Report.location, Report.violation_type)
-        .order_by(func.count(Report.id).desc())
-        .limit(limit)
-        .all()
-    )
-
-    offenders = []
-    for row in rows:
-        offenders.append({
-            'location': row[0],
-            'violation_type': row[1],
-            'count': int(row[2]),
-        })
-
-    return { 'data': { 'offenders': offenders } }
-
-
-@router.get("/leaderboard")
-async def leaderboard(limit: int = 10, db: Session = Depends(get_db)):
-    """Return leaderboard of top users by points."""
-    rows = (
-        db.query(User.id, User.name, User.total_points)
-        .order_by(User.total_points.desc())
-        .limit(limit)
-        .all()
-    )
-
-    leaderboard = []
-    rank = 1
-    for r in rows:
-        leaderboard.append({
-            'rank': rank,
-            'name': r.name,
-            'total_points': r.total_points or 0,
-            'report_count': 0,
-            'verified_count': 0,
-        })
-        rank += 1
-
-    return { 'leaderboard': leaderboard }
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+from typing import Optional
 from app.database import get_db
-from app.models.models import Report, User, ReportStatus
+from app.models.models import Report, ReportStatus
+from app.services import leaderboard, rewards, trends
+from app.services.hotspots import top_offenders, top_offenders_from_reports
+from app.services.spatial import reports_in_bbox
+from app.services.events import SHAME_TOPIC
+from app.routes.events import event_stream
+from app.services.reporters import load_reporter_names, ANONYMOUS_REPORTER
+from app.utils.security import get_optional_user
+from app.utils.auth_context import Principal
+import os
 
 router = APIRouter()
 
+# "aggregate" reads the offender_statistics buckets, "query" lets the
+# database group the raw reports in a single pass.
+HOTSPOT_SOURCE = os.getenv("HOTSPOT_SOURCE", "aggregate")
+
+
+def _window_start(time_range: str) -> Optional[datetime]:
+    """Start of a ``time_range`` of days back from now; None for "all"."""
+    if time_range == "all":
+        return None
+    try:
+        days = int(time_range)
+    except ValueError:
+        days = 0
+    if days < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="time_range must be a number of days or 'all'"
+        )
+    return datetime.utcnow() - timedelta(days=days)
+
 
 @router.get("/top-offenders")
 async def get_top_offenders(
     limit: int = Query(50, ge=1, le=100),
     vehicle_type: str = Query(None),
     time_range: str = Query("30"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get top violation hotspots (Hall of Shame)."""
 
-    # Calculate date range
-    days = int(time_range) if time_range != "all" else 365
-    start_date = datetime.utcnow() - timedelta(days=days)
-
-    # Build query
-    query = db.query(Report).filter(
-        and_(
-            Report.status == ReportStatus.VERIFIED,
-            Report.created_at >= start_date,
-        )
-    )
-
-    if vehicle_type and vehicle_type != "all":
-        query = query.filter(Report.violation_type == vehicle_type)
-
-    reports = query.all()
-
-    # Group by location to get hotspots
-    location_stats = {}
-    for report in reports:
-        if report.location not in location_stats:
-            location_stats[report.location] = {
-                "total_violations": 0,
-                "latest_violation": report.created_at,
-                "average_confidence": 0,
-                "unique_reporters": set(),
-                "total_points_awarded": 0,
-                "violation_type": report.violation_type,
-                "reports": [],
-            }
-
-        stats = location_stats[report.location]
-        stats["total_violations"] += 1
-        stats["latest_violation"] = max(stats["latest_violation"], report.created_at)
-        stats["average_confidence"] += report.detection_confidence
-        stats["unique_reporters"].add(report.user_id)
-        stats["total_points_awarded"] += report.points_awarded
-        stats["reports"].append(report)
-
-    # Calculate averages and sort
-    offenders = []
-    for location, stats in location_stats.items():
-        avg_confidence = stats["average_confidence"] / max(stats["total_violations"], 1)
-        risk_level = "critical" if stats["total_violations"] >= 5 else "high" if stats["total_violations"] >= 3 else "medium" if stats["total_violations"] >= 1 else "low"
-
-        offenders.append({
-            "violation_type": stats["violation_type"],
-            "location": {
-                "address": location,
-                "latitude": stats["reports"][0].latitude,
-                "longitude": stats["reports"][0].longitude,
-            },
-            "statistics": {
-                "total_violations": stats["total_violations"],
-                "latest_violation": stats["latest_violation"],
-                "average_confidence": avg_confidence,
-                "unique_reporters": len(stats["unique_reporters"]),
-                "total_points_awarded": stats["total_points_awarded"],
-            },
-            "risk_level": risk_level,
-        })
+    # "all" has no lower bound
+    start_date = _window_start(time_range)
 
-    # Sort by total violations
-    offenders.sort(key=lambda x: x["statistics"]["total_violations"], reverse=True)
-    offenders = offenders[:limit]
-
-    # Get overall stats
-    overall_stats = {
-        "total_verified_reports": len(reports),
-        "unique_locations": len(location_stats),
-        "unique_reporters": len(set(r.user_id for r in reports)),
-        "violations_by_type": {
-            "car": len([r for r in reports if r.violation_type == "car"]),
-            "bike": len([r for r in reports if r.violation_type == "bike"]),
-        },
-        "average_detection_confidence": sum(r.detection_confidence for r in reports) / max(len(reports), 1),
-        "total_points_awarded": sum(r.points_awarded for r in reports),
-    }
+    # Hotspots and overall stats are computed in the database
+    if HOTSPOT_SOURCE == "query":
+        hotspots = await top_offenders_from_reports(db, limit, vehicle_type, start_date)
+    else:
+        hotspots = await top_offenders(db, limit, vehicle_type, start_date)
 
     # Get recent activity
-    recent_reports = db.query(Report).filter(
-        Report.status == ReportStatus.VERIFIED
-    ).order_by(Report.created_at.desc()).limit(20).all()
+    recent_reports = (await db.scalars(
+        select(Report).where(
+            Report.status == ReportStatus.VERIFIED
+        ).order_by(Report.created_at.desc()).limit(20)
+    )).all()
+
+    reporter_names = await load_reporter_names(db, recent_reports)
 
     recent_activity = []
     for report in recent_reports:
-        user = db.query(User).filter(User.id == report.user_id).first()
         recent_activity.append({
             "id": report.id,
             "violation_type": report.violation_type,
@@ -172,52 +77,158 @@ async def get_top_offenders(
             },
             "timestamp": report.created_at,
             "detection_confidence": report.detection_confidence,
-            "reporter_name": user.name if user else "Anonymous",
+            "reporter_name": reporter_names.get(report.user_id, ANONYMOUS_REPORTER),
         })
 
     return {
         "data": {
-            "offenders": offenders,
-            "overall_stats": overall_stats,
+            "offenders": hotspots["offenders"],
+            "overall_stats": hotspots["overall_stats"],
             "recent_activity": recent_activity,
         }
     }
 
 
-@router.get("/leaderboard")
-async def get_leaderboard(db: Session = Depends(get_db)):
-    """Get leaderboard of top reporters."""
-    users = db.query(
-        User.id,
-        User.name,
-        User.total_points,
-        func.count(Report.id).label("report_count"),
-        func.sum(func.cast(Report.status == ReportStatus.VERIFIED, db.INTEGER)).label("verified_count"),
-    ).outerjoin(Report, User.id == Report.user_id).group_by(User.id).all()
-
-    # Sort by points
-    users_sorted = sorted(
-        users,
-        key=lambda x: (x.total_points, x.verified_count or 0),
-        reverse=True
+@router.get("/trends")
+async def get_trends(
+    time_range: str = Query("30"),
+    interval: str = Query("day", pattern="^(hour|day)$"),
+    location: Optional[str] = Query(None),
+    violation_type: str = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """Reports per hour or day over ``time_range``, counted by status."""
+    start_date = _window_start(time_range)
+    if interval == "hour" and (
+        start_date is None or datetime.utcnow() - start_date > timedelta(days=trends.TRENDS_MAX_HOURLY_DAYS)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hourly trends cover at most {trends.TRENDS_MAX_HOURLY_DAYS} days"
+        )
+
+    series = await trends.trend_series(db, interval, start_date, location, violation_type)
+    return {
+        "data": {
+            "interval": interval,
+            "series": series,
+            "totals": {
+                key: sum(bucket[key] for bucket in series)
+                for key in [report_status.value for report_status in ReportStatus] + ["total"]
+            },
+        }
+    }
+
+
+@router.get("/events")
+async def shame_events(last_event_id: Optional[str] = Header(None)):
+    """Newly verified reports as server-sent events (``report.verified``).
+
+    Each event carries a ``recent_activity`` item; on ``resync`` the client
+    should reload ``/top-offenders``.
+    """
+    return event_stream(SHAME_TOPIC, last_event_id)
+
+
+@router.get("/map")
+async def get_violation_map(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    vehicle_type: str = Query(None),
+    limit: int = Query(500, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get verified violations inside a map viewport, newest first.
+
+    A viewport with ``min_lng > max_lng`` crosses the antimeridian.
+    """
+    if min_lat > max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_lat must not exceed max_lat"
+        )
+
+    # One extra row tells the client the viewport holds more than it got
+    reports = await reports_in_bbox(
+        db, min_lat, min_lng, max_lat, max_lng, vehicle_type=vehicle_type, limit=limit + 1
     )
+    return {
+        "data": {
+            "violations": [
+                {
+                    "id": report.id,
+                    "violation_type": report.violation_type,
+                    "latitude": report.latitude,
+                    "longitude": report.longitude,
+                    "address": report.location,
+                    "timestamp": report.created_at,
+                }
+                for report in reports[:limit]
+            ],
+            "truncated": len(reports) > limit,
+        }
+    }
+
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    limit: int = Query(100, ge=1, le=100),
+    page: int = Query(1, ge=1),
+    neighbours: int = Query(2, ge=0, le=10),
+    period: str = Query("all", pattern="^(all|day|week|month)$"),
+    principal: Optional[Principal] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get leaderboard of top reporters, plus the caller's rank if signed in.
+
+    ``period`` ranks by points earned this day, week or month instead of
+    all-time points.
+    """
+    if period != "all":
+        return await _get_period_leaderboard(db, period, limit, page, neighbours, principal)
+
+    total = await leaderboard.count_entries(db)
+    if not total and await leaderboard.build_if_empty():
+        total = await leaderboard.count_entries(db)
+    entries = await leaderboard.get_page(db, (page - 1) * limit, limit)
+
+    user_rank = None
+    nearby = []
+    if principal:
+        entry = await leaderboard.get_user_entry(db, principal.user_id)
+        if entry:
+            user_rank = leaderboard.serialize_entry(entry)
+            nearby = [
+                leaderboard.serialize_entry(neighbour)
+                for neighbour in await leaderboard.get_neighbours(db, entry, neighbours)
+            ]
+
+    return {
+        "leaderboard": [leaderboard.serialize_entry(entry) for entry in entries],
+        "user_rank": user_rank,
+        "neighbours": nearby,
+        "page": page,
+        "total": total,
+    }
 
-    leaderboard = []
-    for rank, user in enumerate(users_sorted[:100], 1):
-        leaderboard.append({
-            "rank": rank,
-            "name": user.name,
-            "total_points": user.total_points,
-            "report_count": user.report_count,
-            "verified_count": user.verified_count or 0,
-        })
 
-    # Find current user rank if authenticated
+async def _get_period_leaderboard(db: AsyncSession, period: str, limit: int, page: int,
+                                  neighbours: int, principal: Optional[Principal]) -> dict:
     user_rank = None
-    if leaderboard:
-        user_rank = leaderboard[0]  # Placeholder
+    nearby = []
+    rank = await rewards.period_user_rank(db, period, principal.user_id) if principal else None
+    if rank is not None:
+        first = max(rank - neighbours, 1)
+        nearby = await rewards.period_page(db, period, first - 1, rank + neighbours - first + 1)
+        user_rank = next((entry for entry in nearby if entry["rank"] == rank), None)
 
     return {
-        "leaderboard": leaderboard,
+        "leaderboard": await rewards.period_page(db, period, (page - 1) * limit, limit),
         "user_rank": user_rank,
+        "neighbours": nearby,
+        "page": page,
+        "period": period,
+        "total": await rewards.count_period_entries(db, period),
     }
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -54,6 +54,16 @@ class ReportCreate(BaseModel):
     longitude: Optional[float] = None
 
 
+class ReportBatchItem(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    violation_type: str  # car or bike
+    location: str
+    description: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    image_index: Optional[int] = Field(None, ge=0)  # position among the uploaded ``images``
+
+
 class ReportResponse(BaseModel):
     id: str
     user_id: str
@@ -64,6 +74,7 @@ class ReportResponse(BaseModel):
     status: str
     detection_confidence: float
     points_awarded: int
+    duplicate_of: Optional[str] = None
     created_at: datetime
     verified_at: Optional[datetime]
 
@@ -77,6 +88,10 @@ class ReportVerification(BaseModel):
     verified: bool
 
 
+class BulkReportVerification(BaseModel):
+    items: List[ReportVerification] = Field(..., min_length=1, max_length=1000)
+
+
 class AdminReportResponse(BaseModel):
     id: str
     violation_type: str
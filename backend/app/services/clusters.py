@@ -0,0 +1,227 @@
+"""Incremental geo-clustering of verified reports into hotspots.
+
+A report with coordinates looks at the clusters whose centroid lies in its
+geohash cell or the eight around it (cells are wider than
+``CLUSTER_RADIUS_M``, so nothing in reach is missed). It joins the largest
+cluster within reach, and any other cluster within reach is merged into that
+one, as a point bridging two dense regions does in DBSCAN. Reports without
+coordinates fall back to their normalized location text, so "M.G. Road" and
+"MG Road" still land together.
+
+``assign_clusters`` runs inside the verification transaction;
+``cluster_all`` recomputes every cluster for ``hotspots.rebuild_hotspots``.
+Clusters whose members are all un-verified stay behind, empty, and are
+reused by location key or ignored by distance.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import HotspotCluster, Report
+from app.utils import geo
+
+CLUSTER_RADIUS_M = float(os.getenv("CLUSTER_RADIUS_M", "50"))
+# 7 characters is a ~150 m cell (~75 m wide at 60 degrees latitude), which
+# must stay wider than CLUSTER_RADIUS_M for the neighbourhood search
+CLUSTER_CELL_PRECISION = 7
+
+
+def normalize_location(location: Optional[str]) -> str:
+    """Canonical form of an address: "M. G. Road," -> "mg road"."""
+    words = []
+    initials = ""
+    for token in re.sub(r"[^a-z0-9]+", " ", (location or "").lower()).split():
+        # Glue runs of initials back together: "m g road" -> "mg road"
+        if len(token) == 1 and token.isalpha():
+            initials += token
+            continue
+        if initials:
+            words.append(initials)
+            initials = ""
+        words.append(token)
+    if initials:
+        words.append(initials)
+    return " ".join(words)
+
+
+def _has_point(report: Report) -> bool:
+    return report.latitude is not None and report.longitude is not None
+
+
+def _new_cluster(report: Report) -> HotspotCluster:
+    cluster = HotspotCluster(
+        id=str(uuid4()),
+        label=report.location,
+        member_count=0,
+        lat_sum=0.0,
+        lng_sum=0.0,
+    )
+    if not _has_point(report):
+        cluster.location_key = normalize_location(report.location)
+    return cluster
+
+
+def _add_point(cluster: HotspotCluster, lat: float, lng: float, sign: int = 1):
+    cluster.member_count += sign
+    cluster.lat_sum += sign * lat
+    cluster.lng_sum += sign * lng
+    _refresh_centroid(cluster)
+
+
+def _absorb(target: HotspotCluster, other: HotspotCluster):
+    target.member_count += other.member_count
+    target.lat_sum += other.lat_sum
+    target.lng_sum += other.lng_sum
+    _refresh_centroid(target)
+
+
+def _refresh_centroid(cluster: HotspotCluster):
+    if cluster.member_count > 0:
+        cluster.centroid_lat = cluster.lat_sum / cluster.member_count
+        cluster.centroid_lng = cluster.lng_sum / cluster.member_count
+        cluster.cell = geo.encode(cluster.centroid_lat, cluster.centroid_lng, CLUSTER_CELL_PRECISION)
+
+
+def _in_reach(clusters: Iterable[HotspotCluster], lat: float, lng: float) -> List[HotspotCluster]:
+    reachable = [
+        (geo.haversine_m(lat, lng, cluster.centroid_lat, cluster.centroid_lng), cluster)
+        for cluster in clusters
+        if cluster.member_count > 0
+    ]
+    reachable = [(distance, cluster) for distance, cluster in reachable if distance <= CLUSTER_RADIUS_M]
+    # Largest first, nearest breaking ties
+    reachable.sort(key=lambda pair: (-pair[1].member_count, pair[0]))
+    return [cluster for _, cluster in reachable]
+
+
+def _resolve(merged: Dict[str, str], cluster_id: str) -> str:
+    while cluster_id in merged:
+        cluster_id = merged[cluster_id]
+    return cluster_id
+
+
+async def _merge_into(db: AsyncSession, target: HotspotCluster, other: HotspotCluster):
+    _absorb(target, other)
+    await db.execute(
+        update(Report)
+        .where(Report.cluster_id == other.id)
+        .values(cluster_id=target.id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(HotspotCluster).where(HotspotCluster.id == other.id))
+    db.expunge(other)
+
+
+async def _place(db: AsyncSession, report: Report, merged: Dict[str, str]) -> HotspotCluster:
+    if not _has_point(report):
+        key = normalize_location(report.location)
+        cluster = await db.scalar(
+            select(HotspotCluster).where(HotspotCluster.location_key == key).limit(1)
+        )
+        if cluster is None:
+            cluster = _new_cluster(report)
+            db.add(cluster)
+        return cluster
+
+    lat, lng = report.latitude, report.longitude
+    candidates = (await db.scalars(
+        select(HotspotCluster)
+        .where(HotspotCluster.cell.in_(geo.neighbourhood(lat, lng, CLUSTER_CELL_PRECISION)))
+        .with_for_update()
+    )).all()
+    reachable = _in_reach(candidates, lat, lng)
+    if not reachable:
+        cluster = _new_cluster(report)
+        db.add(cluster)
+    else:
+        cluster = reachable[0]
+        for other in reachable[1:]:
+            await _merge_into(db, cluster, other)
+            merged[other.id] = cluster.id
+    _add_point(cluster, lat, lng)
+    return cluster
+
+
+async def assign_clusters(db: AsyncSession, reports: Iterable[Report]) -> List[Tuple[str, str]]:
+    """Put newly verified reports into hotspot clusters (sets ``cluster_id``).
+
+    Runs in the caller's transaction. Returns the ``(absorbed, surviving)``
+    cluster id pairs of any merges, whose hotspot buckets the caller must
+    fold together (``hotspots.merge_cluster_buckets``).
+    """
+    reports = list(reports)
+    merged: Dict[str, str] = {}
+    for report in reports:
+        cluster = await _place(db, report, merged)
+        report.cluster_id = cluster.id
+        # Later reports in the batch must see this cluster
+        await db.flush([cluster])
+    for report in reports:
+        report.cluster_id = _resolve(merged, report.cluster_id)
+    return [(absorbed, _resolve(merged, absorbed)) for absorbed in merged]
+
+
+async def release_clusters(db: AsyncSession, reports: Iterable[Report]):
+    """Take reports that are no longer verified out of their clusters."""
+    for report in reports:
+        if report.cluster_id is None:
+            continue
+        cluster = await db.get(HotspotCluster, report.cluster_id, with_for_update=True)
+        if cluster is not None and _has_point(report):
+            _add_point(cluster, report.latitude, report.longitude, sign=-1)
+        report.cluster_id = None
+
+
+def cluster_all(reports: Iterable[Tuple[str, Optional[float], Optional[float], str]]
+                ) -> Tuple[List[HotspotCluster], Dict[str, str]]:
+    """Cluster ``(report id, lat, lng, location)`` rows from scratch, in order.
+
+    Returns the clusters and a report id -> cluster id map. Same rules as
+    ``assign_clusters``, with the candidate lookup done in memory.
+    """
+    by_cell: Dict[str, List[HotspotCluster]] = {}
+    by_key: Dict[str, HotspotCluster] = {}
+    clusters: Dict[str, HotspotCluster] = {}
+    merged: Dict[str, str] = {}
+    assignment = {}
+
+    for report_id, lat, lng, location in reports:
+        row = Report(latitude=lat, longitude=lng, location=location)
+        if not _has_point(row):
+            key = normalize_location(location)
+            cluster = by_key.get(key)
+            if cluster is None:
+                cluster = by_key[key] = _new_cluster(row)
+                clusters[cluster.id] = cluster
+            assignment[report_id] = cluster.id
+            continue
+
+        candidates = [
+            cluster
+            for cell in geo.neighbourhood(lat, lng, CLUSTER_CELL_PRECISION)
+            for cluster in by_cell.get(cell, ())
+        ]
+        reachable = _in_reach(candidates, lat, lng)
+        if not reachable:
+            cluster = _new_cluster(row)
+            clusters[cluster.id] = cluster
+        else:
+            cluster = reachable[0]
+            # Re-filed below, once the centroid (and maybe its cell) has moved
+            by_cell[cluster.cell].remove(cluster)
+            for other in reachable[1:]:
+                by_cell[other.cell].remove(other)
+                _absorb(cluster, other)
+                merged[other.id] = cluster.id
+                del clusters[other.id]
+        _add_point(cluster, lat, lng)
+        by_cell.setdefault(cluster.cell, []).append(cluster)
+        assignment[report_id] = cluster.id
+
+    return list(clusters.values()), {
+        report_id: _resolve(merged, cluster_id) for report_id, cluster_id in assignment.items()
+    }
@@ -0,0 +1,132 @@
+"""Resized previews of stored report images.
+
+Each image blob gets a small ``thumb`` and a ``medium`` preview in WebP and
+JPEG. They are written next to the originals under
+``derived/ab/cd/<hash>/<variant>.<format>`` and generated in the background
+after upload, or on demand when a derivative is requested before the
+background job has run. Derivatives depend only on the blob content and
+``DERIVATIVE_VERSION``, so their URLs can be cached forever.
+"""
+import io
+import logging
+import os
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from app.models.models import MediaBlob
+from app.services.media import get_media_backend
+
+# Bump to invalidate every cached derivative after changing sizes or quality
+DERIVATIVE_VERSION = os.getenv("DERIVATIVE_VERSION", "1")
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+
+# Longest edge in pixels
+VARIANTS = {
+    "thumb": int(os.getenv("THUMBNAIL_SIZE", "320")),
+    "medium": int(os.getenv("PREVIEW_SIZE", "1280")),
+}
+
+# URL extension -> (Pillow format, mime type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+logger = logging.getLogger(__name__)
+
+
+def derivative_key(content_hash: str, variant: str, extension: str) -> str:
+    return f"derived/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}/{variant}.{extension}"
+
+
+def derivative_url(content_hash: Optional[str], variant: str, extension: str = "webp") -> Optional[str]:
+    """API URL of a derivative, or None for reports without an image."""
+    if not content_hash:
+        return None
+    return f"/api/media/{content_hash}/{variant}.{extension}"
+
+
+def original_url(content_hash: Optional[str]) -> Optional[str]:
+    """API URL of a full-resolution original (admins only)."""
+    if not content_hash:
+        return None
+    return f"/api/media/{content_hash}/original"
+
+
+def media_url(blob: MediaBlob) -> str:
+    """URL a report links its file by: the medium preview of an image, the
+    original for other media."""
+    if blob.mime_type in IMAGE_MIME_TYPES:
+        return derivative_url(blob.content_hash, "medium")
+    return original_url(blob.content_hash)
+
+
+def derivative_etag(content_hash: str, variant: str, extension: str) -> str:
+    return f'"{content_hash}-{variant}-{extension}-v{DERIVATIVE_VERSION}"'
+
+
+def _load(storage_key: str) -> Image.Image:
+    with get_media_backend().open(storage_key) as source:
+        image = Image.open(source)
+        # Let the JPEG decoder downscale while decoding, far cheaper than a
+        # full-resolution decode followed by a resize
+        image.draft("RGB", (VARIANTS["medium"], VARIANTS["medium"]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.load()
+    return image
+
+
+def _encode(image: Image.Image, size: int, extension: str) -> bytes:
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, FORMATS[extension][0], quality=DERIVATIVE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_derivative(content_hash: str, storage_key: str, variant: str, extension: str) -> bytes:
+    """Render one derivative, store it and return its bytes. Blocking."""
+    data = _encode(_load(storage_key), VARIANTS[variant], extension)
+    get_media_backend().write(derivative_key(content_hash, variant, extension), data)
+    return data
+
+
+def generate_all(content_hash: str, storage_key: str):
+    """Render every missing derivative of a blob, decoding the original once.
+
+    Runs as a background task after upload; images that fail to decode are
+    logged and skipped.
+    """
+    backend = get_media_backend()
+    missing = [
+        (variant, extension)
+        for variant in VARIANTS
+        for extension in FORMATS
+        if not backend.exists(derivative_key(content_hash, variant, extension))
+    ]
+    if not missing:
+        return
+
+    try:
+        image = _load(storage_key)
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("Could not decode %s for previews", storage_key)
+        return
+    for variant, extension in missing:
+        data = _encode(image, VARIANTS[variant], extension)
+        backend.write(derivative_key(content_hash, variant, extension), data)
+
+
+def read_derivative(content_hash: str, variant: str, extension: str) -> Optional[bytes]:
+    """Return a stored derivative, or None when it has not been generated."""
+    backend = get_media_backend()
+    key = derivative_key(content_hash, variant, extension)
+    if not backend.exists(key):
+        return None
+    with backend.open(key) as stored:
+        return stored.read()
@@ -0,0 +1,113 @@
+"""Server-side vehicle detection for uploaded report images.
+
+Pending image reports that have not been through detection yet form the
+queue. A worker claims up to ``DETECTION_BATCH_SIZE`` of them (``SKIP
+LOCKED`` on PostgreSQL, so several workers can run side by side), runs the
+whole micro-batch through one inference call and writes the top detection
+back to ``detection_confidence`` / ``detected_class``:
+
+    python -m app.services.detection [--once] [--batch-size N]
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.ml.config import MODEL_INPUT_SIZE
+from app.ml.detector import DETECTION_BATCH_SIZE, Detector
+from app.models.models import MediaBlob, Report, ReportStatus
+from app.services.derivatives import IMAGE_MIME_TYPES
+from app.services.media import get_media_backend
+
+DETECTION_POLL_INTERVAL = float(os.getenv("DETECTION_POLL_INTERVAL", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def claim_batch(db: Session, limit: int):
+    """Lock and return up to ``limit`` ``(report, storage_key)`` pairs."""
+    query = (
+        db.query(Report, MediaBlob.storage_key)
+        .join(MediaBlob, MediaBlob.content_hash == Report.image_hash)
+        .filter(
+            Report.status == ReportStatus.PENDING,
+            Report.detected_at.is_(None),
+            MediaBlob.mime_type.in_(IMAGE_MIME_TYPES),
+        )
+        .order_by(Report.created_at, Report.id)
+        .limit(limit)
+    )
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(of=Report, skip_locked=True)
+    return query.all()
+
+
+def _load_image(storage_key: str) -> Optional[Image.Image]:
+    try:
+        with get_media_backend().open(storage_key) as source:
+            image = Image.open(source)
+            # JPEGs decode straight at reduced scale; the letterbox only needs
+            # 640px and only confidence and class are kept, not box coordinates
+            image.draft("RGB", (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+            image.load()
+        return image
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("Could not decode %s for detection", storage_key)
+        return None
+
+
+def process_batch(db: Session, detector: Detector, batch_size: int = DETECTION_BATCH_SIZE) -> int:
+    """Run detection for one claimed micro-batch; returns the reports done."""
+    claimed = claim_batch(db, batch_size)
+    if not claimed:
+        db.rollback()
+        return 0
+
+    images = [_load_image(storage_key) for _, storage_key in claimed]
+    decodable = [i for i, image in enumerate(images) if image is not None]
+    detections = dict(zip(decodable, detector.detect([images[i] for i in decodable])))
+
+    now = datetime.now(timezone.utc)
+    for i, (report, _) in enumerate(claimed):
+        found = detections.get(i) or []
+        best = max(found, key=lambda detection: detection.confidence, default=None)
+        # Undecodable images are marked done too, so they are not retried forever
+        report.detection_confidence = best.confidence if best else 0.0
+        report.detected_class = best.class_name if best else None
+        report.detected_at = now
+
+    db.commit()
+    return len(claimed)
+
+
+def run_worker(batch_size: int = DETECTION_BATCH_SIZE, once: bool = False):
+    from app.database import SessionLocal
+
+    detector = Detector()
+    while True:
+        session = SessionLocal()
+        try:
+            done = process_batch(session, detector, batch_size)
+        finally:
+            session.close()
+        if done:
+            logger.info("Ran detection on %d reports", done)
+        if once and done < batch_size:
+            return
+        if not done:
+            time.sleep(DETECTION_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle detection worker")
+    parser.add_argument("--batch-size", type=int, default=DETECTION_BATCH_SIZE)
+    parser.add_argument("--once", action="store_true", help="drain the queue and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_worker(args.batch_size, args.once)
@@ -0,0 +1,226 @@
+"""Near-duplicate report detection at submission time.
+
+Each image report gets a perceptual hash (``app.utils.phash``) and one
+``report_fingerprints`` row per hash segment. A new report is compared with
+reports from the last ``DUPLICATE_WINDOW_HOURS`` in its own and the
+neighbouring ~150 m geohash cells (or with the same normalized location
+when it has no coordinates); the candidates come from exact segment
+lookups on ``ix_report_fingerprints_lookup``, so the cost depends on the
+reports nearby rather than on how many hashes are stored. A match within
+``DUPLICATE_MAX_DISTANCE`` bits links the report through ``duplicate_of``
+to the earliest report of the group; it still enters the admin queue,
+flagged, and earns no points once its original is verified. Flat, low
+texture images get no hash, since theirs would match any other flat image.
+
+Index reports created before fingerprints existed with:
+
+    python -m app.services.duplicates
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import MediaBlob, Report, ReportFingerprint, ReportStatus
+from app.services.clusters import normalize_location
+from app.services.media import get_media_backend
+from app.utils import geo, phash
+
+# Bits out of 64 that may differ; up to 7 needs only one-bit segment probes
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "6"))
+DUPLICATE_WINDOW_HOURS = float(os.getenv("DUPLICATE_WINDOW_HOURS", "24"))
+# Images flatter than this (thumbnail grayscale std dev, 0-255) or whose hash
+# has fewer than DUPLICATE_MIN_HASH_BITS set or unset bits are not linked
+DUPLICATE_MIN_CONTRAST = float(os.getenv("DUPLICATE_MIN_CONTRAST", "4"))
+DUPLICATE_MIN_HASH_BITS = int(os.getenv("DUPLICATE_MIN_HASH_BITS", "4"))
+# ~150 m cells; a match can sit in any of the nine around the report
+DUPLICATE_CELL_PRECISION = 7
+
+logger = logging.getLogger(__name__)
+
+
+def compute_phash(storage_key: str, path: Optional[str] = None) -> Optional[str]:
+    """Perceptual hash of a stored image as hex. Blocking.
+
+    None if the image cannot be decoded or is too flat to tell apart.
+    ``path`` reads an upload that has not been promoted into the store yet.
+    """
+    try:
+        with (open(path, "rb") if path else get_media_backend().open(storage_key)) as source:
+            image = Image.open(source)
+            # JPEGs decode straight to grayscale at 1/8 scale; 9x8 is all we need
+            image.draft("L", (64, 64))
+            image = ImageOps.exif_transpose(image)
+            value = phash.dhash(image)
+            if phash.low_information(image, value, DUPLICATE_MIN_CONTRAST, DUPLICATE_MIN_HASH_BITS):
+                return None
+            return phash.to_hex(value)
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("Could not decode %s for a perceptual hash", storage_key)
+        return None
+
+
+def _has_point(report: Report) -> bool:
+    return report.latitude is not None and report.longitude is not None
+
+
+def _cell(report: Report) -> Optional[str]:
+    if _has_point(report):
+        return geo.encode(report.latitude, report.longitude, DUPLICATE_CELL_PRECISION)
+    key = normalize_location(report.location)
+    # "~" never occurs in a geohash, so text keys cannot collide with cells
+    return f"~{key}" if key else None
+
+
+def _search_cells(report: Report) -> List[str]:
+    if _has_point(report):
+        return geo.neighbourhood(report.latitude, report.longitude, DUPLICATE_CELL_PRECISION)
+    cell = _cell(report)
+    return [cell] if cell else []
+
+
+def _fingerprints(report: Report, cell: str, created_at: datetime) -> List[ReportFingerprint]:
+    return [
+        ReportFingerprint(report_id=report.id, segment=index, value=value, cell=cell, created_at=created_at)
+        for index, value in enumerate(phash.segments(phash.from_hex(report.phash)))
+    ]
+
+
+async def find_duplicate(db: AsyncSession, report: Report, now: datetime) -> Optional[Report]:
+    """The closest earlier report near ``report`` with a near-identical image."""
+    cells = _search_cells(report)
+    if not report.phash or not cells:
+        return None
+
+    value = phash.from_hex(report.phash)
+    radius = DUPLICATE_MAX_DISTANCE // phash.SEGMENTS
+    probes = or_(*(
+        and_(ReportFingerprint.segment == index,
+             ReportFingerprint.value.in_(phash.segment_probes(segment, radius)))
+        for index, segment in enumerate(phash.segments(value))
+    ))
+    candidate_ids = select(ReportFingerprint.report_id).where(
+        probes,
+        ReportFingerprint.cell.in_(cells),
+        ReportFingerprint.created_at >= now - timedelta(hours=DUPLICATE_WINDOW_HOURS),
+    )
+    candidates = (await db.scalars(
+        select(Report).where(
+            Report.id.in_(candidate_ids),
+            Report.id != report.id,
+            Report.status != ReportStatus.REJECTED,
+        )
+    )).all()
+
+    # Segment hits are only candidates; confirm on the full hash
+    matches = [
+        (distance, candidate.created_at, candidate.id, candidate)
+        for candidate in candidates
+        if (distance := phash.hamming(value, phash.from_hex(candidate.phash))) <= DUPLICATE_MAX_DISTANCE
+    ]
+    if not matches:
+        return None
+    return min(matches, key=lambda match: match[:3])[3]
+
+
+def _same_place(report: Report, other: Report) -> bool:
+    return _cell(other) in _search_cells(report)
+
+
+async def link_duplicates(db: AsyncSession, reports: List[Report]) -> datetime:
+    """Set ``duplicate_of`` on new reports that have a near match.
+
+    Reports are compared with stored fingerprints and with the reports
+    before them in ``reports``, so a burst uploaded together is linked too.
+    ``duplicate_of`` always names the first report of a group rather than a
+    duplicate. Returns the timestamp to index the reports with.
+    """
+    now = datetime.utcnow()
+    earlier: List[Report] = []
+    for report in reports:
+        if not report.phash or _cell(report) is None:
+            continue
+        original = await find_duplicate(db, report, now)
+        if original is None:
+            value = phash.from_hex(report.phash)
+            original = min(
+                (other for other in earlier
+                 if _same_place(report, other)
+                 and phash.hamming(value, phash.from_hex(other.phash)) <= DUPLICATE_MAX_DISTANCE),
+                key=lambda other: phash.hamming(value, phash.from_hex(other.phash)),
+                default=None,
+            )
+        if original is not None:
+            report.duplicate_of = original.duplicate_of or original.id
+        earlier.append(report)
+    return now
+
+
+def index_reports(db: AsyncSession, reports: List[Report], now: datetime):
+    """Add the fingerprint rows of stored reports to the session."""
+    for report in reports:
+        cell = _cell(report)
+        if report.phash and cell is not None:
+            db.add_all(_fingerprints(report, cell, now))
+
+
+async def link_duplicate(db: AsyncSession, report: Report) -> Optional[str]:
+    """Flag ``report`` as a duplicate if it has a near match, and index its hash.
+
+    Call before committing a new report whose ``phash`` is set. Returns
+    ``duplicate_of``. Two near-identical uploads committed at the same
+    moment may not see each other.
+    """
+    now = await link_duplicates(db, [report])
+    index_reports(db, [report], now)
+    return report.duplicate_of
+
+
+def backfill_fingerprints(db: Session, batch_size: int = 200) -> int:
+    """Hash and index image reports that predate fingerprints.
+
+    Existing reports are not linked to each other, only made findable for
+    new submissions. Returns the number of reports indexed; commits once
+    per batch.
+    """
+    indexed = 0
+    last_id = ""
+    while True:
+        rows = (
+            db.query(Report, MediaBlob.storage_key)
+            .join(MediaBlob, MediaBlob.content_hash == Report.image_hash)
+            .filter(Report.phash.is_(None), Report.id > last_id)
+            .order_by(Report.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return indexed
+        # Replace whatever a previous, interrupted run left behind
+        db.query(ReportFingerprint).filter(
+            ReportFingerprint.report_id.in_([report.id for report, _ in rows])
+        ).delete(synchronize_session=False)
+        for report, storage_key in rows:
+            report.phash = compute_phash(storage_key)
+            cell = _cell(report)
+            if report.phash and cell is not None:
+                db.add_all(_fingerprints(report, cell, report.created_at or datetime.utcnow()))
+                indexed += 1
+        last_id = rows[-1][0].id
+        db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        written = backfill_fingerprints(session)
+    finally:
+        session.close()
+    print(f"Indexed perceptual hashes for {written} reports.")
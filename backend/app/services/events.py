@@ -0,0 +1,204 @@
+"""In-process pub/sub for live report activity, served as server-sent events.
+
+Routes publish after their transaction commits; each SSE client holds a
+``Subscription`` with a bounded queue. Publishing never waits on a client:
+events are encoded once per publish and pushed with ``put_nowait``, and a
+client whose queue is full has its backlog dropped and receives a single
+``resync`` event telling it to reload the full view instead.
+
+Recent events are kept per topic so a reconnecting client (``Last-Event-ID``)
+receives what it missed. The bus lives in one worker process; with several
+workers each one streams the events it handled itself. Event ids are
+``<epoch>-<sequence>`` with an epoch drawn when the bus is created, so an id
+from before a restart or from another worker is recognised as foreign and
+answered with ``resync`` instead of being matched against unrelated events.
+"""
+import asyncio
+import itertools
+import json
+import os
+import secrets
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Report
+from app.services.reporters import ANONYMOUS_REPORTER, load_reporter_names
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "256"))
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "2000"))
+EVENT_HEARTBEAT_INTERVAL = float(os.getenv("EVENT_HEARTBEAT_INTERVAL", "15"))
+
+# Topics: "shame" carries public verified activity, "admin" every queue change
+SHAME_TOPIC = "shame"
+ADMIN_TOPIC = "admin"
+
+RESYNC_FRAME = "event: resync\ndata: {}\n\n"
+HEARTBEAT_FRAME = ": keep-alive\n\n"
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, frame: str):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too slow to keep up: replace the backlog with a resync marker
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC_FRAME)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE, history_size: int = EVENT_HISTORY_SIZE,
+                 max_subscribers: int = EVENT_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.epoch = secrets.token_hex(4)
+        self._ids = itertools.count(1)
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._history: Dict[str, Deque[Tuple[int, str]]] = {}
+        self._history_size = history_size
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, topic: str, event_type: str, data: dict) -> str:
+        """Fan an event out to every subscriber of ``topic``; returns its id.
+
+        Must be called from the event loop thread.
+        """
+        event_id = next(self._ids)
+        frame = (f"id: {self.epoch}-{event_id}\nevent: {event_type}\n"
+                 f"data: {json.dumps(jsonable_encoder(data))}\n\n")
+        history = self._history.setdefault(topic, deque(maxlen=self._history_size))
+        history.append((event_id, frame))
+        for subscription in self._subscribers.get(topic, ()):
+            subscription.push(frame)
+        self.published += 1
+        return f"{self.epoch}-{event_id}"
+
+    def _sequence(self, last_event_id: str) -> Optional[int]:
+        """Sequence number of one of this bus's ids, None for any other value."""
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, topic: str, last_event_id: Optional[str] = None) -> Subscription:
+        """Subscribe to ``topic``, replaying what followed ``last_event_id``."""
+        if self.is_full():
+            raise TooManySubscribers()
+        subscription = Subscription(topic, self.queue_size)
+        if last_event_id is not None:
+            history = self._history.get(topic, ())
+            last_event_id = self._sequence(last_event_id)
+            if (last_event_id is None or not history
+                    or not history[0][0] - 1 <= last_event_id <= history[-1][0]):
+                # The id is from before a restart or another worker, or part
+                # of the gap has left the history: nothing can be replayed
+                subscription.push(RESYNC_FRAME)
+            else:
+                for event_id, frame in history:
+                    if event_id > last_event_id:
+                        subscription.push(frame)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def is_full(self) -> bool:
+        return self.subscriber_count >= self.max_subscribers
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.get(subscription.topic, set()).discard(subscription)
+
+    async def stream(self, topic: str, last_event_id: Optional[str] = None,
+                     heartbeat: float = EVENT_HEARTBEAT_INTERVAL) -> AsyncIterator[str]:
+        """SSE frames for ``topic``.
+
+        The subscription is taken once the response starts streaming and
+        dropped when the client goes away, so a client that disconnects
+        before the first frame never holds one.
+        """
+        try:
+            subscription = self.subscribe(topic, last_event_id)
+        except TooManySubscribers:
+            # Filled up since the route checked: ask the client to come back later
+            yield "retry: 10000\n\n"
+            return
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": {topic: len(subscribers) for topic, subscribers in self._subscribers.items()},
+            "published": self.published,
+        }
+
+
+event_bus = EventBus()
+
+
+def _activity(report: Report, reporter_name: str) -> dict:
+    """Same shape as a Hall of Shame ``recent_activity`` item."""
+    return {
+        "id": report.id,
+        "violation_type": report.violation_type,
+        "location": {
+            "address": report.location,
+            "latitude": report.latitude,
+            "longitude": report.longitude,
+        },
+        "timestamp": report.created_at,
+        "detection_confidence": report.detection_confidence,
+        "reporter_name": reporter_name,
+    }
+
+
+async def publish_report_created(db: AsyncSession, report: Report):
+    names = await load_reporter_names(db, [report])
+    event_bus.publish(ADMIN_TOPIC, "report.created", {
+        **_activity(report, names.get(report.user_id, ANONYMOUS_REPORTER)),
+        "status": report.status,
+    })
+
+
+async def publish_verification_results(db: AsyncSession, results: Iterable[dict]):
+    """Publish ``report.verified`` / ``report.rejected`` for changed reports.
+
+    Call after commit with the results of ``apply_verifications``.
+    """
+    changed = {result["report_id"]: result["status"] for result in results
+               if result["status"] in ("verified", "rejected")}
+    if not changed:
+        return
+
+    reports = (await db.scalars(select(Report).where(Report.id.in_(list(changed))))).all()
+    names = await load_reporter_names(db, reports)
+    for report in reports:
+        status = changed[report.id]
+        item = _activity(report, names.get(report.user_id, ANONYMOUS_REPORTER))
+        event_bus.publish(ADMIN_TOPIC, f"report.{status}", {**item, "status": status})
+        if status == "verified":
+            event_bus.publish(SHAME_TOPIC, "report.verified", item)
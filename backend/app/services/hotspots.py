@@ -0,0 +1,406 @@
+"""Hall of Shame hotspot aggregate.
+
+``offender_statistics`` holds one row per (hotspot cluster, violation type,
+day) with running totals for verified reports; clusters come from
+``app.services.clusters``. Verification updates it in the same transaction
+as the status change, and ``rebuild_hotspots`` re-clusters and regenerates it
+from ``reports`` through the sync engine:
+
+    python -m app.services.hotspots
+"""
+from datetime import date, datetime, time, timezone
+from typing import Iterable, Optional
+from uuid import uuid4
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import HotspotCluster, OffenderStatistic, Report, ReportStatus
+from app.services.clusters import cluster_all
+from app.utils.sql import greatest, upsert_insert
+
+
+def day_bucket(timestamp: datetime) -> date:
+    """Return the UTC day a report timestamp falls into."""
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+
+def _fold(buckets: dict, report, sign: int = 1):
+    """Add one report to its (cluster, type, UTC day) bucket in ``buckets``."""
+    key = (report.cluster_id, report.violation_type, day_bucket(report.created_at))
+    row = buckets.get(key)
+    if row is None:
+        row = buckets[key] = {
+            "id": str(uuid4()),
+            "cluster_id": report.cluster_id,
+            "detected_object_type": report.violation_type,
+            "detected_at_location": report.location,
+            "bucket_date": key[2],
+            "total_violations": 0,
+            "confidence_sum": 0.0,
+            "points_sum": 0,
+            "most_recent_violation_date": report.created_at,
+        }
+    row["total_violations"] += sign
+    row["confidence_sum"] += sign * (report.detection_confidence or 0.0)
+    row["points_sum"] += sign * (report.points_awarded or 0)
+    latest = report.created_at
+    if latest is not None and (row["most_recent_violation_date"] is None
+                               or latest > row["most_recent_violation_date"]):
+        row["most_recent_violation_date"] = latest
+
+
+def window_start(start_date: datetime) -> datetime:
+    """Midnight UTC of the day ``start_date`` falls into, as a naive datetime.
+
+    Buckets are whole days, so every figure over a window starts here.
+    """
+    return datetime.combine(day_bucket(start_date), time.min)
+
+
+async def record_verified_reports(db: AsyncSession, reports: Iterable[Report], sign: int = 1):
+    """Add (or with ``sign=-1`` remove) verified reports from their buckets.
+
+    Reports are folded per bucket first and written with one multi-row
+    atomic upsert, so concurrent verifications never lose increments. The
+    caller owns the transaction.
+    """
+    buckets = {}
+    for report in reports:
+        _fold(buckets, report, sign)
+
+    await _upsert_buckets(db, list(buckets.values()))
+
+
+async def _upsert_buckets(db: AsyncSession, rows: list):
+    """Add ``rows`` onto existing buckets, or insert them, in one statement."""
+    if not rows:
+        return
+
+    table = OffenderStatistic.__table__
+    insert = upsert_insert(db)
+    stmt = insert(table).values(rows)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cluster_id", "detected_object_type", "bucket_date"],
+        set_={
+            "total_violations": table.c.total_violations + excluded.total_violations,
+            "confidence_sum": table.c.confidence_sum + excluded.confidence_sum,
+            "points_sum": table.c.points_sum + excluded.points_sum,
+            "most_recent_violation_date": greatest(
+                table.c.most_recent_violation_date, excluded.most_recent_violation_date
+            ),
+            "updated_at": func.now(),
+        },
+    )
+    await db.execute(stmt)
+
+
+async def merge_cluster_buckets(db: AsyncSession, source_id: str, target_id: str):
+    """Fold the buckets of a cluster merged away into the surviving cluster."""
+    columns = [
+        column for column in OffenderStatistic.__table__.columns
+        if column.name not in ("id", "cluster_id", "updated_at")
+    ]
+    rows = (await db.execute(
+        select(*columns).where(OffenderStatistic.cluster_id == source_id)
+    )).mappings().all()
+    await db.execute(delete(OffenderStatistic).where(OffenderStatistic.cluster_id == source_id))
+    await _upsert_buckets(db, [
+        {**row, "id": str(uuid4()), "cluster_id": target_id} for row in rows
+    ])
+
+
+def rebuild_hotspots(db: Session) -> int:
+    """Re-cluster verified reports and regenerate ``offender_statistics``.
+
+    Returns the number of buckets written. Commits on success.
+    """
+    verified = (
+        db.query(Report.id, Report.latitude, Report.longitude, Report.location)
+        .filter(Report.status == ReportStatus.VERIFIED)
+        .order_by(Report.created_at, Report.id)
+        .yield_per(1000)
+    )
+    clusters, assignment = cluster_all(verified)
+
+    db.query(HotspotCluster).delete(synchronize_session=False)
+    db.execute(update(Report).values(cluster_id=None))
+    db.add_all(clusters)
+    db.flush()
+    mappings = [{"id": report_id, "cluster_id": cluster_id} for report_id, cluster_id in assignment.items()]
+    for start in range(0, len(mappings), 1000):
+        db.bulk_update_mappings(Report, mappings[start:start + 1000])
+
+    # Folded in Python with the same UTC day_bucket as the live path; the
+    # database's DATE() would bucket in the server's time zone
+    buckets = {}
+    verified = (
+        db.query(
+            Report.cluster_id,
+            Report.violation_type,
+            Report.location,
+            Report.created_at,
+            Report.detection_confidence,
+            Report.points_awarded,
+        )
+        .filter(Report.status == ReportStatus.VERIFIED)
+        .order_by(Report.created_at, Report.id)
+        .yield_per(1000)
+    )
+    for report in verified:
+        _fold(buckets, report)
+
+    db.query(OffenderStatistic).delete(synchronize_session=False)
+    rows = list(buckets.values())
+    for start in range(0, len(rows), 1000):
+        db.execute(OffenderStatistic.__table__.insert(), rows[start:start + 1000])
+    db.commit()
+    return len(rows)
+
+
+def _risk_level(total_violations: int) -> str:
+    if total_violations >= 5:
+        return "critical"
+    if total_violations >= 3:
+        return "high"
+    if total_violations >= 1:
+        return "medium"
+    return "low"
+
+
+def _offender(cluster_id, clusters, violation_type, count, latest, average_confidence,
+              unique_reporters, points) -> dict:
+    cluster = clusters.get(cluster_id)
+    return {
+        "cluster_id": cluster_id,
+        "violation_type": violation_type,
+        "location": {
+            "address": cluster.label if cluster else None,
+            "latitude": cluster.centroid_lat if cluster else None,
+            "longitude": cluster.centroid_lng if cluster else None,
+        },
+        "statistics": {
+            "total_violations": count,
+            "latest_violation": latest,
+            "average_confidence": average_confidence or 0.0,
+            "unique_reporters": unique_reporters,
+            "total_points_awarded": points or 0,
+        },
+        "risk_level": _risk_level(count),
+    }
+
+
+def _dominant_types(counts) -> dict:
+    """Most reported violation type per cluster from ``(cluster_id, type, count)`` rows."""
+    best = {}
+    for cluster_id, violation_type, count in counts:
+        current = best.get(cluster_id)
+        # Ties go to the alphabetically first type so the label is stable
+        if current is None or (count, current[1]) > (current[0], violation_type):
+            best[cluster_id] = (count, violation_type)
+    return {cluster_id: violation_type for cluster_id, (count, violation_type) in best.items()}
+
+
+async def _load_clusters(db: AsyncSession, cluster_ids) -> dict:
+    if not cluster_ids:
+        return {}
+    clusters = await db.scalars(select(HotspotCluster).where(HotspotCluster.id.in_(cluster_ids)))
+    return {cluster.id: cluster for cluster in clusters}
+
+
+async def top_offenders(db: AsyncSession, limit: int, vehicle_type: str, start_date: Optional[datetime]) -> dict:
+    """Rank hotspot clusters and compute overall stats from the aggregate table.
+
+    Buckets are whole days, so the window (the bucket sums and the reporter
+    counts alike) starts at midnight UTC of ``start_date``; without one
+    every bucket counts. Distinct reporter
+    counts are not additive across buckets and are resolved with
+    ``COUNT(DISTINCT)`` over ``reports`` for the returned clusters only.
+    """
+    stats_filters = []
+    report_filters = [Report.status == ReportStatus.VERIFIED]
+    if start_date is not None:
+        start = window_start(start_date)
+        stats_filters.append(OffenderStatistic.bucket_date >= start.date())
+        report_filters.append(Report.created_at >= start)
+    if vehicle_type and vehicle_type != "all":
+        stats_filters.append(OffenderStatistic.detected_object_type == vehicle_type)
+        report_filters.append(Report.violation_type == vehicle_type)
+
+    total = func.sum(OffenderStatistic.total_violations)
+    rows = (await db.execute(
+        select(
+            OffenderStatistic.cluster_id,
+            total.label("total"),
+            func.max(OffenderStatistic.most_recent_violation_date),
+            func.sum(OffenderStatistic.confidence_sum),
+            func.sum(OffenderStatistic.points_sum),
+        )
+        .where(*stats_filters)
+        .group_by(OffenderStatistic.cluster_id)
+        .having(total > 0)
+        .order_by(total.desc(), OffenderStatistic.cluster_id)
+        .limit(limit)
+    )).all()
+
+    cluster_ids = [row[0] for row in rows]
+    clusters = await _load_clusters(db, cluster_ids)
+    reporters_by_cluster = {}
+    types_by_cluster = {}
+    if cluster_ids:
+        reporters_by_cluster = dict((await db.execute(
+            select(Report.cluster_id, func.count(func.distinct(Report.user_id)))
+            .where(*report_filters, Report.cluster_id.in_(cluster_ids))
+            .group_by(Report.cluster_id)
+        )).all())
+        types_by_cluster = _dominant_types((await db.execute(
+            select(OffenderStatistic.cluster_id, OffenderStatistic.detected_object_type, total)
+            .where(*stats_filters, OffenderStatistic.cluster_id.in_(cluster_ids))
+            .group_by(OffenderStatistic.cluster_id, OffenderStatistic.detected_object_type)
+        )).all())
+
+    offenders = [
+        _offender(
+            cluster_id, clusters, types_by_cluster.get(cluster_id), count, latest,
+            (confidence or 0.0) / max(count, 1),
+            reporters_by_cluster.get(cluster_id, 0),
+            points,
+        )
+        for cluster_id, count, latest, confidence, points in rows
+    ]
+
+    by_type = dict((await db.execute(
+        select(OffenderStatistic.detected_object_type, total)
+        .where(*stats_filters)
+        .group_by(OffenderStatistic.detected_object_type)
+    )).all())
+    overall = (await db.execute(
+        select(
+            func.coalesce(total, 0),
+            func.coalesce(func.sum(OffenderStatistic.confidence_sum), 0.0),
+            func.coalesce(func.sum(OffenderStatistic.points_sum), 0),
+        )
+        .where(*stats_filters)
+    )).one()
+    unique_locations = await db.scalar(
+        select(func.count(func.distinct(OffenderStatistic.cluster_id)))
+        .where(*stats_filters, OffenderStatistic.total_violations > 0)
+    )
+    unique_reporters = await db.scalar(
+        select(func.count(func.distinct(Report.user_id)))
+        .where(*report_filters)
+    )
+
+    total_verified, confidence_sum, points_sum = overall
+    overall_stats = {
+        "total_verified_reports": total_verified,
+        "unique_locations": unique_locations,
+        "unique_reporters": unique_reporters,
+        "violations_by_type": {
+            "car": by_type.get("car") or 0,
+            "bike": by_type.get("bike") or 0,
+        },
+        "average_detection_confidence": confidence_sum / max(total_verified, 1),
+        "total_points_awarded": points_sum,
+    }
+
+    return {"offenders": offenders, "overall_stats": overall_stats}
+
+
+async def top_offenders_from_reports(db: AsyncSession, limit: int, vehicle_type: str,
+                                     start_date: Optional[datetime]) -> dict:
+    """Rank hotspot clusters and compute overall stats directly over ``reports``.
+
+    Query-engine mode: the database does all grouping, in one statement
+    returning at most ``limit`` hotspot rows, one labelling those rows with
+    their most reported violation type and one returning a single row of
+    overall stats. The window starts at midnight UTC of ``start_date``, as
+    in ``top_offenders``. Works on PostgreSQL and SQLite (3.30+ for ``FILTER``).
+    """
+    filters = [Report.status == ReportStatus.VERIFIED]
+    if start_date is not None:
+        filters.append(Report.created_at >= window_start(start_date))
+    if vehicle_type and vehicle_type != "all":
+        filters.append(Report.violation_type == vehicle_type)
+
+    count = func.count(Report.id)
+    rows = (await db.execute(
+        select(
+            Report.cluster_id,
+            count,
+            func.max(Report.created_at),
+            func.avg(Report.detection_confidence),
+            func.count(func.distinct(Report.user_id)),
+            func.sum(Report.points_awarded),
+        )
+        .where(*filters)
+        .group_by(Report.cluster_id)
+        .order_by(count.desc(), Report.cluster_id)
+        .limit(limit)
+    )).all()
+    cluster_ids = [row[0] for row in rows]
+    clusters = await _load_clusters(db, cluster_ids)
+    types_by_cluster = {}
+    if cluster_ids:
+        types_by_cluster = _dominant_types((await db.execute(
+            select(Report.cluster_id, Report.violation_type, count)
+            .where(*filters, or_(Report.cluster_id.in_(cluster_ids), Report.cluster_id.is_(None))
+                   if None in cluster_ids else Report.cluster_id.in_(cluster_ids))
+            .group_by(Report.cluster_id, Report.violation_type)
+        )).all())
+    offenders = [
+        _offender(row[0], clusters, types_by_cluster.get(row[0]), *row[1:])
+        for row in rows
+    ]
+
+    (
+        total_verified,
+        car_count,
+        bike_count,
+        unique_locations,
+        unique_reporters,
+        average_confidence,
+        points_sum,
+    ) = (await db.execute(
+        select(
+            count,
+            count.filter(Report.violation_type == "car"),
+            count.filter(Report.violation_type == "bike"),
+            func.count(func.distinct(Report.cluster_id)),
+            func.count(func.distinct(Report.user_id)),
+            func.coalesce(func.avg(Report.detection_confidence), 0.0),
+            func.coalesce(func.sum(Report.points_awarded), 0),
+        )
+        .where(*filters)
+    )).one()
+
+    overall_stats = {
+        "total_verified_reports": total_verified,
+        "unique_locations": unique_locations,
+        "unique_reporters": unique_reporters,
+        "violations_by_type": {
+            "car": car_count,
+            "bike": bike_count,
+        },
+        "average_detection_confidence": average_confidence,
+        "total_points_awarded": points_sum,
+    }
+
+    return {"offenders": offenders, "overall_stats": overall_stats}
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        written = rebuild_hotspots(session)
+    finally:
+        session.close()
+    print(f"Rebuilt {written} hotspot buckets.")
@@ -0,0 +1,177 @@
+"""Batched, idempotent report ingestion for offline sync.
+
+Field clients queue reports while offline, give each one a key of their
+own, and upload the queue in batches. A batch is stored in one
+transaction: images are streamed into the media store, then every new
+report goes in through a single multi-row ``INSERT ... ON CONFLICT DO
+NOTHING`` on ``uq_reports_user_idempotency_key``. A replayed batch, or a
+retry racing the original request, therefore maps each key back to the
+report created the first time instead of adding rows; keys already stored
+are recognised with one indexed lookup before any image is read.
+"""
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import MediaBlob, Report, ReportStatus
+from app.schemas.schemas import ReportBatchItem
+from app.services import derivatives, duplicates, media, trends
+from app.utils.geo import encode as geohash_encode
+from app.utils.sql import upsert_insert
+
+REPORT_BATCH_MAX_ITEMS = int(os.getenv("REPORT_BATCH_MAX_ITEMS", "50"))
+
+# Written explicitly for every row so the multi-row VALUES stays uniform
+_BATCH_COLUMNS = (
+    "id", "user_id", "violation_type", "location", "description", "image_url", "image_hash",
+    "phash", "duplicate_of", "idempotency_key", "latitude", "longitude", "geohash", "status",
+    "detection_confidence", "points_awarded", "created_at",
+)
+
+
+@dataclass
+class BatchOutcome:
+    results: List[dict]
+    created: List[Report] = field(default_factory=list)
+    # Images of the created reports, for preview generation after commit
+    blobs: List[MediaBlob] = field(default_factory=list)
+
+
+async def _existing_reports(db: AsyncSession, user_id: str, keys: List[str]) -> Dict[str, str]:
+    if not keys:
+        return {}
+    rows = await db.execute(
+        select(Report.idempotency_key, Report.id)
+        .where(Report.user_id == user_id, Report.idempotency_key.in_(keys))
+    )
+    return dict(rows.all())
+
+
+async def _prepare(db: AsyncSession, user_id: str, item: ReportBatchItem,
+                   image: Optional[UploadFile]) -> Tuple[Report, Optional[MediaBlob]]:
+    blob = None
+    image_phash = None
+    if image is not None:
+        blob = await media.store_upload(db, image)
+        if blob.mime_type in derivatives.IMAGE_MIME_TYPES:
+            image_phash = await run_in_threadpool(
+                duplicates.compute_phash, blob.storage_key, media.pending_path(db, blob))
+
+    has_point = item.latitude is not None and item.longitude is not None
+    report = Report(
+        id=str(uuid4()),
+        user_id=user_id,
+        violation_type=item.violation_type,
+        location=item.location,
+        description=item.description,
+        image_url=derivatives.media_url(blob) if blob else None,
+        image_hash=blob.content_hash if blob else None,
+        phash=image_phash,
+        idempotency_key=item.idempotency_key,
+        latitude=item.latitude,
+        longitude=item.longitude,
+        geohash=geohash_encode(item.latitude, item.longitude) if has_point else None,
+        status=ReportStatus.PENDING,
+        detection_confidence=0.0,
+        points_awarded=0,
+        created_at=datetime.utcnow(),
+    )
+    return report, blob
+
+
+async def ingest_batch(db: AsyncSession, user_id: str, items: List[ReportBatchItem],
+                       images: List[UploadFile]) -> BatchOutcome:
+    """Store a batch of reports in the caller's transaction.
+
+    Returns one result per item, in order: ``created`` with the new report
+    id, ``duplicate`` with the id of the report the key already maps to
+    (stored earlier or by an earlier item of this batch), or ``error`` with
+    a ``detail`` when the item's image was rejected.
+    """
+    keys = list(dict.fromkeys(item.idempotency_key for item in items))
+    report_ids = await _existing_reports(db, user_id, keys)
+
+    errors: Dict[str, str] = {}
+    pending: List[Tuple[Report, Optional[MediaBlob]]] = []
+    seen = set(report_ids)
+    used_images = set()
+    for item in items:
+        key = item.idempotency_key
+        if key in seen:
+            continue
+        seen.add(key)
+        image = None
+        if item.image_index is not None:
+            if item.image_index >= len(images) or item.image_index in used_images:
+                errors[key] = "image_index must refer to an upload no other item uses"
+                continue
+            used_images.add(item.image_index)
+            image = images[item.image_index]
+        try:
+            pending.append(await _prepare(db, user_id, item, image))
+        except HTTPException as exc:
+            errors[key] = exc.detail
+
+    outcome = BatchOutcome(results=[])
+    if pending:
+        reports = [report for report, _ in pending]
+        now = await duplicates.link_duplicates(db, reports)
+
+        table = Report.__table__
+        inserted = set((await db.scalars(
+            upsert_insert(db)(table)
+            .values([{column: getattr(report, column) for column in _BATCH_COLUMNS} for report in reports])
+            .on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+            .returning(table.c.id)
+        )).all())
+
+        created = []
+        lost_images = set()
+        for report, blob in pending:
+            if report.id in inserted:
+                created.append(report)
+                if blob is not None:
+                    media.attach_to_report(db, report.id, blob)
+                    outcome.blobs.append(blob)
+            elif blob is not None:
+                # A concurrent request stored this key first; drop our image reference
+                await media.release_blob(db, blob.content_hash)
+                lost_images.add(blob.content_hash)
+        # Nothing this transaction commits refers to these uploads: don't store them
+        for content_hash in lost_images - {blob.content_hash for blob in outcome.blobs}:
+            await media.discard_pending(db, content_hash)
+        duplicates.index_reports(db, created, now)
+        await trends.record_new_reports(db, created)
+
+        lost = [report.idempotency_key for report in reports if report.id not in inserted]
+        report_ids.update(await _existing_reports(db, user_id, lost))
+        report_ids.update({report.idempotency_key: report.id for report in created})
+        # Reload the stored rows for the response
+        stored = {
+            report.id: report
+            for report in (await db.scalars(select(Report).where(Report.id.in_(list(inserted))))).all()
+        }
+        outcome.created = [stored[report.id] for report in created]
+
+    created = {report.idempotency_key: report for report in outcome.created}
+    reported = set()
+    for index, item in enumerate(items):
+        key = item.idempotency_key
+        result = {"index": index, "idempotency_key": key}
+        if key in errors:
+            result.update(status="error", detail=errors[key])
+        elif key in created and key not in reported:
+            report = created[key]
+            result.update(status="created", report_id=report.id, duplicate_of=report.duplicate_of)
+        else:
+            result.update(status="duplicate", report_id=report_ids.get(key))
+        reported.add(key)
+        outcome.results.append(result)
+    return outcome
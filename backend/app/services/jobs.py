@@ -0,0 +1,284 @@
+"""Database-backed job queue for work that can run after the request.
+
+Routes call ``enqueue`` inside their own transaction, so a job exists
+exactly when the change that caused it commits. Workers claim due jobs in
+small batches: ``FOR UPDATE SKIP LOCKED`` on PostgreSQL, a per-row
+compare-and-swap on SQLite. A claim leases the job for
+``JOB_VISIBILITY_TIMEOUT`` seconds; a job whose worker dies is claimed
+again when the lease runs out.
+
+A handler runs in the same transaction that marks its job done, and that
+update only matches while the worker still holds the lease, so a handler's
+database writes commit at most once even when a slow job is re-claimed.
+Side effects outside the database that must follow the commit register
+with ``on_commit``. Failures are retried with exponential backoff and
+jitter up to the job's ``max_attempts``, then left as ``failed`` with the
+last error.
+
+Handlers are registered with ``@job_handler`` in ``app.services.tasks``.
+Run workers with:
+
+    python -m app.services.jobs [--workers N] [--once] [--kind KIND ...]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+from uuid import uuid4
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from app.models.models import Job, JobStatus
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "5"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "600"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+# Claimable: queued and due, or running with an expired lease
+CLAIMABLE = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+JobHandler = Callable[[Session, dict], None]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+logger = logging.getLogger(__name__)
+
+
+def job_handler(kind: str):
+    """Register ``handler(db, payload)`` for jobs of ``kind``.
+
+    The handler's writes through ``db`` commit together with the job's
+    completion; it must not commit itself. Side effects outside the
+    database should be idempotent, since a job can run more than once.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def on_commit(db: Session, callback: Callable[[], None]):
+    """Run ``callback`` after the running job's transaction commits.
+
+    For side effects that must not happen if the job's writes are rolled
+    back or discarded, such as invalidating caches of what it wrote.
+    """
+    db.info.setdefault("on_commit", []).append(callback)
+
+
+def _run_commit_callbacks(db: Session, kind: str):
+    for callback in db.info.pop("on_commit", []):
+        try:
+            callback()
+        except Exception:
+            logger.exception("Post-commit callback of a %s job failed", kind)
+
+
+def has_pending(db: Session, kind: str) -> bool:
+    """True if another job of ``kind`` will start after the running job.
+
+    That is one still queued, or one later in the running job's own batch;
+    jobs running under other workers may have started before it.
+    """
+    job_id, lease = db.info.get("job", (None, None))
+    later_in_batch = and_(Job.status == JobStatus.RUNNING, Job.lease == lease, Job.id != job_id)
+    return db.query(Job.id).filter(
+        Job.kind == kind, or_(Job.status == JobStatus.QUEUED, later_in_batch)
+    ).first() is not None
+
+
+def enqueue(db, kind: str, payload: dict, delay: float = 0,
+            max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+    """Add a job to the caller's session; it becomes visible on commit.
+
+    Works with both ``Session`` and ``AsyncSession``.
+    """
+    job = Job(
+        id=str(uuid4()),
+        kind=kind,
+        payload=payload,
+        status=JobStatus.QUEUED,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        attempts=0,
+        max_attempts=max_attempts,
+    )
+    db.add(job)
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number ``attempts``: capped exponential, jittered."""
+    delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _claimable(now: datetime):
+    return (Job.status.in_(CLAIMABLE), Job.run_at <= now, Job.attempts < Job.max_attempts)
+
+
+def claim_jobs(db: Session, limit: int = JOB_BATCH_SIZE, kinds: Optional[Sequence[str]] = None,
+               visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> List[Job]:
+    """Lease up to ``limit`` due jobs, oldest first, and commit the claim."""
+    now = datetime.utcnow()
+    lease = str(uuid4())
+    claim = dict(
+        status=JobStatus.RUNNING,
+        lease=lease,
+        run_at=now + timedelta(seconds=visibility_timeout),
+        attempts=Job.attempts + 1,
+    )
+
+    # Leases that ran out on the last attempt: the worker died every time
+    db.execute(
+        update(Job)
+        .where(Job.status == JobStatus.RUNNING, Job.run_at <= now, Job.attempts >= Job.max_attempts)
+        .values(status=JobStatus.FAILED, finished_at=now, last_error="Lease expired on the last attempt")
+    )
+
+    query = db.query(Job.id).filter(*_claimable(now))
+    if kinds:
+        query = query.filter(Job.kind.in_(list(kinds)))
+    query = query.order_by(Job.run_at).limit(limit)
+
+    if db.bind.dialect.name == "postgresql":
+        ids = [job_id for job_id, in query.with_for_update(skip_locked=True).all()]
+        if ids:
+            db.execute(update(Job).where(Job.id.in_(ids)).values(**claim))
+    else:
+        # No row locks on SQLite: take each row only if it is still claimable
+        # when our UPDATE runs; a competing worker makes it match zero rows
+        for job_id, in query.all():
+            db.execute(update(Job).where(Job.id == job_id, *_claimable(now)).values(**claim))
+    db.commit()
+    return db.query(Job).filter(Job.lease == lease).order_by(Job.run_at).all()
+
+
+def _finish(db: Session, job_id: str, lease: str, values: dict) -> bool:
+    """Update a job only while our lease holds; False if it was re-claimed."""
+    result = db.execute(
+        update(Job).where(Job.id == job_id, Job.lease == lease).values(**values)
+    )
+    return result.rowcount == 1
+
+
+def run_job(db: Session, job: Job) -> bool:
+    """Run one leased job and record the outcome; True when it succeeded."""
+    # Plain values: a rollback expires the ORM object
+    job_id, kind, lease, attempts, max_attempts = job.id, job.kind, job.lease, job.attempts, job.max_attempts
+    handler = JOB_HANDLERS.get(kind)
+    db.info.pop("on_commit", None)
+    db.info["job"] = (job_id, lease)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{kind}'")
+        handler(db, job.payload)
+        done = dict(status=JobStatus.DONE, lease=None, finished_at=datetime.utcnow())
+        if _finish(db, job_id, lease, done):
+            db.commit()
+            _run_commit_callbacks(db, kind)
+            return True
+        logger.warning("Lost the lease on job %s (%s); discarding its result", job_id, kind)
+        db.info.pop("on_commit", None)
+        db.rollback()
+        return False
+    except Exception:
+        db.info.pop("on_commit", None)
+        db.rollback()
+        error = traceback.format_exc(limit=5)
+        logger.exception("Job %s (%s) failed on attempt %d", job_id, kind, attempts)
+
+    now = datetime.utcnow()
+    if attempts >= max_attempts:
+        values = dict(status=JobStatus.FAILED, lease=None, finished_at=now, last_error=error)
+    else:
+        values = dict(status=JobStatus.QUEUED, lease=None, last_error=error,
+                      run_at=now + timedelta(seconds=retry_delay(attempts)))
+    _finish(db, job_id, lease, values)
+    db.commit()
+    return False
+
+
+def _install_stop_handlers() -> Callable[[], bool]:
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return lambda: bool(stopping)
+
+
+def run_worker(kinds: Optional[Sequence[str]] = None, batch_size: int = JOB_BATCH_SIZE,
+               once: bool = False):
+    """Claim and run jobs until stopped (or, with ``once``, until none are due)."""
+    from app.database import SessionLocal
+    # Importing the tasks registers their handlers
+    from app.services import tasks  # noqa: F401
+    from app.utils.response_cache import response_cache
+
+    if not response_cache.reaches_other_processes:
+        # Invalidations would only reach this process's own cache, and the
+        # API would serve stale rankings until RESPONSE_CACHE_TTL runs out
+        raise RuntimeError("Job workers need RESPONSE_CACHE_BACKEND=shared with RESPONSE_CACHE_URL set")
+
+    should_stop = _install_stop_handlers()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while not should_stop():
+        session = SessionLocal()
+        try:
+            claimed = claim_jobs(session, batch_size, kinds)
+            succeeded = sum(run_job(session, job) for job in claimed)
+        finally:
+            session.close()
+        if claimed:
+            logger.info("%s ran %d jobs, %d succeeded", worker, len(claimed), succeeded)
+        if once and len(claimed) < batch_size:
+            return
+        if not claimed:
+            time.sleep(JOB_POLL_INTERVAL)
+
+
+def _worker_process(kinds, batch_size, once):
+    logging.basicConfig(level=logging.INFO)
+    run_worker(kinds, batch_size, once)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background job worker")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to run")
+    parser.add_argument("--batch-size", type=int, default=JOB_BATCH_SIZE)
+    parser.add_argument("--kind", action="append", dest="kinds", help="only run jobs of this kind")
+    parser.add_argument("--once", action="store_true", help="run the due jobs and exit")
+    args = parser.parse_args()
+
+    # Run the importable module's worker, not this __main__ copy: handlers
+    # register themselves on app.services.jobs
+    from app.services.jobs import _worker_process
+
+    if args.workers <= 1:
+        _worker_process(args.kinds, args.batch_size, args.once)
+    else:
+        # Spawned, not forked: each process opens its own connection pool
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=_worker_process, args=(args.kinds, args.batch_size, args.once))
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        # Ctrl-C reaches the whole process group; wait for the children to finish their jobs
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: [p.terminate() for p in processes])
+        for process in processes:
+            process.join()
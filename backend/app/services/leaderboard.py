@@ -0,0 +1,169 @@
+"""Ranked reporter leaderboard.
+
+``leaderboard_entries`` is rebuilt in one ``INSERT ... SELECT`` using
+``ROW_NUMBER()`` over ``users.total_points`` and per-user report counts.
+Reads are index lookups: a page is a range on ``rank`` and "my rank" is a
+primary key lookup on ``user_id``, so no request scans all users.
+
+Requests never rebuild the ranking. Changes that move it (verifications,
+points rollups) queue a ``leaderboard.refresh`` job, which the job worker
+runs ``LEADERBOARD_MIN_INTERVAL`` seconds later so a burst of changes is
+folded into one rebuild. The rebuild replaces every row in a single
+transaction, serialized across workers by an advisory lock on
+PostgreSQL (SQLite serializes writers itself), so readers see either the
+old ranking or the new one and never an empty or half-written table.
+A rebuild rewrites every row, so it costs O(users); the job delay keeps
+it to one per burst of changes. Without a running job worker the ranking
+does not move at all. The first read of an empty ranking builds it once,
+so a fresh deployment does not serve an empty leaderboard until a worker
+has run. Build it by hand with:
+
+    python -m app.services.leaderboard
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, func, insert, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal
+from app.models.models import LeaderboardEntry, Report, ReportStatus, User
+
+LEADERBOARD_MIN_INTERVAL = float(os.getenv("LEADERBOARD_MIN_INTERVAL", "5"))
+LEADERBOARD_MAX_AGE = float(os.getenv("LEADERBOARD_MAX_AGE", "60"))
+
+# pg_advisory_xact_lock key shared by every process refreshing the ranking
+_REFRESH_LOCK_KEY = 0x1EAD0B0A
+
+
+def refreshed_since(db: Session, seconds: float) -> bool:
+    """True if the ranking was rebuilt within the last ``seconds``."""
+    refreshed_at = db.scalar(select(func.max(LeaderboardEntry.refreshed_at)))
+    if refreshed_at is None:
+        return False
+    if refreshed_at.tzinfo is not None:
+        refreshed_at = refreshed_at.replace(tzinfo=None) - refreshed_at.utcoffset()
+    return refreshed_at >= datetime.utcnow() - timedelta(seconds=seconds)
+
+
+def _lock(db: Session):
+    if db.bind.dialect.name == "postgresql":
+        # Held until commit: a concurrent refresh waits rather than racing
+        # this one on the unique rank index
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _REFRESH_LOCK_KEY})
+
+
+def refresh_leaderboard(db: Session) -> int:
+    """Recompute every rank with a window function, in the caller's transaction.
+
+    The caller commits; until then other sessions keep reading the previous
+    ranking.
+    """
+    _lock(db)
+    counts = (
+        select(
+            Report.user_id.label("user_id"),
+            func.count(Report.id).label("report_count"),
+            func.count(Report.id).filter(Report.status == ReportStatus.VERIFIED).label("verified_count"),
+        )
+        .group_by(Report.user_id)
+        .subquery()
+    )
+    points = func.coalesce(User.total_points, 0)
+    verified = func.coalesce(counts.c.verified_count, 0)
+    ranked = (
+        select(
+            User.id,
+            func.row_number().over(order_by=(points.desc(), verified.desc(), User.id)),
+            User.name,
+            points,
+            func.coalesce(counts.c.report_count, 0),
+            verified,
+            literal(datetime.utcnow(), LeaderboardEntry.refreshed_at.type),
+        )
+        .select_from(User)
+        .outerjoin(counts, counts.c.user_id == User.id)
+    )
+
+    db.execute(delete(LeaderboardEntry))
+    result = db.execute(
+        insert(LeaderboardEntry).from_select(
+            ["user_id", "rank", "name", "total_points", "report_count", "verified_count", "refreshed_at"],
+            ranked,
+        )
+    )
+    return result.rowcount
+
+
+def _build_if_empty(db: Session) -> int:
+    _lock(db)
+    if db.scalar(select(LeaderboardEntry.user_id).limit(1)) is not None:
+        # Another request built it while this one waited for the lock
+        return 0
+    return refresh_leaderboard(db)
+
+
+async def build_if_empty() -> int:
+    """Build a ranking that has never been built; returns the users ranked.
+
+    Runs in its own short transaction, so the calling request's session
+    stays read-only.
+    """
+    async with AsyncSessionLocal() as session:
+        ranked = await session.run_sync(_build_if_empty)
+        await session.commit()
+    return ranked
+
+
+def serialize_entry(entry: LeaderboardEntry) -> dict:
+    return {
+        "rank": entry.rank,
+        "name": entry.name,
+        "total_points": entry.total_points,
+        "report_count": entry.report_count,
+        "verified_count": entry.verified_count,
+    }
+
+
+async def get_page(db: AsyncSession, offset: int, limit: int) -> List[LeaderboardEntry]:
+    """Return ``limit`` entries starting after rank ``offset``."""
+    return (await db.scalars(
+        select(LeaderboardEntry)
+        .where(LeaderboardEntry.rank > offset, LeaderboardEntry.rank <= offset + limit)
+        .order_by(LeaderboardEntry.rank)
+    )).all()
+
+
+async def get_user_entry(db: AsyncSession, user_id: str) -> Optional[LeaderboardEntry]:
+    return await db.get(LeaderboardEntry, user_id)
+
+
+async def get_neighbours(db: AsyncSession, entry: LeaderboardEntry, distance: int) -> List[LeaderboardEntry]:
+    """Return the entries ranked within ``distance`` places of ``entry``."""
+    return (await db.scalars(
+        select(LeaderboardEntry)
+        .where(
+            LeaderboardEntry.rank >= entry.rank - distance,
+            LeaderboardEntry.rank <= entry.rank + distance,
+        )
+        .order_by(LeaderboardEntry.rank)
+    )).all()
+
+
+async def count_entries(db: AsyncSession) -> int:
+    """Number of ranked users, read from the top of the ``rank`` index."""
+    return await db.scalar(select(func.max(LeaderboardEntry.rank))) or 0
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        ranked = refresh_leaderboard(session)
+        session.commit()
+    finally:
+        session.close()
+    print(f"Ranked {ranked} users.")
@@ -0,0 +1,321 @@
+"""Content-addressed, deduplicated media store.
+
+Every file is stored once under the SHA-256 of its content, in hash-prefix
+sharded directories (``ab/cd/abcd....jpg``) so no directory grows past a
+few thousand entries. ``media_blobs`` reference-counts the stored files
+and ``report_media`` links them to reports.
+
+A new upload stays in the backend's temp directory until the transaction
+that references it commits; ``promote_pending`` then moves it into place,
+so a rolled back request never leaves a stored file behind. Releasing
+the last reference keeps the row at ``ref_count`` 0 instead of deleting
+the file on the request path. ``sweep_media`` later removes such blobs,
+deleting the file while the row delete is still uncommitted so a
+concurrent upload of the same content either revives the row first or
+stores the file again, and clears out stale temp files. Run it
+periodically, for example from cron:
+
+    python -m app.services.media
+
+Storage goes through a ``MediaBackend``; ``MEDIA_BACKEND`` picks one from
+``MEDIA_BACKENDS`` and ships with a local filesystem implementation.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import MediaBlob, ReportMedia
+from app.utils.sql import upsert_insert
+from app.utils.uploads import (
+    UPLOAD_DIR, ReceivedUpload, discard_file, receive_upload, streaming_upload_route,
+)
+
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "local")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", UPLOAD_DIR)
+# Seconds an unreferenced blob or a temp file is kept before the sweep removes it
+MEDIA_SWEEP_GRACE = int(os.getenv("MEDIA_SWEEP_GRACE", "3600"))
+
+# Session.info key: content hash -> (temp path, storage key) awaiting commit
+_PENDING = "pending_media"
+
+
+def storage_key(content_hash: str, extension: str) -> str:
+    """Sharded storage key for a blob, e.g. ``ab/cd/abcd...ef.jpg``."""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{extension}"
+
+
+class MediaBackend(ABC):
+    """Where blob bytes live. Methods are blocking; call them off the loop."""
+
+    @property
+    @abstractmethod
+    def temp_dir(self) -> str:
+        """Directory for in-flight uploads, on the same filesystem as ``put``."""
+
+    @abstractmethod
+    def put(self, temp_path: str, key: str):
+        """Move a finished temporary file to ``key``. Idempotent per key."""
+
+    @abstractmethod
+    def write(self, key: str, data: bytes):
+        """Atomically store ``data`` at ``key``, replacing any previous file."""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open the stored file for reading."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+
+class LocalMediaBackend(MediaBackend):
+    """Stores blobs under a directory on the local filesystem."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    @property
+    def temp_dir(self) -> str:
+        return os.path.join(self.root, "tmp")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, temp_path: str, key: str):
+        path = self.path(key)
+        if os.path.exists(path):
+            # Same hash, same bytes: keep the stored copy
+            discard_file(temp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def write(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.temp_dir, suffix=".part", delete=False) as temp:
+            temp.write(data)
+        os.replace(temp.name, path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str):
+        discard_file(self.path(key))
+
+
+MEDIA_BACKENDS = {
+    "local": lambda: LocalMediaBackend(MEDIA_ROOT),
+}
+
+_backend: Optional[MediaBackend] = None
+
+
+def get_media_backend() -> MediaBackend:
+    global _backend
+    if _backend is None:
+        _backend = MEDIA_BACKENDS[MEDIA_BACKEND]()
+    return _backend
+
+
+# Route class for endpoints taking uploads: file parts are streamed into the
+# backend's temp directory while the request body is parsed
+UploadRoute = streaming_upload_route(lambda: get_media_backend().temp_dir)
+
+
+async def store_upload(db: AsyncSession, upload: UploadFile) -> MediaBlob:
+    """Stream ``upload`` into the store and take a reference on its blob.
+
+    The bytes are hashed while streaming and the reference is recorded in
+    the caller's transaction. The file stays in the temp directory (see
+    ``pending_path``) until ``promote_pending`` runs after commit;
+    identical content is written to the backend only once.
+    """
+    backend = get_media_backend()
+    received = await receive_upload(upload, backend.temp_dir)
+    key = storage_key(received.sha256, received.extension)
+    try:
+        await _add_reference(db, received, key)
+    except BaseException:
+        await run_in_threadpool(discard_file, received.temp_path)
+        raise
+
+    pending = db.info.setdefault(_PENDING, {})
+    if received.sha256 in pending:
+        # The same content twice in one request: one temp file is enough
+        await run_in_threadpool(discard_file, received.temp_path)
+    else:
+        pending[received.sha256] = (received.temp_path, key)
+    return await db.get(MediaBlob, received.sha256, populate_existing=True)
+
+
+def pending_path(db: AsyncSession, blob: MediaBlob) -> Optional[str]:
+    """Local path of an upload stored in this transaction and not promoted yet."""
+    pending = db.info.get(_PENDING, {}).get(blob.content_hash)
+    return pending[0] if pending else None
+
+
+async def promote_pending(db: AsyncSession):
+    """Move this session's uploads into place; call right after ``commit``.
+
+    Files that cannot be moved stay in the temp directory, where
+    ``sweep_media`` promotes them later.
+    """
+    pending: Dict[str, Tuple[str, str]] = db.info.pop(_PENDING, {})
+    backend = get_media_backend()
+    for temp_path, key in pending.values():
+        await run_in_threadpool(backend.put, temp_path, key)
+
+
+async def discard_pending(db: AsyncSession, content_hash: str):
+    """Delete an upload of this session that no committed row will reference.
+
+    For content whose only reference was released again in the same
+    transaction, so ``promote_pending`` does not copy it into the store.
+    """
+    pending = db.info.get(_PENDING, {}).pop(content_hash, None)
+    if pending is not None:
+        await run_in_threadpool(discard_file, pending[0])
+
+
+async def _add_reference(db: AsyncSession, received: ReceivedUpload, key: str):
+    table = MediaBlob.__table__
+    stmt = upsert_insert(db)(table).values(
+        content_hash=received.sha256,
+        storage_key=key,
+        mime_type=received.mime_type,
+        file_size=received.size,
+        ref_count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["content_hash"],
+        set_={"ref_count": table.c.ref_count + 1, "released_at": None},
+    )
+    await db.execute(stmt)
+
+
+def attach_to_report(db: AsyncSession, report_id: str, blob: MediaBlob) -> ReportMedia:
+    """Link a stored blob to a report (added to the session, not flushed)."""
+    media = ReportMedia(
+        id=str(uuid4()),
+        report_id=report_id,
+        media_type=blob.mime_type.split("/")[0],
+        file_path=blob.storage_key,
+        file_size=blob.file_size,
+        content_hash=blob.content_hash,
+    )
+    db.add(media)
+    return media
+
+
+async def release_blob(db: AsyncSession, content_hash: str):
+    """Drop one reference to a blob in the caller's transaction.
+
+    A blob left without references keeps its row and file until
+    ``sweep_media`` removes them.
+    """
+    await db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.content_hash == content_hash)
+        .values(
+            ref_count=MediaBlob.ref_count - 1,
+            released_at=case((MediaBlob.ref_count <= 1, datetime.utcnow()), else_=MediaBlob.released_at),
+        )
+    )
+
+
+def _delete_blob_files(backend: MediaBackend, content_hash: str, key: str):
+    from app.services.derivatives import FORMATS, VARIANTS, derivative_key
+
+    backend.delete(key)
+    for variant in VARIANTS:
+        for extension in FORMATS:
+            backend.delete(derivative_key(content_hash, variant, extension))
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sweep_media(db: Session, grace: int = MEDIA_SWEEP_GRACE) -> Dict[str, int]:
+    """Remove blobs unreferenced for ``grace`` seconds and stale temp files.
+
+    Each blob is deleted in its own transaction: the row delete re-checks
+    ``ref_count`` and holds the row until the file is gone. A temp file
+    whose committed blob has no stored file yet (its request died between
+    commit and ``promote_pending``) is promoted instead of deleted.
+    Returns counts per kind of cleanup.
+    """
+    backend = get_media_backend()
+    counts = {"blobs": 0, "temp_files": 0, "promoted": 0}
+
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    released = db.scalars(
+        select(MediaBlob.content_hash)
+        .where(MediaBlob.ref_count <= 0, MediaBlob.released_at < cutoff)
+    ).all()
+    for content_hash in released:
+        key = db.scalar(
+            delete(MediaBlob)
+            .where(MediaBlob.content_hash == content_hash, MediaBlob.ref_count <= 0)
+            .returning(MediaBlob.storage_key)
+        )
+        if key is not None:
+            try:
+                _delete_blob_files(backend, content_hash, key)
+            except BaseException:
+                db.rollback()
+                raise
+            counts["blobs"] += 1
+        db.commit()
+
+    stale_before = time.time() - grace
+    with os.scandir(backend.temp_dir) as entries:
+        stale = [entry.path for entry in entries
+                 if entry.is_file() and entry.stat().st_mtime < stale_before]
+    for path in stale:
+        blob = db.get(MediaBlob, _sha256(path))
+        if blob is not None and blob.ref_count > 0 and not backend.exists(blob.storage_key):
+            backend.put(path, blob.storage_key)
+            counts["promoted"] += 1
+        else:
+            discard_file(path)
+            counts["temp_files"] += 1
+        db.rollback()
+    return counts
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        swept = sweep_media(session)
+    finally:
+        session.close()
+    print(f"Removed {swept['blobs']} unreferenced blobs and {swept['temp_files']} stale temp files; "
+          f"promoted {swept['promoted']} uploads.")
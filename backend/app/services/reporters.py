@@ -0,0 +1,29 @@
+"""Batched reporter lookups for routes that return reports."""
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Report, User
+
+
+ANONYMOUS_REPORTER = "Anonymous"
+
+
+async def load_reporter_names(db: AsyncSession, reports: Iterable[Report]) -> Dict[str, str]:
+    """Resolve reporter names for ``reports`` with a single ``IN`` query.
+
+    Returns a ``user_id -> name`` mapping. Users that no longer exist are
+    mapped to ``ANONYMOUS_REPORTER`` so callers can index it directly.
+    """
+    user_ids = {report.user_id for report in reports if report.user_id}
+    if not user_ids:
+        return {}
+
+    names = dict((await db.execute(
+        select(User.id, User.name).where(User.id.in_(user_ids))
+    )).all())
+    return {
+        user_id: names.get(user_id) or ANONYMOUS_REPORTER
+        for user_id in user_ids
+    }
@@ -0,0 +1,236 @@
+"""Append-only points ledger and the totals rolled up from it.
+
+Awarding points only inserts ``user_rewards`` rows, so verifications never
+queue behind each other on a busy reporter's ``users`` row. The
+``points.rollup`` job, queued alongside the ledger rows, claims a batch of
+rows not rolled up yet by stamping its ``rollup_id`` on them, then adds
+them to ``users.total_points`` and to the day, ISO week and month totals in
+``user_points_periods`` in the same transaction. The claim skips rows
+another rollup has locked on PostgreSQL and re-checks ``rollup_id IS NULL``
+on SQLite, so every row is counted exactly once.
+
+``total_points`` is the balance (redemptions are negative entries); period
+totals only count points earned, so spending points does not drop anyone
+down a weekly ranking. Reading either is an indexed lookup. Both trail the
+ledger by about ``REWARD_ROLLUP_DELAY`` seconds while a job worker runs;
+without one, neither moves at all until the command below is run.
+
+Roll up everything pending, or rebuild every total from the ledger, with:
+
+    python -m app.services.rewards [--rebuild]
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from uuid import uuid4
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import Report, RewardType, User, UserPointsPeriod, UserReward
+from app.utils.sql import upsert_insert
+
+REWARD_ROLLUP_BATCH = int(os.getenv("REWARD_ROLLUP_BATCH", "500"))
+REWARD_ROLLUP_DELAY = float(os.getenv("REWARD_ROLLUP_DELAY", "2"))
+
+PERIODS = ("day", "week", "month")
+
+
+def period_start(period: str, when: datetime) -> date:
+    """First day of the ``period`` containing ``when`` (weeks start on Monday)."""
+    day = when.date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def ledger_entry(user_id: str, points: int, transaction_type: RewardType,
+                 report_id: Optional[str] = None, description: Optional[str] = None,
+                 now: Optional[datetime] = None) -> UserReward:
+    """A new ``user_rewards`` row; add it to the session together with a rollup job."""
+    return UserReward(
+        id=str(uuid4()),
+        user_id=user_id,
+        report_id=report_id,
+        points_earned=points,
+        transaction_type=transaction_type,
+        description=description,
+        created_at=now or datetime.utcnow(),
+    )
+
+
+def _claim(db: Session, batch_size: int) -> str:
+    token = str(uuid4())
+    pending = (
+        select(UserReward.id)
+        .where(UserReward.rollup_id.is_(None))
+        .order_by(UserReward.created_at)
+        .limit(batch_size)
+    )
+    if db.bind.dialect.name == "postgresql":
+        pending = pending.with_for_update(skip_locked=True)
+    db.execute(
+        update(UserReward)
+        .where(UserReward.id.in_(pending), UserReward.rollup_id.is_(None))
+        .values(rollup_id=token)
+        .execution_options(synchronize_session=False)
+    )
+    return token
+
+
+def _apply(db: Session, rows) -> None:
+    totals = Counter()
+    earned = Counter()
+    for user_id, points, created_at in rows:
+        totals[user_id] += points
+        if points > 0:
+            for period in PERIODS:
+                earned[(user_id, period, period_start(period, created_at))] += points
+
+    if totals:
+        db.execute(
+            update(User)
+            .where(User.id.in_(list(totals)))
+            .values(total_points=func.coalesce(User.total_points, 0) + case(totals, value=User.id, else_=0))
+            .execution_options(synchronize_session=False)
+        )
+    if earned:
+        table = UserPointsPeriod.__table__
+        stmt = upsert_insert(db)(table).values([
+            {"user_id": user_id, "period": period, "period_start": start, "points": points}
+            for (user_id, period, start), points in earned.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "period", "period_start"],
+            set_={"points": table.c.points + stmt.excluded.points},
+        ))
+
+
+def rollup_rewards(db: Session, batch_size: int = REWARD_ROLLUP_BATCH) -> int:
+    """Fold up to ``batch_size`` pending ledger rows into the totals.
+
+    Runs in the caller's transaction; the rows count once the caller
+    commits. Returns the number of rows rolled up.
+    """
+    token = _claim(db, batch_size)
+    rows = db.execute(
+        select(UserReward.user_id, UserReward.points_earned, UserReward.created_at)
+        .where(UserReward.rollup_id == token)
+    ).all()
+    _apply(db, rows)
+    return len(rows)
+
+
+def backfill_ledger(db: Session) -> int:
+    """Add ledger rows for points awarded before the ledger existed."""
+    recorded = select(UserReward.id).where(
+        UserReward.report_id == Report.id,
+        UserReward.transaction_type == RewardType.VERIFIED_REPORT,
+    )
+    awarded = db.execute(
+        select(Report.id, Report.user_id, Report.points_awarded, Report.verified_at, Report.created_at)
+        .where(Report.points_awarded > 0, Report.user_id.is_not(None), ~recorded.exists())
+    ).all()
+    db.add_all(
+        ledger_entry(user_id, points, RewardType.VERIFIED_REPORT, report_id,
+                     "Verified report", verified_at or created_at)
+        for report_id, user_id, points, verified_at, created_at in awarded
+    )
+    db.flush()
+    return len(awarded)
+
+
+def rebuild_rollups(db: Session, batch_size: int = REWARD_ROLLUP_BATCH) -> int:
+    """Recompute ``total_points`` and every period total from the whole ledger.
+
+    Runs as one transaction, so readers see the old totals until it
+    commits. Stop the job workers first. Returns the ledger rows counted.
+    """
+    backfill_ledger(db)
+    db.execute(update(UserReward).values(rollup_id=None))
+    db.execute(delete(UserPointsPeriod))
+    db.execute(update(User).values(total_points=0))
+    counted = 0
+    while rolled := rollup_rewards(db, batch_size):
+        counted += rolled
+    db.commit()
+    return counted
+
+
+def _ranked(period: str, now: datetime):
+    return (
+        select(UserPointsPeriod.points, User.name)
+        .join(User, User.id == UserPointsPeriod.user_id)
+        .where(UserPointsPeriod.period == period,
+               UserPointsPeriod.period_start == period_start(period, now))
+        .order_by(UserPointsPeriod.points.desc(), UserPointsPeriod.user_id)
+    )
+
+
+async def period_page(db: AsyncSession, period: str, offset: int, limit: int) -> List[dict]:
+    """Ranked entries of the current ``period`` starting after rank ``offset``."""
+    rows = await db.execute(_ranked(period, datetime.utcnow()).offset(offset).limit(limit))
+    return [
+        {"rank": offset + position, "name": name, "total_points": points}
+        for position, (points, name) in enumerate(rows.all(), start=1)
+    ]
+
+
+async def period_user_rank(db: AsyncSession, period: str, user_id: str) -> Optional[int]:
+    """The user's rank in the current ``period``; None if they earned nothing in it.
+
+    Counts the entries ranked ahead as two ranges of
+    ``ix_user_points_periods_ranking`` (more points; same points and a
+    lower user id), so the cost grows with the rank but never touches the
+    table. Period rankings change with every rollup, which is why they are
+    not materialized like ``leaderboard_entries``.
+    """
+    start = period_start(period, datetime.utcnow())
+    entry = await db.get(UserPointsPeriod, (user_id, period, start))
+    if entry is None:
+        return None
+    ranked = (
+        select(func.count())
+        .select_from(UserPointsPeriod)
+        .where(UserPointsPeriod.period == period, UserPointsPeriod.period_start == start)
+    )
+    higher = ranked.where(UserPointsPeriod.points > entry.points).scalar_subquery()
+    tied = ranked.where(UserPointsPeriod.points == entry.points,
+                        UserPointsPeriod.user_id < user_id).scalar_subquery()
+    return await db.scalar(select(higher + tied)) + 1
+
+
+async def count_period_entries(db: AsyncSession, period: str) -> int:
+    return await db.scalar(
+        select(func.count())
+        .select_from(UserPointsPeriod)
+        .where(UserPointsPeriod.period == period,
+               UserPointsPeriod.period_start == period_start(period, datetime.utcnow()))
+    )
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Roll up the points ledger")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every total from the whole ledger")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.rebuild:
+            total = rebuild_rollups(session)
+        else:
+            total = 0
+            while rolled := rollup_rewards(session):
+                session.commit()
+                total += rolled
+    finally:
+        session.close()
+    print(f"Rolled up {total} ledger entries.")
@@ -0,0 +1,191 @@
+"""Bounding-box and radius queries over reports.
+
+On PostgreSQL the box is matched against ``ix_reports_location_gist``, a
+GiST index on ``point(longitude, latitude)``. Elsewhere, or with
+``SPATIAL_INDEX=geohash``, the box is covered by a few geohash cells
+(``app.utils.geo``) and each run of cells becomes one range scan on
+``ix_reports_status_geohash``. Either way the cost depends on the reports
+near the query rather than the table size, and exact coordinates trim
+the overhang. The geohash ranges already make SQLite lookups sub-linear,
+so there is no separate in-process grid index to keep in sync across API
+processes.
+
+Radius queries also filter, order and limit by distance in SQL, so only
+the rows returned are loaded. Where a flat distance is not accurate enough
+(high latitudes, circles reaching a pole) the box is read and sorted by
+great-circle distance instead. Boxes with ``min_lng > max_lng`` cross the
+antimeridian.
+
+``geohash`` is set when a report is created; backfill older rows with:
+
+    python -m app.services.spatial
+"""
+import math
+import os
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import Report, ReportStatus
+from app.utils import geo
+
+METRES_PER_DEGREE = math.pi * geo.EARTH_RADIUS_M / 180
+# "auto": the GiST index on PostgreSQL, geohash ranges elsewhere
+SPATIAL_INDEX = os.getenv("SPATIAL_INDEX", "auto")
+
+# The SQL distance is a flat projection at the query latitude. It is used
+# while the cosine of the latitude varies across the circle by less than
+# half of this margin, which holds for a few kilometres well away from the
+# poles, and the margin covers the rest
+_FLAT_DISTANCE_SLACK = 1.01
+
+
+def _uses_gist(db: AsyncSession) -> bool:
+    return SPATIAL_INDEX == "auto" and db.bind.dialect.name == "postgresql"
+
+
+def _geohash_filter(status: ReportStatus, min_lat: float, min_lng: float, max_lat: float, max_lng: float):
+    # The status goes into every range so each one is a complete index range
+    # (SQLite only runs an OR as several index searches when every term is)
+    ranges = []
+    for start, end in geo.cover_bbox(min_lat, min_lng, max_lat, max_lng):
+        if end is None:
+            ranges.append(and_(Report.status == status, Report.geohash >= start))
+        else:
+            ranges.append(and_(Report.status == status, Report.geohash >= start, Report.geohash < end))
+    return or_(*ranges)
+
+
+def _gist_filter(status: ReportStatus, min_lat: float, min_lng: float, max_lat: float, max_lng: float):
+    # Same expression as ix_reports_location_gist, so the planner can use it
+    location = func.point(Report.longitude, Report.latitude)
+    return and_(Report.status == status, or_(*(
+        location.op("<@")(func.box(func.point(west, min_lat), func.point(east, max_lat)))
+        for west, east in geo.longitude_spans(min_lng, max_lng)
+    )))
+
+
+def _in_bbox(
+    db: AsyncSession,
+    min_lat: float,
+    min_lng: float,
+    max_lat: float,
+    max_lng: float,
+    vehicle_type: Optional[str],
+    status: ReportStatus,
+):
+    index_filter = _gist_filter if _uses_gist(db) else _geohash_filter
+    query = select(Report).where(
+        index_filter(status, min_lat, min_lng, max_lat, max_lng),
+        Report.latitude.between(min_lat, max_lat),
+        or_(*(Report.longitude.between(west, east) for west, east in geo.longitude_spans(min_lng, max_lng))),
+    )
+    if vehicle_type and vehicle_type != "all":
+        query = query.where(Report.violation_type == vehicle_type)
+    return query
+
+
+async def reports_in_bbox(
+    db: AsyncSession,
+    min_lat: float,
+    min_lng: float,
+    max_lat: float,
+    max_lng: float,
+    vehicle_type: Optional[str] = None,
+    status: ReportStatus = ReportStatus.VERIFIED,
+    limit: Optional[int] = None,
+) -> List[Report]:
+    """Reports inside a box, newest first."""
+    query = _in_bbox(db, min_lat, min_lng, max_lat, max_lng, vehicle_type, status)
+    query = query.order_by(Report.created_at.desc(), Report.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.scalars(query)).all()
+
+
+async def reports_near(
+    db: AsyncSession,
+    lat: float,
+    lng: float,
+    radius_m: float,
+    vehicle_type: Optional[str] = None,
+    limit: int = 50,
+) -> List[Tuple[Report, float]]:
+    """Verified reports within ``radius_m`` of a point, nearest first.
+
+    While a flat distance is accurate enough, SQL filters, orders and
+    limits by it so at most ``limit`` rows are read; close to the poles the
+    whole box is read. The great-circle distance then has the final say.
+    """
+    bbox = geo.bbox_around(lat, lng, radius_m)
+    query = _in_bbox(db, *bbox, vehicle_type, ReportStatus.VERIFIED)
+    if _flat_distance_holds(lat, radius_m):
+        d_lng = Report.longitude - lng
+        if bbox[1] > bbox[3]:
+            # Across the antimeridian the short way round is the other way
+            d_lng = case((d_lng > 180, d_lng - 360), (d_lng < -180, d_lng + 360), else_=d_lng)
+        d_lat = (Report.latitude - lat) * METRES_PER_DEGREE
+        d_lng = d_lng * (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+        squared = d_lat * d_lat + d_lng * d_lng
+        query = (
+            query.where(squared <= (radius_m * _FLAT_DISTANCE_SLACK) ** 2)
+            .order_by(squared, Report.id)
+            .limit(limit)
+        )
+    nearby = []
+    for report in (await db.scalars(query)).all():
+        distance = geo.haversine_m(lat, lng, report.latitude, report.longitude)
+        if distance <= radius_m:
+            nearby.append((report, distance))
+    nearby.sort(key=lambda pair: pair[1])
+    return nearby[:limit]
+
+
+def _flat_distance_holds(lat: float, radius_m: float) -> bool:
+    d_lat = math.degrees(radius_m / geo.EARTH_RADIUS_M)
+    farthest = abs(lat) + d_lat
+    if farthest >= 89.0:
+        return False
+    # Relative change of cos(latitude) across the circle
+    spread = math.tan(math.radians(farthest)) * radius_m / geo.EARTH_RADIUS_M
+    return spread < (_FLAT_DISTANCE_SLACK - 1) / 2
+
+
+def backfill_geohashes(db: Session, batch_size: int = 1000) -> int:
+    """Set ``geohash`` on reports that have coordinates but no geohash yet.
+
+    Returns the number of reports updated. Commits once per batch.
+    """
+    updated = 0
+    while True:
+        rows = (
+            db.query(Report.id, Report.latitude, Report.longitude)
+            .filter(
+                Report.geohash.is_(None),
+                Report.latitude.isnot(None),
+                Report.longitude.isnot(None),
+            )
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        db.bulk_update_mappings(Report, [
+            {"id": report_id, "geohash": geo.encode(lat, lng)}
+            for report_id, lat, lng in rows
+        ])
+        db.commit()
+        updated += len(rows)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        written = backfill_geohashes(session)
+    finally:
+        session.close()
+    print(f"Backfilled geohashes for {written} reports.")
@@ -0,0 +1,113 @@
+"""Job handlers run by ``python -m app.services.jobs``, and their enqueue helpers.
+
+Call the ``enqueue_*`` helpers before committing the change that needs
+the work, so the job commits (or rolls back) with it.
+"""
+import asyncio
+from typing import Iterable, List
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.models import MediaBlob, Notification, Report
+from app.services import derivatives, leaderboard, rewards
+from app.services.jobs import enqueue, has_pending, job_handler, on_commit
+from app.utils.response_cache import response_cache
+
+DERIVATIVES_JOB = "media.derivatives"
+VERIFICATION_NOTICES_JOB = "notifications.verification"
+POINTS_ROLLUP_JOB = "points.rollup"
+LEADERBOARD_REFRESH_JOB = "leaderboard.refresh"
+
+
+def enqueue_derivatives(db, blobs: Iterable[MediaBlob]):
+    """Queue preview rendering for the image blobs among ``blobs``."""
+    for blob in blobs:
+        if blob.mime_type in derivatives.IMAGE_MIME_TYPES:
+            enqueue(db, DERIVATIVES_JOB, {"content_hash": blob.content_hash, "storage_key": blob.storage_key})
+
+
+def enqueue_verification_notices(db, decisions: List[dict]):
+    """Queue reporter notifications for ``{"report_id", "status", "points"}`` decisions."""
+    if decisions:
+        enqueue(db, VERIFICATION_NOTICES_JOB, {"decisions": decisions})
+
+
+def enqueue_points_rollup(db):
+    """Queue a rollup of the ledger rows added in this transaction."""
+    # Delayed so one rollup usually picks up a burst of verifications
+    enqueue(db, POINTS_ROLLUP_JOB, {}, delay=rewards.REWARD_ROLLUP_DELAY)
+
+
+def enqueue_leaderboard_refresh(db):
+    """Queue a rebuild of the reporter ranking that sees this transaction's changes."""
+    enqueue(db, LEADERBOARD_REFRESH_JOB, {}, delay=leaderboard.LEADERBOARD_MIN_INTERVAL)
+
+
+def _invalidate_cached_rankings():
+    # Reaches the API processes through the shared cache backend, which
+    # run_worker requires
+    asyncio.run(response_cache.invalidate())
+
+
+@job_handler(DERIVATIVES_JOB)
+def render_derivatives(db: Session, payload: dict):
+    # Until this runs, /api/media renders a requested preview on demand
+    derivatives.generate_all(payload["content_hash"], payload["storage_key"])
+
+
+def _notice(report: Report, status: str, points: int) -> Notification:
+    place = report.location or "the reported location"
+    if status == "verified":
+        message = f"Your {report.violation_type} report at {place} was verified."
+        if points:
+            message += f" You earned {points} points."
+        kind, title = "report_verified", "Report verified"
+    else:
+        message = f"Your {report.violation_type} report at {place} was not approved."
+        kind, title = "report_rejected", "Report rejected"
+    return Notification(
+        id=str(uuid4()),
+        user_id=report.user_id,
+        title=title,
+        message=message,
+        type=kind,
+        is_read=False,
+        report_id=report.id,
+    )
+
+
+@job_handler(VERIFICATION_NOTICES_JOB)
+def send_verification_notices(db: Session, payload: dict):
+    decisions = {decision["report_id"]: decision for decision in payload["decisions"]}
+    reports = db.scalars(select(Report).where(Report.id.in_(list(decisions)))).all()
+    db.add_all(
+        _notice(report, decisions[report.id]["status"], decisions[report.id]["points"])
+        for report in reports
+        if report.user_id
+    )
+
+
+@job_handler(POINTS_ROLLUP_JOB)
+def roll_up_points(db: Session, payload: dict):
+    rolled = rewards.rollup_rewards(db)
+    if not rolled:
+        return
+    if rolled >= rewards.REWARD_ROLLUP_BATCH:
+        # More pending than one batch: continue in a fresh job and transaction
+        enqueue(db, POINTS_ROLLUP_JOB, {})
+    # Totals only move here: rank them, and drop cached period rankings
+    enqueue_leaderboard_refresh(db)
+    on_commit(db, _invalidate_cached_rankings)
+
+
+@job_handler(LEADERBOARD_REFRESH_JOB)
+def refresh_leaderboard(db: Session, payload: dict):
+    # A refresh starting after this one also sees the change that queued
+    # this one; leave the work to it while the ranking is not too old
+    if (has_pending(db, LEADERBOARD_REFRESH_JOB)
+            and leaderboard.refreshed_since(db, leaderboard.LEADERBOARD_MAX_AGE)):
+        return
+    leaderboard.refresh_leaderboard(db)
+    on_commit(db, _invalidate_cached_rankings)
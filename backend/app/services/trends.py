@@ -0,0 +1,172 @@
+"""Hourly and daily report counters behind the Hall of Shame trend series.
+
+``violation_counters`` holds one row per (granularity, bucket, location,
+violation type, status). Submitting a report and verifying or rejecting
+it adjust the matching hour and day buckets. Each change is a single
+multi-row atomic upsert in the caller's transaction, so concurrent
+requests never lose increments. A series for any window is a range scan
+on the primary key followed by a sum per bucket; its cost depends on the
+number of buckets, not on how many reports they hold.
+
+Regenerate the counters from ``reports``, for example after upgrading, with:
+
+    python -m app.services.trends
+"""
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import Report, ReportStatus, ViolationCounter
+from app.services.clusters import normalize_location
+from app.utils.sql import upsert_insert
+
+GRANULARITIES = ("hour", "day")
+# Longest window an hourly series may span
+TRENDS_MAX_HOURLY_DAYS = int(os.getenv("TRENDS_MAX_HOURLY_DAYS", "31"))
+
+_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def bucket_start(granularity: str, timestamp: Optional[datetime]) -> datetime:
+    """Start of the UTC hour or day ``timestamp`` falls into, timezone-aware.
+
+    Naive timestamps (``datetime.utcnow()``, values read back from SQLite)
+    are taken as UTC. Aware buckets keep PostgreSQL from reading them in the
+    session time zone when they are written to the ``timestamptz`` column.
+    """
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc)
+    elif timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    else:
+        timestamp = timestamp.astimezone(timezone.utc)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _status(value) -> str:
+    return ReportStatus(value).value
+
+
+def _add(deltas: Counter, report: Report, status, sign: int):
+    location = normalize_location(report.location)
+    for granularity in GRANULARITIES:
+        key = (granularity, bucket_start(granularity, report.created_at), location,
+               report.violation_type or "", _status(status))
+        deltas[key] += sign
+
+
+async def _upsert_counters(db: AsyncSession, deltas: Counter):
+    rows = [
+        {"granularity": granularity, "bucket_start": start, "location": location,
+         "violation_type": violation_type, "status": status, "count": count}
+        for (granularity, start, location, violation_type, status), count in deltas.items()
+        if count
+    ]
+    if not rows:
+        return
+    table = ViolationCounter.__table__
+    stmt = upsert_insert(db)(table).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "location", "violation_type", "status"],
+        set_={"count": table.c.count + stmt.excluded.count},
+    ))
+
+
+async def record_new_reports(db: AsyncSession, reports: Iterable[Report]):
+    """Count newly submitted reports; their ``created_at`` must already be set."""
+    deltas = Counter()
+    for report in reports:
+        _add(deltas, report, report.status or ReportStatus.PENDING, 1)
+    await _upsert_counters(db, deltas)
+
+
+async def record_status_changes(db: AsyncSession, changes: Iterable[Tuple[Report, ReportStatus, ReportStatus]]):
+    """Move reports between status counters for ``(report, old, new)`` changes."""
+    deltas = Counter()
+    for report, old, new in changes:
+        _add(deltas, report, old or ReportStatus.PENDING, -1)
+        _add(deltas, report, new, 1)
+    await _upsert_counters(db, deltas)
+
+
+async def trend_series(db: AsyncSession, granularity: str, start: Optional[datetime],
+                       location: Optional[str] = None, violation_type: Optional[str] = None) -> List[dict]:
+    """Report counts per bucket from ``start`` (or the first report) up to now.
+
+    Every bucket in the range is present, with a count per status and a
+    ``total``. ``location`` is matched after normalization.
+    """
+    filters = [ViolationCounter.granularity == granularity]
+    if start is not None:
+        filters.append(ViolationCounter.bucket_start >= bucket_start(granularity, start))
+    if location:
+        filters.append(ViolationCounter.location == normalize_location(location))
+    if violation_type and violation_type != "all":
+        filters.append(ViolationCounter.violation_type == violation_type)
+
+    rows = (await db.execute(
+        select(ViolationCounter.bucket_start, ViolationCounter.status, func.sum(ViolationCounter.count))
+        .where(*filters)
+        .group_by(ViolationCounter.bucket_start, ViolationCounter.status)
+    )).all()
+    counts = {}
+    for start_at, status, count in rows:
+        counts.setdefault(bucket_start(granularity, start_at), Counter())[status] += count or 0
+
+    if start is not None:
+        current = bucket_start(granularity, start)
+    elif counts:
+        current = min(counts)
+    else:
+        return []
+    last = bucket_start(granularity, None)
+    step = _STEPS[granularity]
+    series = []
+    while current <= last:
+        bucket = counts.get(current, Counter())
+        entry = {"bucket": current}
+        entry.update({status.value: bucket[status.value] for status in ReportStatus})
+        entry["total"] = sum(bucket.values())
+        series.append(entry)
+        current += step
+    return series
+
+
+def rebuild_trends(db: Session) -> int:
+    """Regenerate ``violation_counters`` from ``reports``.
+
+    Returns the number of counters written. Commits on success.
+    """
+    deltas = Counter()
+    reports = db.query(Report.created_at, Report.location, Report.violation_type, Report.status).yield_per(1000)
+    for report in reports:
+        _add(deltas, report, report.status or ReportStatus.PENDING, 1)
+
+    db.query(ViolationCounter).delete(synchronize_session=False)
+    rows = [
+        {"granularity": granularity, "bucket_start": start, "location": location,
+         "violation_type": violation_type, "status": status, "count": count}
+        for (granularity, start, location, violation_type, status), count in deltas.items()
+    ]
+    for offset in range(0, len(rows), 1000):
+        db.execute(ViolationCounter.__table__.insert(), rows[offset:offset + 1000])
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        written = rebuild_trends(session)
+    finally:
+        session.close()
+    print(f"Rebuilt {written} trend counters.")
@@ -0,0 +1,129 @@
+"""Set-based report verification shared by the single and bulk admin routes."""
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Report, ReportStatus, RewardType
+from app.services.clusters import assign_clusters, release_clusters
+from app.services.hotspots import merge_cluster_buckets, record_verified_reports
+from app.services.rewards import ledger_entry
+from app.services.tasks import enqueue_leaderboard_refresh, enqueue_points_rollup, enqueue_verification_notices
+from app.services.trends import record_status_changes
+
+VERIFIED_REPORT_POINTS = 10
+
+
+async def _without_verified_originals(db: AsyncSession, reports: List[Report],
+                                     to_verify: List[Report], to_reject: List[Report]) -> List[Report]:
+    """Drop duplicates whose original is, or is about to be, verified."""
+    originals = {report.duplicate_of for report in reports if report.duplicate_of}
+    if not originals:
+        return reports
+    verified = set((await db.scalars(
+        select(Report.id).where(Report.id.in_(list(originals)), Report.status == ReportStatus.VERIFIED)
+    )).all())
+    verified |= {report.id for report in to_verify}
+    verified -= {report.id for report in to_reject}
+    return [report for report in reports if report.duplicate_of not in verified]
+
+
+async def apply_verifications(db: AsyncSession, admin_id: str, decisions: Dict[str, bool]) -> List[dict]:
+    """Verify or reject many reports inside the caller's transaction.
+
+    ``decisions`` maps report id to ``True`` (verify) or ``False`` (reject).
+    Status changes are written with one UPDATE per decision, and points are
+    awarded by appending ``user_rewards`` rows that a queued rollup adds to
+    the reporters' totals, so verifications never wait on a ``users`` row.
+    Points are only awarded the first time a report is verified, and not
+    for a near-duplicate (``duplicate_of``) of a report that is verified.
+
+    Returns one ``{"report_id", "status"}`` entry per decision, where status
+    is ``verified``, ``rejected``, ``unchanged`` or ``not_found``.
+    """
+    reports = (await db.scalars(
+        select(Report)
+        .where(Report.id.in_(list(decisions)))
+        .with_for_update()
+    )).all()
+    by_id = {report.id: report for report in reports}
+
+    to_verify, to_reject, newly_rewarded, unverified = [], [], [], []
+    results = []
+    for report_id, verified in decisions.items():
+        report = by_id.get(report_id)
+        if report is None:
+            results.append({"report_id": report_id, "status": "not_found"})
+            continue
+
+        target = ReportStatus.VERIFIED if verified else ReportStatus.REJECTED
+        if report.status == target:
+            results.append({"report_id": report_id, "status": "unchanged"})
+            continue
+
+        if verified:
+            to_verify.append(report)
+            if not report.points_awarded:
+                newly_rewarded.append(report)
+        else:
+            to_reject.append(report)
+            if report.status == ReportStatus.VERIFIED:
+                unverified.append(report)
+        results.append({"report_id": report_id, "status": target.value})
+
+    newly_rewarded = await _without_verified_originals(db, newly_rewarded, to_verify, to_reject)
+
+    # Captured before the UPDATEs below refresh the loaded reports' status
+    status_changes = [(report, report.status, ReportStatus.VERIFIED) for report in to_verify]
+    status_changes += [(report, report.status, ReportStatus.REJECTED) for report in to_reject]
+
+    now = datetime.utcnow()
+    if newly_rewarded:
+        await db.execute(
+            update(Report)
+            .where(Report.id.in_([report.id for report in newly_rewarded]))
+            .values(points_awarded=VERIFIED_REPORT_POINTS)
+        )
+    for target, batch in ((ReportStatus.VERIFIED, to_verify), (ReportStatus.REJECTED, to_reject)):
+        if batch:
+            await db.execute(
+                update(Report)
+                .where(Report.id.in_([report.id for report in batch]))
+                .values(status=target, verified_by=admin_id, verified_at=now)
+            )
+
+    rewards = [
+        ledger_entry(report.user_id, VERIFIED_REPORT_POINTS, RewardType.VERIFIED_REPORT,
+                     report.id, f"Verified {report.violation_type} report", now)
+        for report in newly_rewarded
+        if report.user_id
+    ]
+    if rewards:
+        db.add_all(rewards)
+        # The rollup refreshes the ranking once the points are counted
+        enqueue_points_rollup(db)
+
+    # Keep the Hall of Shame clusters and aggregate in step with the status changes
+    await record_verified_reports(db, unverified, sign=-1)
+    await release_clusters(db, unverified)
+    for absorbed, surviving in await assign_clusters(db, to_verify):
+        await merge_cluster_buckets(db, absorbed, surviving)
+    await record_verified_reports(db, to_verify)
+    await record_status_changes(db, status_changes)
+
+    rewarded = {report.id for report in newly_rewarded}
+    enqueue_verification_notices(db, [
+        {"report_id": report.id, "status": "verified",
+         "points": VERIFIED_REPORT_POINTS if report.id in rewarded else 0}
+        for report in to_verify
+    ] + [
+        {"report_id": report.id, "status": "rejected", "points": 0}
+        for report in to_reject
+    ])
+
+    if (to_verify or to_reject) and not rewards:
+        # Only report counts moved
+        enqueue_leaderboard_refresh(db)
+
+    return results
@@ -0,0 +1,138 @@
+"""Authenticated principal and cached role lookups.
+
+Ordinary authenticated routes only need the token's subject, so they
+need no database access. Access tokens also carry the user's role claim
+for clients, but because a signed claim stays valid until the token
+expires it is never trusted for authorization: admin access is decided by
+the current role, read from a small TTL + LRU cache of ``user id -> role``
+that falls back to the ``users`` table on a miss and is invalidated once a
+transaction that changed a user's role commits.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from app.models.models import User, UserRole
+
+ADMIN_ROLES = (UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "60"))
+ROLE_CACHE_SIZE = int(os.getenv("ROLE_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller behind a request, as established by its access token.
+
+    ``role`` is only set once it has been checked against the current role,
+    as ``get_current_admin`` does; the token's own claim is not used.
+    """
+    user_id: str
+    role: Optional[UserRole] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in ADMIN_ROLES
+
+
+class RoleCache:
+    """Thread-safe TTL + LRU cache of ``user_id -> role``.
+
+    ``None`` is cached for users that no longer exist, so deleted accounts
+    do not cost a query on every request either.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str):
+        """Return the cached role (possibly ``None``) or ``RoleCache._MISSING``."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return self._MISSING
+            role, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return self._MISSING
+            self._entries.move_to_end(user_id)
+            return role
+
+    def put(self, user_id: str, role: Optional[UserRole]):
+        with self._lock:
+            self._entries[user_id] = (role, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+role_cache = RoleCache(ROLE_CACHE_TTL, ROLE_CACHE_SIZE)
+
+
+def invalidate_principal(user_id: str):
+    """Drop cached authorization state for ``user_id`` (role change, deletion)."""
+    role_cache.invalidate(user_id)
+
+
+@event.listens_for(User.role, "set")
+def _invalidate_on_role_change(target, value, oldvalue, initiator):
+    if target.id is None:
+        return
+    session = object_session(target)
+    if session is None:
+        invalidate_principal(target.id)
+        return
+    # Invalidating now would let a concurrent request re-cache the old,
+    # still committed role; wait until the new one is visible.
+    session.info.setdefault("role_changes", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_role_changes(session):
+    for user_id in session.info.pop("role_changes", ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back_role_changes(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop("role_changes", None)
+
+
+def principal_from_claims(payload: dict) -> Optional[Principal]:
+    """Build a principal from decoded token claims, ``None`` if unusable."""
+    user_id = payload.get("sub")
+    if user_id is None:
+        return None
+    return Principal(user_id=user_id)
+
+
+async def resolve_role(db: AsyncSession, user_id: str) -> Optional[UserRole]:
+    """Current role of ``user_id`` from the cache, or the database on a miss."""
+    role = role_cache.get(user_id)
+    if role is not RoleCache._MISSING:
+        return role
+
+    role = await db.scalar(select(User.role).where(User.id == user_id))
+    role_cache.put(user_id, role)
+    return role
@@ -0,0 +1,159 @@
+"""Geohash encoding, bbox covering and distances.
+
+Reports store a geohash so spatial queries become a handful of prefix range
+scans on an ordinary B-tree index, which works the same on PostgreSQL and
+SQLite.
+"""
+import math
+from typing import List, Optional, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision stored on reports: 9 characters is a ~4.8 m x 4.8 m cell
+GEOHASH_PRECISION = 9
+
+# Upper bound on cells used to cover a query box
+MAX_COVER_CELLS = 32
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _bits(precision: int) -> Tuple[int, int]:
+    """(latitude bits, longitude bits) of a geohash of ``precision`` chars."""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def _cell_index(lat: float, lng: float, precision: int) -> Tuple[int, int]:
+    lat_bits, lng_bits = _bits(precision)
+    lat_i = int((lat + 90.0) / 180.0 * (1 << lat_bits))
+    lng_i = int((lng + 180.0) / 360.0 * (1 << lng_bits))
+    return min(max(lat_i, 0), (1 << lat_bits) - 1), min(max(lng_i, 0), (1 << lng_bits) - 1)
+
+
+def _encode_index(lat_i: int, lng_i: int, precision: int) -> str:
+    lat_bits, lng_bits = _bits(precision)
+    value = 0
+    # Bits alternate longitude, latitude, longitude, ... from the top
+    for position in range(5 * precision):
+        if position % 2 == 0:
+            lng_bits -= 1
+            bit = (lng_i >> lng_bits) & 1
+        else:
+            lat_bits -= 1
+            bit = (lat_i >> lat_bits) & 1
+        value = (value << 1) | bit
+    return "".join(
+        BASE32[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision)
+    )
+
+
+def encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash of a point."""
+    return _encode_index(*_cell_index(lat, lng, precision), precision)
+
+
+def neighbourhood(lat: float, lng: float, precision: int) -> List[str]:
+    """The cell containing a point plus its (up to) eight neighbours."""
+    lat_bits, lng_bits = _bits(precision)
+    lat_i, lng_i = _cell_index(lat, lng, precision)
+    return [
+        _encode_index(row, column % (1 << lng_bits), precision)
+        for row in range(max(lat_i - 1, 0), min(lat_i + 1, (1 << lat_bits) - 1) + 1)
+        for column in (lng_i - 1, lng_i, lng_i + 1)
+    ]
+
+
+def next_prefix(prefix: str) -> Optional[str]:
+    """Smallest geohash string sorting after every string starting with ``prefix``.
+
+    Returns None when no such string exists (``prefix`` is all ``z``).
+    """
+    while prefix:
+        position = BASE32.index(prefix[-1])
+        if position < len(BASE32) - 1:
+            return prefix[:-1] + BASE32[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def longitude_spans(min_lng: float, max_lng: float) -> List[Tuple[float, float]]:
+    """Split a longitude range into spans that do not cross the antimeridian.
+
+    ``min_lng > max_lng`` means the range crosses it, as in GeoJSON bboxes.
+    """
+    if min_lng <= max_lng:
+        return [(min_lng, max_lng)]
+    return [(min_lng, 180.0), (-180.0, max_lng)]
+
+
+def cover_bbox(min_lat: float, min_lng: float, max_lat: float, max_lng: float,
+               max_cells: int = MAX_COVER_CELLS) -> List[Tuple[str, Optional[str]]]:
+    """Cover a box with geohash cells as merged ``[start, end)`` string ranges.
+
+    Picks the finest precision whose covering needs at most ``max_cells``
+    cells; cells that are adjacent in geohash order collapse into one range.
+    ``end`` is None for a range that runs to the end of the keyspace. A box
+    with ``min_lng > max_lng`` crosses the antimeridian and is covered on
+    both sides; latitudes are clamped to the poles.
+    """
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    spans = longitude_spans(min_lng, max_lng)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        blocks = [
+            (_cell_index(min_lat, west, precision), _cell_index(max_lat, east, precision))
+            for west, east in spans
+        ]
+        count = sum((lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1)
+                    for (lat_lo, lng_lo), (lat_hi, lng_hi) in blocks)
+        if count <= max_cells:
+            break
+
+    cells = sorted({
+        _encode_index(lat_i, lng_i, precision)
+        for (lat_lo, lng_lo), (lat_hi, lng_hi) in blocks
+        for lat_i in range(lat_lo, lat_hi + 1)
+        for lng_i in range(lng_lo, lng_hi + 1)
+    })
+
+    ranges = []
+    for cell in cells:
+        end = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((cell, end))
+    return ranges
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def bbox_around(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """``(min_lat, min_lng, max_lat, max_lng)`` enclosing a circle.
+
+    Near the antimeridian the box wraps (``min_lng > max_lng``); a circle
+    that reaches a pole gets every longitude.
+    """
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+
+    # Widest longitude offset on the circle (not at its centre latitude)
+    ratio = math.sin(radius_m / EARTH_RADIUS_M) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return min_lat, -180.0, max_lat, 180.0
+    d_lng = math.degrees(math.asin(ratio))
+    min_lng, max_lng = lng - d_lng, lng + d_lng
+    if min_lng < -180.0:
+        min_lng += 360.0
+    if max_lng > 180.0:
+        max_lng -= 360.0
+    return min_lat, min_lng, max_lat, max_lng
@@ -0,0 +1,257 @@
+"""Per-route request metrics, Prometheus export and on-demand profiling.
+
+``InstrumentationMiddleware`` times every HTTP request and, through the SQL
+hooks in ``app.utils.metrics``, counts the statements, rows and database time
+it caused. Metrics are keyed by method and route template
+(``/api/reports/{report_id}``), never the raw path, so label cardinality
+stays bounded. ``render_prometheus`` serves them on ``/metrics``; latency
+percentiles come from the histograms via ``histogram_quantile``.
+
+An admin can profile a single request by adding ``?profile=1`` or an
+``X-Profile: 1`` header: the request runs normally under
+``SamplingProfiler`` and the response body is replaced by collapsed stacks.
+For anyone else the flag is ignored and the request is served as usual.
+The event loop thread is what gets sampled, so work other requests do
+concurrently shows up too; profile on a quiet instance.
+"""
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl
+
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import Headers
+from starlette.routing import Match
+
+from app.database import AsyncSessionLocal
+from app.utils import metrics
+from app.utils.auth_context import ADMIN_ROLES, principal_from_claims, resolve_role
+from app.utils.metrics import POOL_METRICS, Histogram, QueryStats, current_query_stats
+from app.utils.profiler import SamplingProfiler
+from app.utils.response_cache import response_cache
+from app.utils.security import verify_token
+
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_time = Histogram()
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.responses: Dict[int, int] = {}
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status_code: int, duration: float,
+               stats: QueryStats, streaming: bool = False):
+        with self._lock:
+            route_metrics = self._routes.get((method, route))
+            if route_metrics is None:
+                route_metrics = self._routes[(method, route)] = RouteMetrics()
+            route_metrics.responses[status_code] = route_metrics.responses.get(status_code, 0) + 1
+        # An SSE stream lasts as long as the client stays; keep it out of latency
+        if not streaming:
+            route_metrics.duration.observe(duration)
+        route_metrics.db_time.observe(stats.db_time)
+        route_metrics.statements.observe(stats.statements)
+        route_metrics.rows.observe(stats.rows)
+
+    def items(self) -> List[Tuple[Tuple[str, str], RouteMetrics]]:
+        with self._lock:
+            return sorted(self._routes.items())
+
+
+REQUEST_METRICS = RequestMetrics()
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        # Answered before routing (e.g. a response cache hit): match it here
+        for candidate in scope["app"].router.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _wants_profile(scope, headers: Headers) -> bool:
+    if headers.get("x-profile") == "1":
+        return True
+    return ("profile", "1") in parse_qsl(scope["query_string"].decode("latin-1"))
+
+
+async def _is_admin(headers: Headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    payload = verify_token(token)
+    principal = principal_from_claims(payload) if payload else None
+    if principal is None:
+        return False
+    async with AsyncSessionLocal() as db:
+        return await resolve_role(db, principal.user_id) in ADMIN_ROLES
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if _wants_profile(scope, headers) and await _is_admin(headers):
+            return await self._profile(scope, receive, send)
+
+        stats = QueryStats(path=scope["path"])
+        token = current_query_stats.set(stats)
+        status_code = 500
+        streaming = False
+
+        async def instrumented_send(message):
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message.get("headers", [])).get("content-type", "")
+                streaming = content_type.startswith("text/event-stream")
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            current_query_stats.reset(token)
+            REQUEST_METRICS.record(
+                scope["method"], _route_label(scope), status_code,
+                time.perf_counter() - started, stats, streaming,
+            )
+
+    async def _profile(self, scope, receive, send):
+        stats = QueryStats(path=scope["path"])
+        token = current_query_stats.set(stats)
+        status_code = 500
+
+        async def discard_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        started = time.perf_counter()
+        try:
+            with SamplingProfiler() as profiler:
+                await self.app(scope, receive, discard_send)
+        finally:
+            current_query_stats.reset(token)
+        duration = time.perf_counter() - started
+
+        response = PlainTextResponse(profiler.collapsed(), headers={
+            "X-Profiled-Status": str(status_code),
+            "X-Profile-Samples": str(profiler.samples),
+            "X-Profile-Interval": str(profiler.interval),
+            "X-Request-Duration": f"{duration:.6f}",
+            "X-DB-Time": f"{stats.db_time:.6f}",
+            "X-DB-Statements": str(stats.statements),
+            "X-DB-Rows": str(stats.rows),
+            "Cache-Control": "no-store",
+        })
+        await response(scope, receive, send)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines: List[str] = []
+        self._declared = set()
+
+    def declare(self, name: str, metric_type: str, help_text: str):
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    def histogram(self, name: str, help_text: str, histogram: Histogram, **labels):
+        self.declare(name, "histogram", help_text)
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            self.sample(f"{name}_bucket", count, **labels, le=bound)
+        self.sample(f"{name}_sum", snapshot["sum"], **labels)
+        self.sample(f"{name}_count", snapshot["count"], **labels)
+
+
+def render_prometheus() -> str:
+    """Every in-process metric in the Prometheus text exposition format."""
+    out = _Exposition()
+
+    for (method, route), route_metrics in REQUEST_METRICS.items():
+        out.declare("http_requests_total", "counter", "HTTP responses by route and status.")
+        for status_code, count in sorted(route_metrics.responses.items()):
+            out.sample("http_requests_total", count, method=method, route=route, status=status_code)
+    for (method, route), route_metrics in REQUEST_METRICS.items():
+        out.histogram("http_request_duration_seconds", "Request latency, excluding SSE streams.",
+                      route_metrics.duration, method=method, route=route)
+    for (method, route), route_metrics in REQUEST_METRICS.items():
+        out.histogram("http_request_db_seconds", "Time spent executing SQL per request.",
+                      route_metrics.db_time, method=method, route=route)
+    for (method, route), route_metrics in REQUEST_METRICS.items():
+        out.histogram("http_request_db_statements", "SQL statements executed per request.",
+                      route_metrics.statements, method=method, route=route)
+    for (method, route), route_metrics in REQUEST_METRICS.items():
+        out.histogram("http_request_db_rows", "Rows returned or affected per request.",
+                      route_metrics.rows, method=method, route=route)
+
+    out.declare("db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.")
+    out.sample("db_slow_queries_total", metrics.slow_queries)
+
+    gauges = {
+        "size": "Configured pool size.",
+        "in_use": "Connections checked out.",
+        "checked_in": "Idle connections in the pool.",
+        "overflow": "Connections open beyond the pool size.",
+    }
+    counters = {
+        "checkouts": "Connection checkouts.",
+        "timeouts": "Checkouts that timed out waiting for a connection.",
+        "connects": "New DBAPI connections opened.",
+        "invalidations": "Connections invalidated after errors.",
+    }
+    pools = sorted((name, pool_metrics, pool_metrics.snapshot()) for name, pool_metrics in POOL_METRICS.items())
+    for key, help_text in gauges.items():
+        for pool_name, _, snapshot in pools:
+            if key in snapshot:
+                out.declare(f"db_pool_{key}", "gauge", help_text)
+                out.sample(f"db_pool_{key}", snapshot[key], pool=pool_name)
+    for key, help_text in counters.items():
+        for pool_name, _, snapshot in pools:
+            out.declare(f"db_pool_{key}_total", "counter", help_text)
+            out.sample(f"db_pool_{key}_total", snapshot[key], pool=pool_name)
+    for pool_name, pool_metrics, _ in pools:
+        out.histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pool connection.",
+                      pool_metrics.wait_time, pool=pool_name)
+
+    cache_stats = response_cache.stats.snapshot()
+    for key in ("hits", "misses", "not_modified", "bypassed", "stores", "invalidations"):
+        out.declare(f"response_cache_{key}_total", "counter", f"Response cache {key.replace('_', ' ')}.")
+        out.sample(f"response_cache_{key}_total", cache_stats[key])
+
+    return "\n".join(out.lines) + "\n"
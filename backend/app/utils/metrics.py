@@ -0,0 +1,179 @@
+"""In-process metric primitives, connection pool and SQL instrumentation."""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, tuned for waits/latencies between 1 ms and 10 s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements slower than this are logged with the route that issued them
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram (Prometheus style, cumulative)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+
+class PoolMetrics:
+    """Counters for one engine's connection pool."""
+
+    def __init__(self):
+        self.wait_time = Histogram()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pool: Optional[Pool] = None
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        state = {}
+        if pool is not None and hasattr(pool, "checkedout"):
+            state = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "in_use": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+            }
+        return {
+            **state,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "checkout_wait_seconds": self.wait_time.snapshot(),
+        }
+
+
+POOL_METRICS: Dict[str, PoolMetrics] = {}
+
+
+def instrumented_pool(pool_class, name: str):
+    """Return a subclass of ``pool_class`` that records into ``POOL_METRICS[name]``.
+
+    Checkout wait time is measured around ``_do_get``, i.e. including the
+    time spent blocked on an exhausted pool. The subclass survives
+    ``Pool.recreate()`` (engine dispose) since it is the instance's class.
+    """
+    metrics = POOL_METRICS.setdefault(name, PoolMetrics())
+
+    class InstrumentedPool(pool_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.pool = self
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                metrics.increment("timeouts")
+                raise
+            finally:
+                metrics.wait_time.observe(time.perf_counter() - started)
+            metrics.increment("checkouts")
+            return connection
+
+        def _create_connection(self):
+            metrics.increment("connects")
+            return super()._create_connection()
+
+        def _invalidate(self, connection, exception=None, _checkin=True):
+            metrics.increment("invalidations")
+            return super()._invalidate(connection, exception, _checkin)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+
+@dataclass
+class QueryStats:
+    """SQL work done on behalf of one request."""
+    path: str = "-"
+    statements: int = 0
+    rows: int = 0
+    db_time: float = 0.0
+
+
+# Set by the request instrumentation middleware; unset for CLI tools and workers
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+slow_queries = 0
+
+
+def _rows_of(cursor) -> int:
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        return cursor.rowcount
+    # asyncpg / aiosqlite adapters buffer the whole result on execute, while
+    # DB-API drivers report -1 for SELECTs
+    return len(getattr(cursor, "_rows", None) or ())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global slow_queries
+    elapsed = time.perf_counter() - context.query_started
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.rows += _rows_of(cursor)
+        stats.db_time += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries += 1
+        logger.warning(
+            "Slow query (%.1f ms, request %s): %s",
+            elapsed * 1000, stats.path if stats else "-", " ".join(statement.split())[:500],
+        )
+
+
+def instrument_engine(engine: Engine):
+    """Count statements, rows and time per request and log slow statements.
+
+    For an ``AsyncEngine`` pass its ``sync_engine``; the async drivers run
+    cursor calls inside the calling task's context, so the per-request
+    ``current_query_stats`` is visible to the hooks.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
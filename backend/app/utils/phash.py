@@ -0,0 +1,81 @@
+"""64-bit difference hashes (dHash) and multi-index Hamming search helpers.
+
+A dHash compares each pixel of a 9x8 grayscale thumbnail with its right
+neighbour, so recompression, resizing and small exposure changes flip only
+a few of its 64 bits. Near-duplicates are found with multi-index hashing:
+the hash is split into ``SEGMENTS`` 16-bit segments, and two hashes within
+Hamming distance ``k`` agree to within ``k // SEGMENTS`` bits on at least
+one segment (pigeonhole), so candidates come from exact lookups of a few
+segment values instead of comparisons against every stored hash.
+
+Flat or smoothly shaded images (a wall, the sky, a black frame) hash to
+nearly all zeros or all ones whatever they show, so ``low_information``
+lets callers skip them rather than match unrelated pictures.
+"""
+from itertools import combinations
+from typing import List, Tuple
+
+from PIL import Image, ImageStat
+
+HASH_BITS = 64
+SEGMENTS = 4
+SEGMENT_BITS = HASH_BITS // SEGMENTS
+SEGMENT_MASK = (1 << SEGMENT_BITS) - 1
+
+
+def _thumbnail(image: Image.Image) -> Image.Image:
+    return image.convert("L").resize((9, 8), Image.BILINEAR)
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash of an image; decoding and orientation are up to the caller."""
+    pixels = _thumbnail(image).tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for column in range(8):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def low_information(image: Image.Image, value: int, min_stddev: float, min_bits: int) -> bool:
+    """Whether ``image`` (with dHash ``value``) is too flat for its hash to identify it.
+
+    True when the thumbnail's grayscale standard deviation is below
+    ``min_stddev`` or the hash has fewer than ``min_bits`` set (or unset) bits.
+    """
+    set_bits = bin(value).count("1")
+    if not min_bits <= set_bits <= HASH_BITS - min_bits:
+        return True
+    return ImageStat.Stat(_thumbnail(image)).stddev[0] < min_stddev
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+def segments(value: int) -> Tuple[int, ...]:
+    """The hash as ``SEGMENTS`` integers, most significant first."""
+    return tuple(
+        (value >> (SEGMENT_BITS * (SEGMENTS - 1 - i))) & SEGMENT_MASK for i in range(SEGMENTS)
+    )
+
+
+def segment_probes(segment: int, radius: int) -> List[int]:
+    """Every segment value within ``radius`` bits of ``segment``."""
+    probes = [segment]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(SEGMENT_BITS), distance):
+            flipped = segment
+            for bit in bits:
+                flipped ^= 1 << bit
+            probes.append(flipped)
+    return probes
@@ -0,0 +1,58 @@
+"""Sampling profiler producing collapsed stacks for flamegraphs.
+
+A background thread snapshots another thread's Python stack every
+``interval`` seconds via ``sys._current_frames``; the profiled code runs
+unmodified, so overhead stays low even at 1 ms. ``collapsed()`` returns
+one ``outer;inner;leaf count`` line per distinct stack, the input format of
+flamegraph.pl, speedscope and inferno.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+# Stop sampling after this many seconds so a stuck request cannot run forever
+PROFILE_MAX_DURATION = float(os.getenv("PROFILE_MAX_DURATION", "30"))
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples ``thread_id`` (default: the calling thread) while in a ``with`` block."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL,
+                 max_duration: float = PROFILE_MAX_DURATION):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_samples = int(max_duration / interval)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
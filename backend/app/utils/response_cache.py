@@ -0,0 +1,330 @@
+"""Response cache for public, caller-independent GET endpoints.
+
+``ResponseCacheMiddleware`` serves ``CACHED_ROUTES`` from a cache keyed on
+the path plus the route's query parameters with their defaults filled in,
+so ``?limit=50`` and no ``limit`` share an entry. Entries expire after
+``RESPONSE_CACHE_TTL`` seconds and are dropped at once when
+``response_cache.invalidate()`` runs (after a report is submitted or
+verified): keys embed a generation number that invalidation bumps, which
+works the same for every backend.
+
+Every cached response carries a strong ETag; ``If-None-Match`` gets a 304
+without a body. Requests with an ``Authorization`` header bypass the cache,
+since they may see personalised data (the leaderboard's ``user_rank``).
+
+Backends: ``memory`` (per-process LRU, the default) and ``shared`` (a
+Redis-compatible store at ``RESPONSE_CACHE_URL``; without a URL a local
+in-process stand-in with the same interface is used). Only a shared store
+at a URL carries an invalidation to other processes, so job workers, which
+invalidate the rankings they recompute, refuse to start without one.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Cached paths -> {query parameter: default}; other parameters are ignored
+CACHED_ROUTES: Dict[str, Dict[str, str]] = {
+    "/api/shame/top-offenders": {"limit": "50", "vehicle_type": "all", "time_range": "30"},
+    "/api/shame/leaderboard": {"limit": "100", "page": "1", "period": "all"},
+    "/api/shame/trends": {"time_range": "30", "interval": "day", "location": "", "violation_type": "all"},
+}
+
+GENERATION_KEY = "response-cache:generation"
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+
+    def dumps(self) -> bytes:
+        meta = {
+            "status": self.status,
+            "etag": self.etag,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedResponse":
+        meta, body = data.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(
+            status=meta["status"],
+            headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in meta["headers"]],
+            body=body,
+            etag=meta["etag"],
+        )
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, response = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    async def set(self, key: str, response: CachedResponse, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+            # Old generations can never be read again
+            self._entries.clear()
+
+
+class LocalSharedStore:
+    """In-process stand-in for a Redis client (``get``/``set(ex=)``/``incr``)."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (None, b"0"))
+            value = int(value) + 1
+            self._data[key] = (None, str(value).encode())
+            return value
+
+
+class SharedBackend:
+    """Cache in a store shared by every worker, e.g. Redis.
+
+    The client is blocking, so calls run in the default executor.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _call(self, method, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: method(*args, **kwargs))
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        data = await self._call(self.client.get, key)
+        return CachedResponse.loads(data) if data else None
+
+    async def set(self, key: str, response: CachedResponse, ttl: float):
+        await self._call(self.client.set, key, response.dumps(), ex=max(int(ttl), 1))
+
+    async def generation(self) -> int:
+        value = await self._call(self.client.get, GENERATION_KEY)
+        return int(value) if value else 0
+
+    async def bump_generation(self):
+        await self._call(self.client.incr, GENERATION_KEY)
+
+
+def _shared_client():
+    if not RESPONSE_CACHE_URL:
+        return LocalSharedStore()
+    try:
+        import redis
+    except ImportError as exc:
+        raise RuntimeError("RESPONSE_CACHE_URL needs the redis package (pip install redis)") from exc
+    return redis.Redis.from_url(RESPONSE_CACHE_URL)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+        # One in-flight computation per key; concurrent misses wait for it
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def cache_key(self, path: str, query_string: bytes) -> Optional[str]:
+        defaults = CACHED_ROUTES.get(path)
+        if defaults is None:
+            return None
+        params = dict(parse_qsl(query_string.decode("latin-1")))
+        # Values are kept verbatim: the routes match them case-sensitively
+        normalized = {name: params.get(name) or default for name, default in defaults.items()}
+        return f"{path}?{urlencode(sorted(normalized.items()))}"
+
+    @property
+    def reaches_other_processes(self) -> bool:
+        """Whether ``invalidate`` here also drops what other processes cached."""
+        return isinstance(self.backend, SharedBackend) and not isinstance(self.backend.client, LocalSharedStore)
+
+    async def invalidate(self):
+        self.stats.invalidations += 1
+        await self.backend.bump_generation()
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(headers: Headers, etag: str) -> bool:
+    header = headers.get("if-none-match")
+    if not header:
+        return False
+    # No "*": it matches any current representation, and every cached
+    # response is one, so a client could turn any GET into a 304
+    return etag in {candidate.strip() for candidate in header.split(",")}
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware; anything that is not a cacheable GET passes straight through."""
+
+    def __init__(self, app, cache: "ResponseCache"):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        key = self.cache.cache_key(scope["path"], scope["query_string"])
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        stats = self.cache.stats
+        if "authorization" in headers:
+            stats.bypassed += 1
+            return await self.app(scope, receive, send)
+
+        key = f"{await self.cache.backend.generation()}:{key}"
+        cached = await self.cache.backend.get(key)
+        if cached is None and key in self.cache._inflight:
+            await asyncio.shield(self.cache._inflight[key])
+            cached = await self.cache.backend.get(key)
+
+        if cached is not None:
+            stats.hits += 1
+            return await self._send(cached, headers, send, b"HIT")
+
+        stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.cache._inflight[key] = future
+        try:
+            response = await self._capture(scope, receive)
+            if response.status == 200:
+                await self.cache.backend.set(key, response, self.cache.ttl)
+                stats.stores += 1
+        finally:
+            del self.cache._inflight[key]
+            future.set_result(None)
+        await self._send(response, headers, send, b"MISS")
+
+    async def _capture(self, scope, receive) -> CachedResponse:
+        start = {}
+        chunks = []
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture_send)
+        body = b"".join(chunks)
+        response_headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"etag", b"cache-control")
+        ]
+        return CachedResponse(start["status"], response_headers, body, _etag(body))
+
+    async def _send(self, response: CachedResponse, request_headers: Headers, send, cache_status: bytes):
+        validators = [
+            (b"etag", response.etag.encode()),
+            # Clients may reuse their copy but must revalidate (cheap 304) first
+            (b"cache-control", b"no-cache"),
+            (b"x-cache", cache_status),
+        ]
+        if response.status == 200 and _etag_matches(request_headers, response.etag):
+            self.cache.stats.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = response.headers + [(b"content-length", str(len(response.body)).encode())]
+        if response.status == 200:
+            headers += validators
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
+
+
+def _build_backend():
+    if RESPONSE_CACHE_BACKEND == "shared":
+        return SharedBackend(_shared_client())
+    return MemoryBackend()
+
+
+response_cache = ResponseCache(_build_backend())
@@ -1,10 +1,14 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from app.utils.auth_context import Principal, principal_from_claims
 
 load_dotenv()
 
@@ -13,7 +17,19 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism while the
+# event loop keeps serving other requests. Requests beyond workers + queue
+# depth are rejected with 503 instead of piling up behind a login burst.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "32"))
+
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_jobs = {"in_flight": 0}
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 def hash_password(password: str) -> str:
@@ -26,6 +42,33 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def _run_password_job(func, *args):
+    """Run a bcrypt call on the bounded worker pool, or fail fast with 503."""
+    if _password_jobs["in_flight"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_DEPTH:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    _password_jobs["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_jobs["in_flight"] -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the password worker pool."""
+    return await _run_password_job(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password worker pool."""
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -48,8 +91,8 @@ def verify_token(token: str) -> dict:
         return None
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get the current authenticated user from the Bearer token."""
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    """Get the current authenticated principal from the Bearer token."""
     token = credentials.credentials
     payload = verify_token(token)
 
@@ -59,11 +102,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials",
         )
 
-    user_id = payload.get("sub")
-    if user_id is None:
+    principal = principal_from_claims(payload)
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
         )
 
-    return user_id
+    return principal
+
+
+async def get_optional_user(
+    credentials: HTTPAuthorizationCredentials = Depends(optional_security),
+) -> Optional[Principal]:
+    """Return the authenticated principal, or None for anonymous requests."""
+    if credentials is None:
+        return None
+
+    payload = verify_token(credentials.credentials)
+    if payload is None:
+        return None
+
+    return principal_from_claims(payload)
@@ -0,0 +1,17 @@
+"""Portable SQL helpers for the PostgreSQL and SQLite backends."""
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def upsert_insert(db: AsyncSession):
+    """Return the dialect specific INSERT construct supporting ON CONFLICT."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def greatest(current, incoming):
+    """Portable GREATEST() that ignores NULLs (SQLite has no GREATEST)."""
+    current = func.coalesce(current, incoming)
+    return case((current < incoming, incoming), else_=current)
@@ -0,0 +1,300 @@
+"""Streaming, size-capped reception of uploaded media files.
+
+``RequestSizeLimitMiddleware`` turns away bodies over ``MAX_REQUEST_SIZE``
+before they are read, from their Content-Length when one is declared.
+Routes built with ``streaming_upload_route`` then parse multipart bodies
+straight off the request stream: each file part goes chunk by chunk into
+a temporary file in the media temp directory, hashed with SHA-256 on the
+way through, and the request fails with 413 as soon as a file crosses
+``MAX_UPLOAD_SIZE`` or with 415 once its leading magic bytes show an
+unsupported type, so nothing is spooled anywhere else first. The file type
+is taken from those magic bytes rather than the client supplied filename.
+The caller moves the temporary file into its final place (see
+``app.services.media``).
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData, Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import parse_options_header
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Matches MAX_UPLOAD_SIZE in lib/ml/constants.ts
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", "52428800"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Whole request bodies, so a batch can carry a few full-size files
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(4 * MAX_UPLOAD_SIZE)))
+
+# Enough leading bytes for every signature in ``sniff_media_type``
+SNIFF_SIZE = 12
+
+
+@dataclass
+class ReceivedUpload:
+    temp_path: str
+    size: int
+    extension: str
+    mime_type: str
+    sha256: str
+
+    @property
+    def media_type(self) -> str:
+        return self.mime_type.split("/")[0]
+
+
+def sniff_media_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Return ``(extension, mime type)`` for a supported file header, else None.
+
+    Covers the ``ALLOWED_MIME_TYPES`` of the frontend: JPEG, PNG, WebP, MP4
+    and WebM.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg", "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png", "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    if head[4:8] == b"ftyp":
+        return "mp4", "video/mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm", "video/webm"
+    return None
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {MAX_UPLOAD_SIZE} byte upload limit"
+    )
+
+
+def _unsupported() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Unsupported file type"
+    )
+
+
+class StreamedUpload(UploadFile):
+    """A multipart file part written straight into a hashed temporary file.
+
+    Created while ``streaming_upload_route`` parses the request body;
+    ``receive_upload`` takes the finished file over instead of copying it.
+    Closing an upload nobody took removes its file.
+    """
+
+    def __init__(self, temp_dir: str, filename: Optional[str], headers: Headers):
+        super().__init__(file=None, size=0, filename=filename, headers=headers)
+        self.temp_dir = temp_dir
+        self.received: Optional[ReceivedUpload] = None
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._taken = False
+
+    async def write(self, data: bytes) -> None:
+        if self.file is None:
+            self.file = await run_in_threadpool(
+                tempfile.NamedTemporaryFile, dir=self.temp_dir, suffix=".part", delete=False
+            )
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_SIZE:
+            raise _too_large()
+        if len(self._head) < SNIFF_SIZE:
+            self._head += data[:SNIFF_SIZE - len(self._head)]
+            if len(self._head) == SNIFF_SIZE and sniff_media_type(self._head) is None:
+                raise _unsupported()
+        self._digest.update(data)
+        await run_in_threadpool(self.file.write, data)
+
+    async def seek(self, offset: int) -> None:
+        # The parser rewinds each file once its part has ended
+        if self.received is None:
+            media_type = sniff_media_type(self._head)
+            if media_type is None or self.file is None:
+                raise _unsupported()
+            await run_in_threadpool(self.file.flush)
+            self.received = ReceivedUpload(
+                temp_path=self.file.name,
+                size=self.size,
+                extension=media_type[0],
+                mime_type=media_type[1],
+                sha256=self._digest.hexdigest(),
+            )
+        await super().seek(offset)
+
+    def take(self) -> ReceivedUpload:
+        """Hand the finished file over to the caller, who now owns it."""
+        self._taken = True
+        return self.received
+
+    async def close(self) -> None:
+        if self.file is None:
+            return
+        await super().close()
+        if not self._taken:
+            await run_in_threadpool(discard_file, self.file.name)
+
+
+class _StreamingMultiPartParser(MultiPartParser):
+    def __init__(self, headers: Headers, stream, temp_dir: str, **limits):
+        super().__init__(headers, stream, **limits)
+        self.temp_dir = temp_dir
+        self.uploads = []
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is not None:
+            part.file.file.close()
+            part.file = StreamedUpload(self.temp_dir, part.file.filename, part.file.headers)
+            self.uploads.append(part.file)
+
+    async def parse(self) -> FormData:
+        try:
+            return await super().parse()
+        except BaseException:
+            for upload in self.uploads:
+                await upload.close()
+            raise
+
+
+class _StreamingUploadRequest(Request):
+    temp_dir: Callable[[], str]
+
+    async def _get_form(self, *, max_files=1000, max_fields=1000) -> FormData:
+        content_type, _ = parse_options_header(self.headers.get("Content-Type"))
+        if self._form is None and content_type == b"multipart/form-data":
+            parser = _StreamingMultiPartParser(
+                self.headers, self.stream(), self.temp_dir(), max_files=max_files, max_fields=max_fields
+            )
+            try:
+                self._form = await parser.parse()
+            except MultiPartException as exc:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=exc.message)
+        return await super()._get_form(max_files=max_files, max_fields=max_fields)
+
+
+def streaming_upload_route(temp_dir: Callable[[], str]) -> Type[APIRoute]:
+    """Route class whose file parameters arrive as ``StreamedUpload`` objects.
+
+    ``temp_dir`` is called per request for the directory to write into;
+    put it on the destination filesystem so files can be renamed into place.
+    """
+
+    class StreamingUploadRoute(APIRoute):
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+
+            async def route_handler(request: Request):
+                request = _StreamingUploadRequest(request.scope, request.receive)
+                request.temp_dir = temp_dir
+                return await handler(request)
+
+            return route_handler
+
+    return StreamingUploadRoute
+
+
+class RequestSizeLimitMiddleware:
+    """Answer 413 for request bodies over ``MAX_REQUEST_SIZE``.
+
+    A declared Content-Length is checked before anything is read; bodies
+    sent without one are counted as they arrive.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = MAX_REQUEST_SIZE
+        detail = f"Request body exceeds the {limit} byte limit"
+        declared = Headers(scope=scope).get("content-length", "")
+        if declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def receive_upload(upload: UploadFile, temp_dir: str) -> ReceivedUpload:
+    """Stream ``upload`` into a temporary file in ``temp_dir``.
+
+    A ``StreamedUpload`` already is one and is taken over as it is. Other
+    uploads are copied, raising 413 as soon as the size limit is crossed and
+    415 for content that is not a supported image or video; partial files
+    are removed. Put ``temp_dir`` on the destination filesystem so the
+    caller can rename the file into place atomically.
+    """
+    if isinstance(upload, StreamedUpload):
+        return upload.take()
+
+    if upload.size is not None and upload.size > MAX_UPLOAD_SIZE:
+        raise _too_large()
+
+    head = await upload.read(UPLOAD_CHUNK_SIZE)
+    media_type = sniff_media_type(head)
+    if media_type is None:
+        raise _unsupported()
+    extension, mime_type = media_type
+
+    temp = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, dir=temp_dir, suffix=".part", delete=False
+    )
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise _too_large()
+            digest.update(chunk)
+            await run_in_threadpool(temp.write, chunk)
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        await run_in_threadpool(temp.close)
+    except BaseException:
+        await run_in_threadpool(_discard, temp)
+        raise
+
+    return ReceivedUpload(
+        temp_path=temp.name,
+        size=size,
+        extension=extension,
+        mime_type=mime_type,
+        sha256=digest.hexdigest(),
+    )
+
+
+def _discard(temp):
+    temp.close()
+    discard_file(temp.name)
+
+
+def discard_file(path: str):
+    """Remove a temporary file, ignoring files that are already gone."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,110 @@
+"""Request latency percentiles under concurrent load, in-process.
+
+Seeds a database, then fires ``--requests`` GETs per path with
+``--concurrency`` in flight at once through the ASGI app, so the numbers
+include the event loop, middleware and database driver but no network.
+A route that blocks the event loop shows up as a p99 far above its p50.
+
+    python -m benchmarks.api_latency --reports 20000 --concurrency 50
+
+With ``--database-url`` nothing is seeded unless ``--seed`` is given; the
+existing data and its first admin user are used.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import CENTER, database_arguments, summarize, use_database
+
+PATHS = [
+    "/api/shame/top-offenders",
+    "/api/shame/leaderboard",
+    "/api/shame/trends",
+    f"/api/reports/nearby?lat={CENTER[0]}&lng={CENTER[1]}&radius=1000",
+    "/api/admin/verify?limit=50",
+]
+
+
+async def _measure(client, path: str, headers: dict, requests: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return samples
+
+
+async def _run(args):
+    import httpx
+
+    import main
+    from app.models.models import UserRole
+    from app.utils.security import create_access_token
+
+    # An Authorization header bypasses the response cache unless --cached
+    token = create_access_token({"sub": args.admin_id, "role": UserRole.ADMIN.value})
+    headers = {} if args.cached else {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in args.paths or PATHS:
+            request_headers = {"Authorization": f"Bearer {token}"} if "/admin/" in path or "/reports/" in path \
+                else headers
+            samples = await _measure(client, path, request_headers, args.requests, args.concurrency)
+            print(summarize(path.split("?")[0], samples))
+
+
+def _prepare(args):
+    from uuid import uuid4
+
+    from app.database import Base, SessionLocal, engine
+    from app.models.models import User, UserRole
+    from app.services import hotspots, leaderboard, trends
+    from benchmarks.common import seed_reports
+
+    db = SessionLocal()
+    try:
+        if not args.seed:
+            args.admin_id = db.query(User.id).filter(User.role == UserRole.ADMIN).limit(1).scalar()
+            if args.admin_id is None:
+                raise SystemExit("No admin user in the database; pass --seed to create test data")
+            return
+        Base.metadata.create_all(bind=engine)
+        seed_reports(db, args.users, args.reports)
+        args.admin_id = str(uuid4())
+        db.add(User(id=args.admin_id, name="admin", email="admin@example.com", hashed_password="x",
+                    role=UserRole.ADMIN, total_points=0))
+        db.commit()
+        hotspots.rebuild_hotspots(db)
+        trends.rebuild_trends(db)
+        leaderboard.refresh_leaderboard(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    database_arguments(parser)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per path")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", action="store_true", help="seed test data (always on without --database-url)")
+    parser.add_argument("--cached", action="store_true", help="let public routes hit the response cache")
+    parser.add_argument("--path", dest="paths", action="append", help="path to measure (repeatable)")
+    args = parser.parse_args()
+
+    args.seed = args.seed or args.database_url is None
+    use_database(args.database_url)
+    _prepare(args)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Helpers shared by the benchmark scripts.
+
+Run each benchmark from ``backend/`` as a module, for example::
+
+    python -m benchmarks.api_latency --help
+
+Benchmarks that need a database default to a throwaway SQLite file; pass
+``--database-url`` to measure a real server instead. ``use_database``
+must run before anything from ``app`` is imported, since the engines read
+their URL at import time.
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence
+from uuid import uuid4
+
+# Bengaluru, like the frontend's default map view
+CENTER = (12.9716, 77.5946)
+
+
+def database_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--database-url", help="database to run against (default: a temp SQLite file)")
+
+
+def use_database(url: Optional[str]) -> str:
+    """Point the app at ``url``, or at a new temporary SQLite database."""
+    if url is None:
+        root = tempfile.mkdtemp(prefix="elawdiya-bench-")
+        url = f"sqlite:///{os.path.join(root, 'bench.db')}"
+        os.environ.setdefault("MEDIA_ROOT", os.path.join(root, "media"))
+    os.environ["DATABASE_URL"] = url
+    return url
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(label: str, samples_ms: Sequence[float]) -> str:
+    return (f"{label:<40} n={len(samples_ms):<6} p50={percentile(samples_ms, 0.50):8.2f} ms  "
+            f"p95={percentile(samples_ms, 0.95):8.2f} ms  p99={percentile(samples_ms, 0.99):8.2f} ms  "
+            f"max={max(samples_ms):8.2f} ms")
+
+
+def time_calls(call: Callable[[], object], repeat: int, warmup: int = 3) -> List[float]:
+    """Milliseconds per call of ``call``, after ``warmup`` untimed calls."""
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def seed_reports(db, users: int, reports: int, spread_m: float = 5000, verified_share: float = 0.8,
+                 batch_size: int = 10000, seed: int = 1) -> List[str]:
+    """Insert ``users`` reporters and ``reports`` reports around ``CENTER``.
+
+    Reports are spread uniformly over a square ``2 * spread_m`` wide, with
+    geohashes set; returns the user ids. Commits once per batch.
+    """
+    from app.models.models import Report, ReportStatus, User, UserRole
+    from app.utils import geo
+
+    rng = random.Random(seed)
+    user_ids = [str(uuid4()) for _ in range(users)]
+    db.execute(User.__table__.insert(), [
+        {"id": user_id, "name": f"reporter-{index}", "email": f"{user_id}@example.com",
+         "hashed_password": "x", "role": UserRole.USER, "total_points": rng.randrange(0, 500)}
+        for index, user_id in enumerate(user_ids)
+    ])
+    d_lat = spread_m / 111_320
+    d_lng = d_lat / max(0.01, math.cos(math.radians(CENTER[0])))
+    now = datetime.utcnow()
+    for start in range(0, reports, batch_size):
+        rows = []
+        for _ in range(min(batch_size, reports - start)):
+            lat = CENTER[0] + rng.uniform(-d_lat, d_lat)
+            lng = CENTER[1] + rng.uniform(-d_lng, d_lng)
+            verified = rng.random() < verified_share
+            rows.append({
+                "id": str(uuid4()),
+                "user_id": rng.choice(user_ids),
+                "violation_type": rng.choice(("car", "bike")),
+                "location": f"Street {rng.randrange(200)}",
+                "status": ReportStatus.VERIFIED if verified else ReportStatus.PENDING,
+                "detection_confidence": rng.random(),
+                "latitude": lat,
+                "longitude": lng,
+                "geohash": geo.encode(lat, lng),
+                "points_awarded": 10 if verified else 0,
+                "created_at": now - timedelta(minutes=rng.randrange(60 * 24 * 60)),
+            })
+        db.execute(Report.__table__.insert(), rows)
+        db.commit()
+    return user_ids
@@ -0,0 +1,85 @@
+"""Detection throughput in images per second at several batch sizes.
+
+Runs ``Detector.detect`` over ``--images`` synthetic photos per batch
+size, the way the detection worker calls it. Needs the YOLOv8 ONNX model
+(``DETECTION_MODEL_PATH``, or ``--model``); ``--stub`` replaces the model
+with a zero-cost session returning YOLOv8n-shaped output, which leaves
+only letterboxing, decoding and NMS in the measurement.
+
+    python -m benchmarks.detection_throughput --batch-size 1 --batch-size 8 --batch-size 32
+"""
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_BATCH_SIZES = (1, 8, 32)
+
+
+class _StubSession:
+    """Dynamic-batch stand-in for YOLOv8n: 80 classes, 8400 anchors."""
+
+    def __init__(self, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.template = np.concatenate([
+            rng.uniform(0, 640, (1, 4, 8400)),
+            rng.uniform(0, 0.6, (1, 80, 8400)),
+        ], axis=1).astype(np.float32)
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="images", shape=["batch", 3, 640, 640])]
+
+    def run(self, output_names, feeds):
+        return [np.repeat(self.template, len(feeds["images"]), axis=0)]
+
+
+def _detector(args):
+    from app.ml import detector
+
+    if not args.stub:
+        if not os.path.exists(args.model):
+            raise SystemExit(f"No model at {args.model}; pass --model, or --stub to skip inference")
+        return detector.Detector(args.model, args.threads)
+
+    real_session = detector.ort.InferenceSession
+    detector.ort.InferenceSession = lambda *a, **kw: _StubSession()
+    try:
+        return detector.Detector("stub.onnx")
+    finally:
+        detector.ort.InferenceSession = real_session
+
+
+def _photos(count: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def main():
+    from app.ml.config import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0: default)")
+    parser.add_argument("--stub", action="store_true", help="measure pre- and post-processing only")
+    parser.add_argument("--images", type=int, default=64, help="images per batch size")
+    parser.add_argument("--batch-size", dest="batch_sizes", type=int, action="append")
+    args = parser.parse_args()
+
+    detector = _detector(args)
+    photos = _photos(min(args.images, 8))
+    images = [photos[i % len(photos)] for i in range(args.images)]
+    for batch_size in args.batch_sizes or DEFAULT_BATCH_SIZES:
+        detector.detect(images[:batch_size])  # warm-up: buffer growth, first-run graph setup
+        started = time.perf_counter()
+        for start in range(0, len(images), batch_size):
+            detector.detect(images[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        print(f"batch {batch_size:>3}: {len(images) / elapsed:8.1f} images/s  "
+              f"({elapsed / len(images) * 1000:.2f} ms per image)")
+
+
+if __name__ == "__main__":
+    main()
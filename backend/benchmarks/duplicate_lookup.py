@@ -0,0 +1,159 @@
+"""Near-duplicate lookup latency with millions of stored hashes.
+
+Seeds ``--reports`` reports (spread over 60 days, like ``seed_reports``)
+with random perceptual hashes and their ``report_fingerprints`` rows, then
+times ``duplicates.find_duplicate`` for a new report at a random seeded
+spot: once with an unseen hash (the common case, no match) and once with a
+hash ``DUPLICATE_MAX_DISTANCE`` bits away from a report from the last hour.
+Both are timed end to end through the async session, and the candidate
+query alone is timed on a plain DBAPI cursor, which leaves out the driver's
+thread hop and building the ORM objects.
+
+    python -m benchmarks.duplicate_lookup --reports 1000000
+"""
+import argparse
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from benchmarks.common import database_arguments, summarize, time_calls, use_database
+
+
+def _prepare(args):
+    from sqlalchemy import bindparam, select, update
+
+    from app.database import Base, SessionLocal, engine
+    from app.models import models  # noqa: F401  (registers the tables)
+    from app.models.models import Report, ReportFingerprint
+    from app.services import duplicates
+    from app.utils import geo, phash
+    from benchmarks.common import seed_reports
+
+    if not args.seed:
+        return
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(2)
+    try:
+        seed_reports(db, args.users, args.reports, spread_m=args.spread)
+        last_id = ""
+        while True:
+            rows = db.execute(
+                select(Report.id, Report.latitude, Report.longitude, Report.created_at)
+                .where(Report.id > last_id).order_by(Report.id).limit(10000)
+            ).all()
+            if not rows:
+                break
+            hashes, fingerprints = [], []
+            for row in rows:
+                value = rng.getrandbits(phash.HASH_BITS)
+                hashes.append({"report_id": row.id, "phash": phash.to_hex(value)})
+                cell = geo.encode(row.latitude, row.longitude, duplicates.DUPLICATE_CELL_PRECISION)
+                fingerprints += [
+                    {"report_id": row.id, "segment": index, "value": segment, "cell": cell,
+                     "created_at": row.created_at}
+                    for index, segment in enumerate(phash.segments(value))
+                ]
+            db.connection().execute(
+                update(Report.__table__).where(Report.__table__.c.id == bindparam("report_id")),
+                hashes,
+            )
+            db.execute(ReportFingerprint.__table__.insert(), fingerprints)
+            db.commit()
+            last_id = rows[-1].id
+        # Some reports in the lookup window, so the matching case has targets
+        recent = db.scalars(select(Report.id).order_by(Report.id).limit(1000)).all()
+        now = datetime.utcnow()
+        for report_id in recent:
+            created_at = now - timedelta(minutes=rng.randrange(60))
+            db.execute(update(Report).where(Report.id == report_id).values(created_at=created_at))
+            db.execute(update(ReportFingerprint).where(ReportFingerprint.report_id == report_id)
+                       .values(created_at=created_at))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    database_arguments(parser)
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--spread", type=float, default=20000, help="half-width of the seeded square, metres")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--seed", action="store_true", help="seed test data (always on without --database-url)")
+    args = parser.parse_args()
+
+    args.seed = args.seed or args.database_url is None
+    logging.getLogger("app.utils.metrics").setLevel(logging.ERROR)
+    use_database(args.database_url)
+    _prepare(args)
+
+    from sqlalchemy import event, func, select
+
+    from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+    from app.models.models import Report, ReportFingerprint
+    from app.services import duplicates
+    from app.utils import phash
+
+    with SessionLocal() as db:
+        stored = db.scalar(select(func.count()).select_from(ReportFingerprint))
+        window = datetime.utcnow() - timedelta(hours=duplicates.DUPLICATE_WINDOW_HOURS)
+        targets = db.execute(
+            select(Report.latitude, Report.longitude, Report.phash)
+            .where(Report.created_at >= window, Report.phash.is_not(None))
+        ).all()
+    print(f"{stored} fingerprint rows, {len(targets)} reports in the lookup window")
+
+    rng = random.Random(3)
+    loop = asyncio.new_event_loop()
+    db = AsyncSessionLocal()
+
+    def unseen():
+        target = rng.choice(targets)
+        return Report(id=str(uuid4()), latitude=target.latitude, longitude=target.longitude,
+                      phash=phash.to_hex(rng.getrandbits(phash.HASH_BITS)))
+
+    def near_match():
+        target = rng.choice(targets)
+        value = phash.from_hex(target.phash)
+        for bit in rng.sample(range(phash.HASH_BITS), duplicates.DUPLICATE_MAX_DISTANCE):
+            value ^= 1 << bit
+        return Report(id=str(uuid4()), latitude=target.latitude, longitude=target.longitude,
+                      phash=phash.to_hex(value))
+
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, context, many:
+                 statements.append((statement, parameters)))
+
+    def lookup(make_report, found):
+        def call():
+            match = loop.run_until_complete(duplicates.find_duplicate(db, make_report(), datetime.utcnow()))
+            found.append(match is not None)
+            db.expunge_all()
+        return call
+
+    raw = engine.raw_connection()
+    try:
+        for label, make_report in (("no match", unseen), (f"{duplicates.DUPLICATE_MAX_DISTANCE} bits away", near_match)):
+            found = []
+            statements.clear()
+            samples = time_calls(lookup(make_report, found), args.repeat)
+            print(summarize(f"find_duplicate, {label}", samples) + f"  matched={sum(found[3:])}/{args.repeat}")
+
+            queries = iter(statements[3:])
+            cursor = raw.cursor()
+            print(summarize(f"candidate query only, {label}",
+                            time_calls(lambda: cursor.execute(*next(queries)).fetchall(), args.repeat, warmup=0)))
+            cursor.close()
+    finally:
+        raw.close()
+        loop.run_until_complete(db.close())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Microbenchmarks for the detection pre- and post-processing.
+
+Times each function in ``app.ml.ops`` against its loop version in
+``app.ml.reference``, and per-image NMS against a single IoU matrix over
+the whole batch (the approach ``batched_nms`` replaced), on
+YOLOv8n-shaped data: 640px input, 80 classes, 8400 anchors.
+
+    python -m benchmarks.ml_ops --batch-size 1 --batch-size 8 --batch-size 32
+"""
+import argparse
+
+import numpy as np
+
+from app.ml import ops, reference
+from app.ml.config import COCO_CLASS_MAP, MODEL_INPUT_SIZE, NMS_IOU_THRESHOLD
+from benchmarks.common import summarize, time_calls
+
+DEFAULT_BATCH_SIZES = (1, 8, 32)
+NAMES = [COCO_CLASS_MAP.get(class_id) for class_id in range(80)]
+
+
+def _outputs(rng, batch: int, anchors: int = 8400) -> np.ndarray:
+    # Vehicles everywhere: enough candidates per image to hit MAX_NMS_CANDIDATES
+    centres = rng.uniform(0, MODEL_INPUT_SIZE, (batch, 2, anchors))
+    sizes = rng.uniform(20, 200, (batch, 2, anchors))
+    scores = rng.uniform(0, 0.6, (batch, 80, anchors))
+    return np.concatenate([centres, sizes, scores], axis=1).astype(np.float32)
+
+
+def _global_nms(boxes, scores, groups, iou_threshold=NMS_IOU_THRESHOLD):
+    """One IoU matrix for every box of the batch, groups shifted apart."""
+    order = np.argsort(-scores, kind="stable")
+    offset = (boxes.max() + 1) * groups[order].astype(boxes.dtype)
+    overlaps = ops.box_iou(boxes[order] + offset[:, None]) > iou_threshold
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if not suppressed[i]:
+            suppressed[i + 1:] |= overlaps[i, i + 1:]
+    return order[~suppressed]
+
+
+def _candidates(rng, batch: int, per_image: int = ops.MAX_NMS_CANDIDATES):
+    corners = rng.uniform(0, 1800, (batch * per_image, 2))
+    boxes = np.concatenate([corners, corners + rng.uniform(20, 200, corners.shape)], axis=1)
+    scores = rng.uniform(0.5, 1, len(boxes))
+    groups = np.repeat(np.arange(batch), per_image)
+    return boxes.astype(np.float32), scores.astype(np.float32), groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", dest="batch_sizes", type=int, action="append")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-reference", action="store_true", help="skip the slow loop versions")
+    args = parser.parse_args()
+    rng = np.random.default_rng(1)
+
+    photo = rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    buffer = np.empty((3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), dtype=np.float32)
+    print(summarize("letterbox_into 1080p", time_calls(lambda: ops.letterbox_into(photo, buffer), args.repeat)))
+    if not args.skip_reference:
+        print(summarize("reference letterbox 1080p",
+                        time_calls(lambda: reference.letterbox(photo, MODEL_INPUT_SIZE), 1, warmup=0)))
+
+    for batch in args.batch_sizes or DEFAULT_BATCH_SIZES:
+        outputs = _outputs(rng, batch)
+        geometry = np.tile(np.array([[3.0, 0, 140, 1920, 1080]], dtype=np.float32), (batch, 1))
+        print(summarize(f"decode_batch x{batch}",
+                        time_calls(lambda: ops.decode_batch(outputs, geometry, NAMES), args.repeat)))
+        if not args.skip_reference:
+            print(summarize(f"reference decode x{batch}",
+                            time_calls(lambda: reference.decode(outputs, geometry, NAMES), 1, warmup=0)))
+
+        boxes, scores, groups = _candidates(rng, batch)
+        print(summarize(f"batched_nms x{batch} ({len(boxes)} boxes)",
+                        time_calls(lambda: ops.batched_nms(boxes, scores, groups), args.repeat)))
+        print(summarize(f"single-matrix nms x{batch}",
+                        time_calls(lambda: _global_nms(boxes, scores, groups), max(1, args.repeat // 4), warmup=1)))
+
+
+if __name__ == "__main__":
+    main()
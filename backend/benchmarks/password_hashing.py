@@ -0,0 +1,78 @@
+"""Password hashing throughput and event-loop stalls, pooled vs inline.
+
+Fires ``--calls`` hashes with ``--concurrency`` at once, first through
+``hash_password_async`` (the worker pool the auth routes use) and then
+inline on the event loop, while a ticker coroutine records how late each
+10 ms sleep wakes up. Inline hashing shows up as ticker lag roughly equal
+to one bcrypt round per waiting call; the pool keeps the lag near zero
+and turns overload into fast 503s instead.
+
+    python -m benchmarks.password_hashing --concurrency 64 --calls 256
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import summarize
+
+
+async def _ticker(stop: asyncio.Event, lag_ms: list, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms.append(max(0.0, (time.perf_counter() - started - interval) * 1000))
+
+
+async def _burst(hash_call, calls: int, concurrency: int):
+    from fastapi import HTTPException
+
+    gate = asyncio.Semaphore(concurrency)
+    samples, rejected = [], 0
+
+    async def one(n):
+        nonlocal rejected
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await hash_call(f"password-{n}")
+            except HTTPException as exc:
+                if exc.status_code != 503:
+                    raise
+                rejected += 1
+                return
+            samples.append((time.perf_counter() - started) * 1000)
+
+    stop, lag_ms = asyncio.Event(), []
+    ticker = asyncio.ensure_future(_ticker(stop, lag_ms))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return samples, rejected, elapsed, lag_ms or [0.0]
+
+
+async def _run(args):
+    from app.utils import security
+
+    async def inline(password):
+        return security.hash_password(password)
+
+    print(f"workers={security.PASSWORD_HASH_WORKERS} queue_depth={security.PASSWORD_HASH_QUEUE_DEPTH}")
+    for label, hash_call in (("pool", security.hash_password_async), ("inline", inline)):
+        samples, rejected, elapsed, lag_ms = await _burst(hash_call, args.calls, args.concurrency)
+        print(f"{label}: {len(samples) / elapsed:7.1f} hashes/s, {rejected} rejected with 503")
+        if samples:
+            print(summarize(f"{label} hash latency", samples))
+        print(summarize(f"{label} event-loop lag", lag_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Nearby and map-viewport query latency at 1M reports.
+
+Seeds ``--reports`` reports over a ``--spread`` metre square around the
+city centre, then times ``reports_near`` at several radii and
+``reports_in_bbox`` for several viewport sizes, next to the same box
+filtered on the raw coordinates only (what the query costs without a
+spatial index). On SQLite the geohash ranges are used; on PostgreSQL the
+GiST index, unless ``SPATIAL_INDEX=geohash``.
+
+    python -m benchmarks.spatial_queries --reports 1000000
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import math
+
+from benchmarks.common import CENTER, database_arguments, summarize, time_calls, use_database
+
+RADII_M = (200, 1000, 5000)
+VIEWPORTS_M = (500, 2000, 10000)
+
+
+def _prepare(args):
+    from app.database import Base, SessionLocal, engine
+    from app.models import models  # noqa: F401  (registers the tables)
+    from benchmarks.common import seed_reports
+
+    if not args.seed:
+        return
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_reports(db, args.users, args.reports, spread_m=args.spread, verified_share=0.9)
+    finally:
+        db.close()
+
+
+def _viewport(width_m: float):
+    d_lat = width_m / 2 / 111_320
+    d_lng = d_lat / math.cos(math.radians(CENTER[0]))
+    return CENTER[0] - d_lat, CENTER[1] - d_lng, CENTER[0] + d_lat, CENTER[1] + d_lng
+
+
+async def _unindexed(db, min_lat, min_lng, max_lat, max_lng, limit):
+    from sqlalchemy import select
+
+    from app.models.models import Report, ReportStatus
+
+    query = (
+        select(Report)
+        .where(Report.status == ReportStatus.VERIFIED,
+               Report.latitude.between(min_lat, max_lat),
+               Report.longitude.between(min_lng, max_lng))
+        .order_by(Report.created_at.desc(), Report.id)
+        .limit(limit)
+    )
+    return (await db.scalars(query)).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    database_arguments(parser)
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--spread", type=float, default=20000, help="half-width of the seeded square, metres")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", action="store_true", help="seed test data (always on without --database-url)")
+    args = parser.parse_args()
+
+    args.seed = args.seed or args.database_url is None
+    # The unindexed baseline (and seeding) would log as slow queries
+    logging.getLogger("app.utils.metrics").setLevel(logging.ERROR)
+    use_database(args.database_url)
+    _prepare(args)
+
+    from app.database import AsyncSessionLocal
+    from app.services import spatial
+
+    reports_near = functools.partial(spatial.reports_near, limit=50)
+    reports_in_bbox = functools.partial(spatial.reports_in_bbox, limit=501)
+    loop = asyncio.new_event_loop()
+    db = AsyncSessionLocal()
+
+    def run(coroutine_function, *call_args):
+        def call():
+            result = loop.run_until_complete(coroutine_function(db, *call_args))
+            db.expunge_all()
+            return result
+        return call
+
+    try:
+        for radius in RADII_M:
+            found = len(run(reports_near, *CENTER, radius)())
+            print(summarize(f"reports_near {radius} m ({found} rows)",
+                            time_calls(run(reports_near, *CENTER, radius), args.repeat)))
+        for width in VIEWPORTS_M:
+            box = _viewport(width)
+            found = len(run(reports_in_bbox, *box)())
+            print(summarize(f"reports_in_bbox {width} m ({found} rows)",
+                            time_calls(run(reports_in_bbox, *box), args.repeat)))
+            print(summarize(f"coordinates only {width} m",
+                            time_calls(run(_unindexed, *box, 501), max(1, args.repeat // 10), warmup=1)))
+    finally:
+        loop.run_until_complete(db.close())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
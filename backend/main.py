@@ -1,14 +1,26 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-from app.routes import auth, reports, admin, shame
+from app.routes import auth, reports, admin, shame, media
+from app.utils.instrumentation import InstrumentationMiddleware, render_prometheus
+from app.utils.metrics import POOL_METRICS
+from app.utils.response_cache import ResponseCacheMiddleware, response_cache
+from app.utils.uploads import RequestSizeLimitMiddleware
 
 app = FastAPI(title="eLAWDIYA API", version="1.0.0")
 
+# Turn away oversized bodies before any of them is read
+app.add_middleware(RequestSizeLimitMiddleware)
+
+# Cache for the public Hall of Shame rankings; inside CORS, so cached
+# responses get the CORS headers of the request they answer
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -18,11 +30,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so latency covers every other middleware (including cache hits)
+app.add_middleware(InstrumentationMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(reports.router, prefix="/api/reports", tags=["reports"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(shame.router, prefix="/api/shame", tags=["shame"])
+app.include_router(media.router, prefix="/api/media", tags=["media"])
 
 
 @app.get("/")
@@ -35,6 +51,24 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, SQL, pool and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/db")
+async def db_metrics():
+    """Connection pool usage, checkout counts and checkout wait histograms."""
+    return {name: metrics.snapshot() for name, metrics in POOL_METRICS.items()}
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Response cache hit, miss, revalidation and invalidation counts."""
+    return response_cache.stats.snapshot()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,116 @@
+"""Shared fixtures: a throwaway SQLite database and media root per test run.
+
+The environment is set before any ``app`` module is imported, since the
+engines and storage paths are read at import time. Run from ``backend/``:
+
+    python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+_ROOT = tempfile.mkdtemp(prefix="elawdiya-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_ROOT, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_ROOT, "uploads")
+os.environ["MEDIA_ROOT"] = os.path.join(_ROOT, "media")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.models.models import Job, JobStatus, User, UserRole  # noqa: E402
+from app.services import jobs  # noqa: E402
+from app.utils.security import create_access_token  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    """Every test starts from empty tables and empty in-process caches."""
+    from app.utils.auth_context import role_cache
+    from app.utils.response_cache import response_cache
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(response_cache.invalidate())
+    role_cache.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_user(db, name: str = None, role: UserRole = UserRole.USER) -> str:
+    """Insert a user directly and return an access token for them."""
+    user = User(id=str(uuid4()), name=name or f"user-{uuid4().hex[:8]}",
+                email=f"{uuid4().hex}@example.com", hashed_password="x", role=role, total_points=0)
+    db.add(user)
+    db.commit()
+    return create_access_token({"sub": user.id, "role": role.value})
+
+
+def make_report(client, token: str, **fields) -> dict:
+    data = {"violation_type": "car", "location": "MG Road", "latitude": 12.9716, "longitude": 77.5946}
+    data.update(fields)
+    response = client.post("/api/reports/", data=data, headers=auth(token))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def verify(client, admin_token: str, report_id: str, verified: bool = True):
+    response = client.post("/api/admin/verify", json={"report_id": report_id, "verified": verified},
+                           headers=auth(admin_token))
+    assert response.status_code == 200, response.text
+
+
+@contextmanager
+def count_statements():
+    """Collect the SQL statements the API's engine executes inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "after_cursor_execute", record)
+
+
+def run_due_jobs(db):
+    """Run every queued job now, as the worker would once they are due."""
+    while True:
+        due = datetime.utcnow() - timedelta(hours=1)
+        queued = db.query(Job).filter(Job.status == JobStatus.QUEUED).order_by(Job.run_at).all()
+        for offset, job in enumerate(queued):
+            job.run_at = due + timedelta(milliseconds=offset)
+        db.commit()
+        claimed = jobs.claim_jobs(db, 50)
+        if not claimed:
+            return
+        for job in claimed:
+            assert jobs.run_job(db, job)
@@ -0,0 +1,146 @@
+import json
+from datetime import datetime
+
+from conftest import auth, count_statements, make_report, make_user, run_due_jobs
+from app.models.models import Report, User, UserRole
+from app.utils.auth_context import RoleCache, role_cache
+from app.utils.security import verify_token
+
+
+def test_promoted_user_gets_admin_access_with_their_old_token(client, db):
+    token = make_user(db)
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 403
+
+    user = db.get(User, verify_token(token)["sub"])
+    user.role = UserRole.ADMIN
+    db.commit()
+
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 200
+
+
+def test_demoted_admin_loses_access(client, db):
+    token = make_user(db, role=UserRole.ADMIN)
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 200
+
+    user = db.get(User, verify_token(token)["sub"])
+    user.role = UserRole.USER
+    db.commit()
+
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 403
+
+
+def test_role_cache_is_invalidated_when_the_change_commits(client, db):
+    token = make_user(db)
+    user_id = verify_token(token)["sub"]
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 403
+
+    db.get(User, user_id).role = UserRole.ADMIN
+    db.flush()
+    # Until the commit, other sessions still see (and may re-cache) the old role
+    assert role_cache.get(user_id) == UserRole.USER
+    db.commit()
+    assert role_cache.get(user_id) is RoleCache._MISSING
+
+
+def test_rolled_back_role_change_keeps_the_cached_role(client, db):
+    token = make_user(db)
+    user_id = verify_token(token)["sub"]
+    assert client.get("/api/admin/verify", headers=auth(token)).status_code == 403
+
+    db.get(User, user_id).role = UserRole.ADMIN
+    db.rollback()
+    db.commit()
+    assert role_cache.get(user_id) == UserRole.USER
+
+
+def test_role_claim_in_the_token_does_not_grant_admin_access(client, db):
+    from app.utils.security import create_access_token
+
+    user_id = verify_token(make_user(db))["sub"]
+    claims_admin = create_access_token({"sub": user_id, "role": UserRole.ADMIN.value})
+    assert client.get("/api/admin/verify", headers=auth(claims_admin)).status_code == 403
+
+
+def _pages(client, token, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/admin/verify", params=params, headers=auth(token)).json()
+        ids.extend(report["id"] for report in body["pendingReports"])
+        cursor = body["nextCursor"]
+        if cursor is None:
+            return ids
+
+
+def test_keyset_pages_split_ties_on_created_at(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    for _ in range(7):
+        make_report(client, reporter)
+    # Every report shares one timestamp, so only the id orders them
+    tied = datetime(2026, 1, 1, 12, 0, 0)
+    db.query(Report).update({Report.created_at: tied})
+    db.commit()
+    expected = sorted(report.id for report in db.query(Report))
+
+    assert _pages(client, admin, 3) == expected
+    assert _pages(client, admin, 1) == expected
+
+    response = client.get("/api/admin/verify", params={"format": "ndjson", "limit": 2}, headers=auth(admin))
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == expected
+
+
+def test_malformed_cursor_is_rejected(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    response = client.get("/api/admin/verify", params={"cursor": "not-a-cursor"}, headers=auth(admin))
+    assert response.status_code == 400
+
+
+def _bulk(client, admin, decisions):
+    response = client.post("/api/admin/verify/bulk", headers=auth(admin), json={
+        "items": [{"report_id": report_id, "verified": verified} for report_id, verified in decisions],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_bulk_verify_applies_every_decision_once(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    first, second = make_user(db), make_user(db)
+    reports = [make_report(client, token)["id"] for token in (first, first, second, second)]
+
+    body = _bulk(client, admin, [
+        (reports[0], True), (reports[1], True), (reports[2], False),
+        (reports[3], False), (reports[3], True),  # the later decision wins
+        ("missing", True),
+    ])
+    statuses = {result["report_id"]: result["status"] for result in body["results"]}
+    assert statuses == {reports[0]: "verified", reports[1]: "verified", reports[2]: "rejected",
+                        reports[3]: "verified", "missing": "not_found"}
+    assert body["summary"]["requested"] == 6
+
+    # Repeating a decision changes nothing and awards no more points
+    again = _bulk(client, admin, [(reports[0], True)])
+    assert again["summary"]["unchanged"] == 1
+    run_due_jobs(db)
+    db.expire_all()
+    points = {user.id: user.total_points for user in db.query(User).filter(User.role == UserRole.USER)}
+    assert sorted(points.values()) == [10, 20]
+
+
+def test_bulk_verify_statement_count_does_not_grow_with_the_batch(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporters = [make_user(db) for _ in range(12)]
+    reports = [make_report(client, token)["id"] for token in reporters]
+
+    def statements_for(batch):
+        with count_statements() as statements:
+            _bulk(client, admin, [(report_id, True) for report_id in batch])
+        # Hotspot clustering places reports one at a time; status, points,
+        # ledger and aggregate writes are set-based
+        return len([statement for statement in statements if "hotspot_clusters" not in statement])
+
+    statements_for(reports[:1])  # warms the admin's cached role
+    assert statements_for(reports[1:3]) == statements_for(reports[3:])
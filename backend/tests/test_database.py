@@ -0,0 +1,90 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, event, exc, text
+
+from app import database
+from app.models.models import UserRole
+from app.utils.metrics import POOL_METRICS
+from conftest import auth, make_report, make_user, verify
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 2)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 1)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.2)
+    url = os.environ["DATABASE_URL"]
+    engine = create_engine(url, **database.pool_options(url, "exhaustion-test"))
+    yield engine, POOL_METRICS["exhaustion-test"]
+    engine.dispose()
+    del POOL_METRICS["exhaustion-test"]
+
+
+def test_exhausted_pool_times_out_and_is_counted(small_pool):
+    engine, metrics = small_pool
+    # pool_size + max_overflow connections are all the pool will hand out
+    held = [engine.connect() for _ in range(3)]
+    try:
+        for connection in held:
+            connection.execute(text("SELECT 1"))
+        snapshot = metrics.snapshot()
+        assert snapshot["in_use"] == 3
+        assert snapshot["overflow"] == 1
+
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        snapshot = metrics.snapshot()
+        assert snapshot["timeouts"] == 1
+        assert snapshot["checkouts"] == 3
+        # The failed checkout waited for the configured timeout
+        assert snapshot["checkout_wait_seconds"]["count"] == 4
+        assert snapshot["checkout_wait_seconds"]["sum"] >= 0.2
+    finally:
+        for connection in held:
+            connection.close()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+    assert metrics.snapshot()["in_use"] == 0
+
+
+def test_pool_metrics_endpoint(client):
+    response = client.get("/metrics/db")
+    assert response.status_code == 200
+    assert {"checkouts", "timeouts", "checkout_wait_seconds"} <= set(response.json()["sync"])
+
+
+def test_async_urls_map_each_backend_to_its_asyncio_driver():
+    assert database.to_async_url("sqlite:///data/test.db") == "sqlite+aiosqlite:///data/test.db"
+    assert database.to_async_url("postgresql://user:secret@db/elawdiya") == \
+        "postgresql+asyncpg://user:secret@db/elawdiya"
+    with pytest.raises(ValueError):
+        database.to_async_url("mysql://user@db/elawdiya")
+
+
+def test_request_path_never_uses_the_blocking_engine(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    sync_statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sync_statements.append(statement)
+
+    event.listen(database.engine, "after_cursor_execute", record)
+    try:
+        registered = client.post("/api/auth/register", json={
+            "name": "new", "email": "new@example.com", "password": "correct horse"})
+        assert registered.status_code == 200, registered.text
+        assert client.post("/api/auth/login", json={
+            "email": "new@example.com", "password": "correct horse"}).status_code == 200
+        report = make_report(client, reporter)
+        verify(client, admin, report["id"])
+        for path in ("/api/shame/top-offenders", "/api/shame/leaderboard", "/api/shame/trends",
+                     "/api/admin/verify", "/api/reports/"):
+            assert client.get(path, headers=auth(admin)).status_code == 200, path
+        assert client.get("/api/reports/nearby", params={"lat": 12.97, "lng": 77.59},
+                          headers=auth(reporter)).status_code == 200
+    finally:
+        event.remove(database.engine, "after_cursor_execute", record)
+    assert sync_statements == []
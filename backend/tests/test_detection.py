@@ -0,0 +1,98 @@
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.ml import detector as detector_module
+from app.models.models import MediaBlob, Report
+from app.services import detection, media
+from conftest import auth, make_user
+
+
+class StubSession:
+    """Stands in for an onnxruntime session running a two-class YOLOv8.
+
+    Every image gets one 200px "car" box in the middle of the model input,
+    with the red value at the centre pixel as its confidence, so results
+    can be traced back to the image they came from. Blank padding scores 0.
+    """
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.calls = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="images", shape=[self.batch, 3, 640, 640])]
+
+    def run(self, output_names, feeds):
+        batch = feeds["images"]
+        self.calls.append(batch.copy())
+        outputs = np.zeros((len(batch), 6, 1), dtype=np.float32)
+        outputs[:, :4, 0] = (320, 320, 200, 200)
+        outputs[:, 4, 0] = batch[:, 0, 320, 320]
+        return [outputs]
+
+
+@pytest.fixture
+def stub_detector(monkeypatch):
+    def make(batch):
+        session = StubSession(batch)
+        monkeypatch.setattr(detector_module.ort, "InferenceSession", lambda *args, **kwargs: session)
+        return detector_module.Detector(model_path="stub.onnx"), session
+    return make
+
+
+def _image(red: int) -> Image.Image:
+    return Image.new("RGB", (64, 64), (red, 40, 40))
+
+
+REDS = [160, 180, 200, 220, 240, 250]
+
+
+def test_fixed_batch_model_gets_padded_chunks(stub_detector):
+    detector, session = stub_detector(4)
+    results = detector.detect([_image(red) for red in REDS])
+
+    assert [batch.shape[0] for batch in session.calls] == [4, 4]
+    # The last chunk holds two images and two blank pads
+    assert not session.calls[1][2:].any()
+    assert [len(found) for found in results] == [1] * len(REDS)
+    assert [found[0].confidence for found in results] == pytest.approx([red / 255 for red in REDS])
+    assert {found[0].class_name for found in results} == {"car"}
+    # 200 model pixels at a 64 / 640 scale
+    assert results[0][0].width == pytest.approx(20)
+
+
+def test_dynamic_batch_model_runs_once_without_padding(stub_detector):
+    detector, session = stub_detector("batch")
+    results = detector.detect([_image(red) for red in REDS])
+
+    assert [batch.shape[0] for batch in session.calls] == [len(REDS)]
+    assert [found[0].confidence for found in results] == pytest.approx([red / 255 for red in REDS])
+
+
+def test_worker_batch_marks_every_claimed_report(client, db, stub_detector):
+    detector, session = stub_detector("batch")
+    token = make_user(db)
+    for red in (200, 240):
+        buffer = io.BytesIO()
+        _image(red).save(buffer, "PNG")
+        response = client.post("/api/reports/", data={"violation_type": "car", "location": "MG Road"},
+                               files={"image": ("photo.png", buffer.getvalue(), "image/png")},
+                               headers=auth(token))
+        assert response.status_code == 200, response.text
+    # One stored file has gone missing; its report must not stay queued
+    lost = db.query(MediaBlob).order_by(MediaBlob.content_hash).first()
+    media.get_media_backend().delete(lost.storage_key)
+
+    assert detection.process_batch(db, detector, batch_size=8) == 2
+    assert [batch.shape[0] for batch in session.calls] == [1]
+    reports = {report.image_hash: report for report in db.query(Report)}
+    assert reports[lost.content_hash].detection_confidence == 0.0
+    assert reports[lost.content_hash].detected_at is not None
+    found = next(report for content_hash, report in reports.items() if content_hash != lost.content_hash)
+    assert found.detected_class == "car"
+    assert found.detection_confidence > 0.5
+    assert detection.process_batch(db, detector) == 0
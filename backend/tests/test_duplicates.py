@@ -0,0 +1,45 @@
+import io
+import random
+
+from PIL import Image
+
+from app.models.models import Report
+from conftest import auth, make_user
+
+
+def _image(pixels) -> bytes:
+    image = Image.new("RGB", (64, 64))
+    image.putdata(pixels)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _submit(client, token, data: bytes) -> str:
+    response = client.post("/api/reports/", data={"violation_type": "car", "location": "MG Road",
+                                                  "latitude": 12.9716, "longitude": 77.5946},
+                           files={"image": ("photo.png", data, "image/png")}, headers=auth(token))
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_flat_images_are_not_linked_as_duplicates(client, db):
+    token = make_user(db)
+    white = _submit(client, token, _image([(250, 250, 250)] * 4096))
+    navy = _submit(client, token, _image([(10, 20, 90)] * 4096))
+
+    reports = {report.id: report for report in db.query(Report)}
+    assert reports[white].phash is None and reports[navy].phash is None
+    assert reports[navy].duplicate_of is None
+
+
+def test_textured_images_are_still_linked(client, db):
+    token = make_user(db)
+    rng = random.Random(7)
+    noise = [(value, value, value) for value in (rng.randrange(256) for _ in range(4096))]
+    first = _submit(client, token, _image(noise))
+    second = _submit(client, token, _image([(min(r + 3, 255),) * 3 for r, _, _ in noise]))
+
+    reports = {report.id: report for report in db.query(Report)}
+    assert reports[first].phash is not None
+    assert reports[second].duplicate_of == first
@@ -0,0 +1,109 @@
+import asyncio
+
+from app.services.events import RESYNC_FRAME, EventBus
+
+
+def _replayed(bus: EventBus, last_event_id):
+    subscription = bus.subscribe("shame", last_event_id)
+    frames = []
+    while not subscription.queue.empty():
+        frames.append(subscription.queue.get_nowait())
+    bus.unsubscribe(subscription)
+    return frames
+
+
+def test_last_event_id_outside_the_history_resyncs():
+    bus = EventBus(history_size=3)
+    assert _replayed(bus, f"{bus.epoch}-5") == [RESYNC_FRAME]  # nothing published yet
+
+    ids = [bus.publish("shame", "report.verified", {"n": n}) for n in range(5)]
+    # History now holds ids 3, 4 and 5
+    assert _replayed(bus, ids[-1]) == []
+    assert len(_replayed(bus, ids[1])) == 3
+    assert _replayed(bus, ids[0]) == [RESYNC_FRAME]  # id 2 was dropped
+    assert _replayed(bus, f"{bus.epoch}-50") == [RESYNC_FRAME]
+
+
+def test_last_event_id_from_another_epoch_resyncs():
+    before_restart = EventBus()
+    after_restart = EventBus()
+    stale = before_restart.publish("shame", "report.verified", {"n": 0})
+    after_restart.publish("shame", "report.verified", {"n": 0})
+
+    # Same sequence number, different boot: must not be taken as caught up
+    assert stale.endswith("-1")
+    assert _replayed(after_restart, stale) == [RESYNC_FRAME]
+    assert _replayed(after_restart, "1") == [RESYNC_FRAME]
+    assert _replayed(after_restart, f"{after_restart.epoch}-x") == [RESYNC_FRAME]
+
+
+def test_thousand_subscribers_receive_every_event_in_order():
+    bus = EventBus(queue_size=16, max_subscribers=1100)
+    events = 50
+
+    async def consume(stream, frames):
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        while len(frames) < events:
+            frames.append(await stream.__anext__())
+        await stream.aclose()
+
+    async def scenario():
+        fast = [bus.stream("shame", heartbeat=60) for _ in range(1000)]
+        slow = [bus.stream("shame", heartbeat=60) for _ in range(20)]
+        for stream in slow:
+            await stream.__anext__()  # subscribed, then never read again
+        received = [[] for _ in fast]
+        consumers = [asyncio.create_task(consume(stream, frames)) for stream, frames in zip(fast, received)]
+        while bus.subscriber_count < 1020:
+            await asyncio.sleep(0)
+
+        ids = []
+        for n in range(events):
+            ids.append(bus.publish("shame", "report.verified", {"n": n}))
+            if n % 10 == 9:
+                # Bursts stay within the queue size; let every fast consumer catch up
+                while min(len(frames) for frames in received) <= n:
+                    await asyncio.sleep(0)
+        await asyncio.gather(*consumers)
+
+        assert all(frames == received[0] for frames in received)
+        assert [frame.split("\n")[0] for frame in received[0]] == [f"id: {event_id}" for event_id in ids]
+        for stream in slow:
+            # The backlog of a consumer that fell behind collapses to one resync
+            assert await stream.__anext__() == RESYNC_FRAME
+            await stream.aclose()
+        assert bus.subscriber_count == 0
+
+    asyncio.run(asyncio.wait_for(scenario(), 60))  # a lost frame stalls rather than fails
+
+
+def test_stream_subscribes_only_while_streaming():
+    bus = EventBus()
+
+    async def scenario():
+        never_started = bus.stream("shame")
+        assert bus.subscriber_count == 0
+        await never_started.aclose()
+
+        stream = bus.stream("shame")
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        assert bus.subscriber_count == 1
+        await stream.aclose()
+        assert bus.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_admin_stream_does_not_hold_a_request_session():
+    from fastapi.dependencies.models import Dependant
+
+    import main
+    from app.database import get_db
+
+    def calls(dependant: Dependant):
+        for dependency in dependant.dependencies:
+            yield dependency.call
+            yield from calls(dependency)
+
+    route = next(route for route in main.app.routes if getattr(route, "path", None) == "/api/admin/events")
+    assert get_db not in set(calls(route.dependant))
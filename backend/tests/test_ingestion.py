@@ -0,0 +1,100 @@
+import hashlib
+import json
+
+from app.models.models import MediaBlob, Report
+from app.services import ingestion
+from conftest import auth, make_user
+from test_media import png, stored, temp_files
+
+
+def _post_batch(client, token, items, images=()):
+    files = [("images", (f"photo-{index}.png", data, "image/png")) for index, data in enumerate(images)]
+    response = client.post("/api/reports/batch", data={"items": json.dumps(items)},
+                           files=files or None, headers=auth(token))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _item(key, **fields):
+    return {"idempotency_key": key, "violation_type": "car", "location": "MG Road", **fields}
+
+
+def _blob(db, data: bytes) -> MediaBlob:
+    db.expire_all()
+    return db.get(MediaBlob, hashlib.sha256(data).hexdigest())
+
+
+def _race_the_original(monkeypatch):
+    """Make the next batch miss stored keys up front, as if their request had not committed yet."""
+    lookup = ingestion._existing_reports
+    calls = []
+
+    async def racing_lookup(session, user_id, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else await lookup(session, user_id, keys)
+
+    monkeypatch.setattr(ingestion, "_existing_reports", racing_lookup)
+
+
+def test_replayed_batch_maps_every_key_to_the_first_reports(client, db):
+    token = make_user(db)
+    image = png((11, 22, 33))
+    items = [_item("offline-1", image_index=0), _item("offline-2")]
+
+    first = _post_batch(client, token, items, [image])
+    before = temp_files()
+    replay = _post_batch(client, token, items, [image])
+
+    assert first["created"] == 2 and replay["created"] == 0
+    assert [result["status"] for result in replay["results"]] == ["duplicate", "duplicate"]
+    assert [result["report_id"] for result in replay["results"]] == \
+        [result["report_id"] for result in first["results"]]
+    assert db.query(Report).count() == 2
+    # The replayed image was recognised by its key before it was stored again
+    assert _blob(db, image).ref_count == 1
+    assert temp_files() == before
+
+
+def test_keys_repeated_within_a_batch_are_created_once(client, db):
+    token = make_user(db)
+
+    response = _post_batch(client, token, [_item("offline-1"), _item("offline-1", location="Elsewhere")])
+
+    assert response["created"] == 1
+    statuses = [(result["status"], result["report_id"]) for result in response["results"]]
+    assert statuses[1] == ("duplicate", statuses[0][1])
+    assert db.query(Report).one().location == "MG Road"
+
+
+def test_upload_of_a_report_that_lost_the_insert_race_is_not_stored(client, db, monkeypatch):
+    token = make_user(db)
+    original = _post_batch(client, token, [_item("offline-1")])["results"][0]["report_id"]
+    lost, kept = png((44, 55, 66)), png((77, 88, 99))
+    before = temp_files()
+
+    _race_the_original(monkeypatch)
+    response = _post_batch(client, token, [_item("offline-1", image_index=0), _item("offline-2", image_index=1)],
+                           [lost, kept])
+
+    assert [(result["status"], result["report_id"] == original) for result in response["results"]] == \
+        [("duplicate", True), ("created", False)]
+    assert db.query(Report).count() == 2
+    assert _blob(db, lost).ref_count == 0
+    assert not stored(_blob(db, lost).storage_key)
+    assert _blob(db, kept).ref_count == 1
+    assert stored(_blob(db, kept).storage_key)
+    assert temp_files() == before
+
+
+def test_upload_shared_with_a_created_report_is_kept_when_another_loses(client, db, monkeypatch):
+    token = make_user(db)
+    _post_batch(client, token, [_item("offline-1")])
+    image = png((12, 34, 56))
+
+    _race_the_original(monkeypatch)
+    response = _post_batch(client, token, [_item("offline-1", image_index=0), _item("offline-2", image_index=1)],
+                           [image, image])
+
+    assert [result["status"] for result in response["results"]] == ["duplicate", "created"]
+    assert _blob(db, image).ref_count == 1
+    assert stored(_blob(db, image).storage_key)
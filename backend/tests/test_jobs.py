@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.models import Job, JobStatus, User
+from app.services import jobs
+from conftest import make_user
+
+KIND = "test.rename"
+
+
+@pytest.fixture
+def rename_handler(monkeypatch):
+    """A handler that renames a user, recording its post-commit callbacks."""
+    committed = []
+
+    def rename(db, payload):
+        db.get(User, payload["user_id"]).name = payload["name"]
+        jobs.on_commit(db, lambda: committed.append(payload["name"]))
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, KIND, rename)
+    return committed
+
+
+def _user_id(db) -> str:
+    make_user(db, name="before")
+    return db.query(User.id).scalar()
+
+
+def _queue(db, user_id, name="after", **options) -> str:
+    job = jobs.enqueue(db, KIND, {"user_id": user_id, "name": name}, **options)
+    db.commit()
+    return job.id
+
+
+def _make_due(db, job_id):
+    db.query(Job).filter(Job.id == job_id).update({Job.run_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+
+def test_leased_job_is_hidden_until_the_lease_expires(db):
+    job_id = _queue(db, _user_id(db))
+
+    first = jobs.claim_jobs(db, visibility_timeout=60)
+    assert [job.id for job in first] == [job_id]
+    lease = first[0].lease
+    assert jobs.claim_jobs(db) == []
+
+    _make_due(db, job_id)
+    again = jobs.claim_jobs(db)
+
+    assert [job.id for job in again] == [job_id]
+    assert again[0].lease != lease
+    assert again[0].attempts == 2
+
+
+def test_worker_that_lost_its_lease_discards_its_result(db, rename_handler):
+    user_id = _user_id(db)
+    job_id = _queue(db, user_id)
+    slow, fast = SessionLocal(), SessionLocal()
+    try:
+        stale = jobs.claim_jobs(slow)[0]
+        _make_due(db, job_id)
+        reclaimed = jobs.claim_jobs(fast)[0]
+
+        # The first worker finishes late: its writes and callbacks are dropped
+        assert jobs.run_job(slow, stale) is False
+        db.expire_all()
+        assert db.get(User, user_id).name == "before"
+        assert rename_handler == []
+
+        assert jobs.run_job(fast, reclaimed) is True
+    finally:
+        slow.close()
+        fast.close()
+
+    db.expire_all()
+    assert db.get(User, user_id).name == "after"
+    assert rename_handler == ["after"]
+    job = db.get(Job, job_id)
+    assert (job.status, job.lease, job.attempts) == (JobStatus.DONE, None, 2)
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(db):
+    job_id = _queue(db, _user_id(db), max_attempts=2)
+    jobs.claim_jobs(db)
+    _make_due(db, job_id)
+    jobs.claim_jobs(db)
+    _make_due(db, job_id)
+
+    assert jobs.claim_jobs(db) == []
+    db.expire_all()
+    job = db.get(Job, job_id)
+    assert job.status == JobStatus.FAILED
+    assert job.last_error == "Lease expired on the last attempt"
+
+
+def test_failed_job_is_retried_with_backoff_then_given_up(db, monkeypatch):
+    def broken(db, payload):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, KIND, broken)
+    job_id = _queue(db, _user_id(db), max_attempts=2)
+
+    assert jobs.run_job(db, jobs.claim_jobs(db)[0]) is False
+    job = db.get(Job, job_id)
+    assert job.status == JobStatus.QUEUED and job.lease is None
+    assert job.run_at > datetime.utcnow()
+    assert "boom" in job.last_error
+    assert jobs.claim_jobs(db) == []  # not due until the backoff has passed
+
+    _make_due(db, job_id)
+    assert jobs.run_job(db, jobs.claim_jobs(db)[0]) is False
+    db.expire_all()
+    assert db.get(Job, job_id).status == JobStatus.FAILED
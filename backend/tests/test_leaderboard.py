@@ -0,0 +1,107 @@
+from conftest import auth, count_statements, make_report, make_user, run_due_jobs, verify
+from app.database import SessionLocal
+from app.models.models import Job, JobStatus, LeaderboardEntry, UserRole
+from app.services import leaderboard, tasks
+
+
+def test_leaderboard_get_never_writes(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db, name="reporter")
+    verify(client, admin, make_report(client, reporter)["id"])
+    leaderboard.refresh_leaderboard(db)
+    db.commit()
+
+    with count_statements() as statements:
+        response = client.get("/api/shame/leaderboard", headers=auth(reporter))
+    assert response.status_code == 200
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+
+    run_due_jobs(db)
+    body = client.get("/api/shame/leaderboard", headers=auth(reporter)).json()
+    assert body["user_rank"]["name"] == "reporter"
+    assert body["user_rank"]["total_points"] == 10
+
+
+def test_refresh_swaps_rows_in_one_transaction(client, db):
+    for _ in range(3):
+        make_user(db)
+    leaderboard.refresh_leaderboard(db)
+    db.commit()
+
+    make_user(db)
+    leaderboard.refresh_leaderboard(db)
+    # Other sessions keep reading the previous ranking until the swap commits
+    reader = SessionLocal()
+    try:
+        assert reader.query(LeaderboardEntry).count() == 3
+        db.commit()
+        assert reader.query(LeaderboardEntry).count() == 4
+    finally:
+        reader.close()
+
+
+def test_queued_refreshes_are_merged(client, db, monkeypatch):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    for _ in range(3):
+        verify(client, admin, make_report(client, reporter)["id"])
+        tasks.enqueue_leaderboard_refresh(db)
+        db.commit()
+    assert db.query(Job).filter(Job.kind == "leaderboard.refresh").count() == 3
+
+    leaderboard.refresh_leaderboard(db)
+    db.commit()
+    refreshes = []
+    original = leaderboard.refresh_leaderboard
+    monkeypatch.setattr(leaderboard, "refresh_leaderboard", lambda session: refreshes.append(1) or original(session))
+    run_due_jobs(db)
+
+    # One rebuild, by the refresh the points rollup queued, does the work for all
+    assert len(refreshes) == 1
+    entry = db.get(LeaderboardEntry, db.query(LeaderboardEntry.user_id).filter(LeaderboardEntry.rank == 1).scalar())
+    assert entry.total_points == 30
+
+
+def test_rollup_refreshes_the_ranking_and_cached_pages(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db, name="reporter")
+    report = make_report(client, reporter)
+    verify(client, admin, report["id"])
+    # Verification queues the rollup, which in turn queues the refresh
+    queued = {job.kind for job in db.query(Job).filter(Job.status == JobStatus.QUEUED)}
+    assert "points.rollup" in queued and "leaderboard.refresh" not in queued
+    # Cached while the points are not rolled up yet
+    before = client.get("/api/shame/leaderboard", params={"period": "week"}).json()
+    assert before["leaderboard"] == []
+
+    run_due_jobs(db)
+
+    entry = db.query(LeaderboardEntry).filter(LeaderboardEntry.rank == 1).one()
+    assert entry.total_points == 10
+    after = client.get("/api/shame/leaderboard", params={"period": "week"}).json()
+    assert after["leaderboard"][0]["total_points"] == 10
+
+
+def test_first_read_builds_an_empty_ranking(client, db):
+    reporter = make_user(db, name="reporter")
+    assert db.query(LeaderboardEntry).count() == 0
+
+    body = client.get("/api/shame/leaderboard", headers=auth(reporter)).json()
+    assert body["total"] == 1
+    assert body["leaderboard"][0]["name"] == "reporter"
+    assert db.query(LeaderboardEntry).count() == 1
+
+
+def test_ranking_only_moves_when_the_worker_runs(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db, name="reporter")
+    make_user(db, name="bystander")
+    client.get("/api/shame/leaderboard", headers=auth(reporter))
+    verify(client, admin, make_report(client, reporter)["id"])
+
+    # Built, so reads never rebuild it: the verification waits for the worker
+    body = client.get("/api/shame/leaderboard", headers=auth(reporter)).json()
+    assert body["user_rank"]["verified_count"] == 0
+    run_due_jobs(db)
+    body = client.get("/api/shame/leaderboard", headers=auth(reporter)).json()
+    assert body["user_rank"]["verified_count"] == 1
@@ -0,0 +1,207 @@
+import asyncio
+import io
+import os
+
+from fastapi import UploadFile
+from PIL import Image
+
+from app.database import AsyncSessionLocal
+from app.models.models import MediaBlob
+from app.services import media
+from conftest import auth, make_user
+
+
+def png(color=(200, 30, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="photo.png")
+
+
+def stored(blob_key: str) -> bool:
+    return media.get_media_backend().exists(blob_key)
+
+
+def temp_files() -> list:
+    return os.listdir(media.get_media_backend().temp_dir)
+
+
+def test_rolled_back_upload_leaves_no_stored_file(db):
+    async def store_and_roll_back():
+        async with AsyncSessionLocal() as session:
+            blob = await media.store_upload(session, upload(png()))
+            content_hash, key = blob.content_hash, blob.storage_key
+            await session.rollback()
+            return content_hash, key
+
+    content_hash, key = asyncio.run(store_and_roll_back())
+
+    assert not stored(key)
+    assert db.get(MediaBlob, content_hash) is None
+    assert media.sweep_media(db, grace=-1)["temp_files"] == 1
+    assert temp_files() == []
+
+
+def test_committed_upload_is_promoted(client, db):
+    before = temp_files()
+    token = make_user(db)
+    response = client.post("/api/reports/", data={"violation_type": "car", "location": "MG Road"},
+                           files={"image": ("photo.png", png(), "image/png")}, headers=auth(token))
+    assert response.status_code == 200, response.text
+
+    blob = db.query(MediaBlob).one()
+    assert blob.ref_count == 1
+    assert stored(blob.storage_key)
+    assert temp_files() == before
+
+
+def test_sweep_keeps_a_released_blob_that_was_reused(db):
+    async def store(data):
+        async with AsyncSessionLocal() as session:
+            blob = await media.store_upload(session, upload(data))
+            await session.commit()
+            await media.promote_pending(session)
+            return blob.content_hash, blob.storage_key
+
+    async def release(content_hash):
+        async with AsyncSessionLocal() as session:
+            await media.release_blob(session, content_hash)
+            await session.commit()
+
+    reused, reused_key = asyncio.run(store(png()))
+    dropped, dropped_key = asyncio.run(store(png((0, 90, 200))))
+    asyncio.run(release(reused))
+    asyncio.run(release(dropped))
+    # The same content is uploaded again before the sweep runs
+    asyncio.run(store(png()))
+
+    assert media.sweep_media(db, grace=-1)["blobs"] == 1
+    assert stored(reused_key)
+    assert db.get(MediaBlob, reused).ref_count == 1
+    assert not stored(dropped_key)
+    assert db.get(MediaBlob, dropped) is None
+
+
+def test_derivative_rejects_malformed_hashes_before_storage(client, monkeypatch):
+    from app.services import derivatives
+
+    def no_storage(*args):
+        raise AssertionError("storage was read")
+
+    monkeypatch.setattr(derivatives, "read_derivative", no_storage)
+    monkeypatch.setattr(derivatives, "generate_derivative", no_storage)
+    for content_hash in ("A" * 64, "a" * 63, "a" * 65, "..", "g" * 64, "%2E%2E%2Fsecret"):
+        response = client.get(f"/api/media/{content_hash}/thumb.webp")
+        assert response.status_code == 404, content_hash
+
+
+def _post_report(client, token, data: bytes):
+    return client.post("/api/reports/", data={"violation_type": "car", "location": "MG Road"},
+                       files={"image": ("photo.png", data, "image/png")}, headers=auth(token))
+
+
+def test_declared_oversize_body_is_rejected_before_it_is_read(client, db, monkeypatch):
+    from app.utils import uploads
+
+    def unread(*args):
+        raise AssertionError("the body was parsed")
+
+    monkeypatch.setattr(uploads, "MAX_REQUEST_SIZE", 4096)
+    monkeypatch.setattr(uploads._StreamingMultiPartParser, "parse", unread)
+    response = _post_report(client, make_user(db), png() + bytes(8192))
+
+    assert response.status_code == 413
+    assert "Request body" in response.json()["detail"]
+
+
+def test_undeclared_oversize_body_is_cut_off_while_streaming(client, db, monkeypatch):
+    from app.utils import uploads
+
+    monkeypatch.setattr(uploads, "MAX_REQUEST_SIZE", 4096)
+    before = temp_files()
+    boundary = "bound"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"photo.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode()
+
+    def body():
+        # A generator has no length, so it is sent chunked
+        yield head + png()
+        for _ in range(8):
+            yield bytes(1024)
+
+    response = client.post("/api/reports/", content=body(), headers={
+        **auth(make_user(db)), "Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+    assert temp_files() == before
+
+
+def test_oversize_file_is_rejected_mid_stream_and_cleaned_up(client, db, monkeypatch):
+    from app.utils import uploads
+
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_SIZE", 4096)
+    before = temp_files()
+    response = _post_report(client, make_user(db), png() + bytes(8192))
+
+    assert response.status_code == 413
+    assert "File exceeds" in response.json()["detail"]
+    assert temp_files() == before
+    assert db.query(MediaBlob).count() == 0
+
+
+def test_unsupported_file_is_rejected_from_its_first_bytes(client, db):
+    before = temp_files()
+    response = _post_report(client, make_user(db), b"#!/bin/sh\n" + bytes(8192))
+
+    assert response.status_code == 415
+    assert temp_files() == before
+
+
+def test_uploaded_file_is_stored_without_a_second_copy(client, db, monkeypatch):
+    from app.utils import uploads
+
+    received = []
+    original = media.receive_upload
+
+    async def spy(upload, temp_dir):
+        received.append(type(upload))
+        return await original(upload, temp_dir)
+
+    async def no_copy(*args):
+        raise AssertionError("the upload was copied")
+
+    monkeypatch.setattr(media, "receive_upload", spy)
+    monkeypatch.setattr(uploads.StreamedUpload, "read", no_copy)
+    response = _post_report(client, make_user(db), png())
+
+    assert response.status_code == 200, response.text
+    assert received == [uploads.StreamedUpload]
+    assert stored(db.query(MediaBlob).one().storage_key)
+
+
+def test_report_image_url_is_served(client, db):
+    report = _post_report(client, make_user(db), png()).json()
+    blob = db.query(MediaBlob).one()
+
+    assert report["image_url"] == f"/api/media/{blob.content_hash}/medium.webp"
+    response = client.get(report["image_url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+
+
+def test_wildcard_revalidation_is_not_answered_for_missing_media(client):
+    response = client.get(f"/api/media/{'a' * 64}/thumb.webp", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+
+def test_decompression_bomb_is_refused_when_rendering_on_demand(client, db, monkeypatch):
+    from PIL import Image
+
+    _post_report(client, make_user(db), png())
+    blob = db.query(MediaBlob).one()
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 16)
+
+    response = client.get(f"/api/media/{blob.content_hash}/thumb.webp")
+    assert response.status_code == 422
@@ -0,0 +1,67 @@
+from app.models.models import UserRole
+from conftest import auth, make_user
+
+ROUTE_SAMPLE = 'http_requests_total{method="GET",route="/api/shame/top-offenders",status="200"}'
+
+
+def _samples(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+
+
+def test_prometheus_metrics_cover_routes_pools_and_cache(client, db):
+    before = _samples(client)
+    client.get("/api/shame/top-offenders")
+    client.get("/api/shame/top-offenders", params={"limit": "10"})  # route template, not the raw URL
+
+    after = _samples(client)
+
+    assert int(after[ROUTE_SAMPLE]) - int(before.get(ROUTE_SAMPLE, 0)) == 2
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/shame/top-offenders"}' in after
+    assert 'db_pool_checkouts_total{pool="api"}' in after
+    assert int(after["response_cache_misses_total"]) - int(before["response_cache_misses_total"]) == 2
+
+
+def test_db_metrics_report_every_pool(client):
+    client.get("/api/shame/top-offenders")
+
+    pools = client.get("/metrics/db").json()
+
+    assert {"sync", "api"} <= set(pools)
+    assert pools["api"]["checkouts"] >= 1
+    assert set(pools["api"]["checkout_wait_seconds"]) == {"buckets", "count", "sum"}
+
+
+def test_cache_metrics_count_hits_and_invalidations(client, db):
+    before = client.get("/metrics/cache").json()
+    client.get("/api/shame/leaderboard")
+    client.get("/api/shame/leaderboard")
+    client.get("/api/shame/leaderboard", headers=auth(make_user(db)))
+
+    after = client.get("/metrics/cache").json()
+
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+    assert after["bypassed"] - before["bypassed"] == 1
+    assert 0 < after["hit_ratio"] <= 1
+
+
+def test_admins_can_profile_a_request(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+
+    response = client.get("/api/shame/leaderboard", params={"profile": "1"}, headers=auth(admin))
+
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+def test_profile_flag_is_ignored_for_everyone_else(client, db):
+    for headers in ({}, auth(make_user(db)), {"Authorization": "Bearer not-a-token"}):
+        response = client.get("/api/shame/leaderboard", params={"profile": "1"},
+                              headers={**headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        assert "x-profiled-status" not in response.headers
+        assert "leaderboard" in response.json()
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.ml import ops, reference
+
+NAMES = ["car", None, "bike"]
+
+
+def _outputs(rng, batch, anchors, size=64):
+    """Random YOLOv8-style output: clustered, heavily overlapping boxes."""
+    centres = rng.uniform(8, size - 8, (batch, 2, 1)).repeat(anchors, axis=2)
+    outputs = np.concatenate([
+        centres + rng.normal(0, 3, (batch, 2, anchors)),
+        rng.uniform(10, 40, (batch, 2, anchors)),
+        rng.uniform(0, 1, (batch, len(NAMES), anchors)),
+    ], axis=1)
+    return outputs.astype(np.float32)
+
+
+@pytest.mark.parametrize("shape", [(48, 64), (64, 48), (1, 1), (5, 200), (64, 64), (97, 31)])
+def test_letterbox_matches_the_reference(shape):
+    pixels = np.random.default_rng(sum(shape)).integers(0, 256, (*shape, 3), dtype=np.uint8)
+    out = np.full((3, 64, 64), np.nan, dtype=np.float32)
+
+    geometry = ops.letterbox_into(pixels, out)
+    expected, expected_geometry = reference.letterbox(pixels, 64)
+
+    assert geometry == expected_geometry
+    # Same sampled pixels; ops multiplies by 1/255 where the reference divides
+    np.testing.assert_allclose(out, expected, rtol=1e-6, atol=0)
+
+
+@pytest.mark.parametrize("batch", [1, 3, 8])
+def test_decode_batch_matches_the_reference(batch, monkeypatch):
+    rng = np.random.default_rng(batch)
+    outputs = _outputs(rng, batch, anchors=400)
+    # Padded batches carry extra rows beyond the real images
+    geometry = np.array([(rng.uniform(1, 4), rng.integers(0, 8), rng.integers(0, 8), 200, 150)
+                         for _ in range(batch - (batch > 1))], dtype=np.float32)
+    monkeypatch.setattr(ops, "MAX_NMS_CANDIDATES", 50)
+
+    decoded = ops.decode_batch(outputs, geometry, NAMES)
+    expected = reference.decode(outputs, geometry, NAMES, max_candidates=50)
+
+    assert len(decoded) == len(geometry)
+    assert sum(len(found) for found in decoded) > len(geometry)
+    for found, wanted in zip(decoded, expected):
+        np.testing.assert_allclose(found, wanted, rtol=1e-5, atol=1e-3)
+
+
+def test_batched_nms_matches_the_reference():
+    rng = np.random.default_rng(7)
+    corners = rng.uniform(0, 50, (600, 2))
+    boxes = np.concatenate([corners, corners + rng.uniform(5, 30, (600, 2))], axis=1).astype(np.float32)
+    scores = rng.uniform(0, 1, 600).astype(np.float32)
+    scores[::50] = scores[1]  # ties break towards the lower index
+    groups = rng.integers(0, 9, 600)  # unsorted on purpose
+
+    kept = ops.batched_nms(boxes, scores, groups)
+
+    assert kept.tolist() == reference.batched_nms(boxes, scores, groups)
+
+
+def test_batched_nms_never_suppresses_across_images():
+    boxes = np.array([[0, 0, 10, 10]] * 4, dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+
+    kept = ops.batched_nms(boxes, scores, np.array([0, 1, 1, 2]))
+
+    assert kept.tolist() == [0, 1, 3]
+    assert ops.batched_nms(boxes[:0], scores[:0], np.array([], dtype=int)).tolist() == []
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.models.models import UserRole
+from app.utils.response_cache import response_cache
+from conftest import auth, make_report, make_user, verify
+
+
+def test_cache_key_fills_defaults_but_keeps_values_verbatim():
+    path = "/api/shame/top-offenders"
+    assert response_cache.cache_key(path, b"") == response_cache.cache_key(path, b"limit=50&vehicle_type=")
+    assert response_cache.cache_key(path, b"vehicle_type=CAR") != response_cache.cache_key(path, b"vehicle_type=car")
+    assert response_cache.cache_key("/api/shame/trends", b"location=MG+Road") != \
+        response_cache.cache_key("/api/shame/trends", b"location=mg+road")
+
+
+def test_mixed_case_parameters_are_not_served_another_entry(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    verify(client, admin, make_report(client, make_user(db), violation_type="car")["id"])
+
+    lower = client.get("/api/shame/top-offenders", params={"vehicle_type": "car"})
+    upper = client.get("/api/shame/top-offenders", params={"vehicle_type": "CAR"})
+    assert lower.status_code == upper.status_code == 200
+    assert len(lower.json()["data"]["offenders"]) == 1
+    assert upper.json()["data"]["offenders"] == []
+
+
+def _trend_total(client) -> int:
+    response = client.get("/api/shame/trends", params={"time_range": "1"})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]["totals"]["total"]
+
+
+def test_new_reports_invalidate_cached_trends(client, db):
+    token = make_user(db)
+    assert _trend_total(client) == 0
+
+    make_report(client, token)
+    assert _trend_total(client) == 1
+
+    batch = [{"idempotency_key": "offline-1", "violation_type": "bike", "location": "MG Road"}]
+    response = client.post("/api/reports/batch", data={"items": json.dumps(batch)}, headers=auth(token))
+    assert response.status_code == 200, response.text
+    assert _trend_total(client) == 2
+
+
+def test_cached_responses_carry_the_cors_headers_of_their_own_request(client):
+    path = "/api/shame/top-offenders"
+    assert "access-control-allow-origin" not in client.get(path).headers
+
+    response = client.get(path, headers={"Origin": "http://localhost:3000"})
+    assert response.headers["x-cache"] == "HIT"
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+
+    response = client.get(path, headers={"Origin": "https://evil.example"})
+    assert response.headers["x-cache"] == "HIT"
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_wildcard_if_none_match_gets_the_full_response(client):
+    path = "/api/shame/top-offenders"
+    client.get(path)
+
+    response = client.get(path, headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "HIT"
+    assert client.get(path, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_job_workers_need_a_cache_shared_across_processes(monkeypatch):
+    from app.services import jobs
+    from app.utils.response_cache import LocalSharedStore, SharedBackend
+
+    assert not response_cache.reaches_other_processes
+    with pytest.raises(RuntimeError, match="RESPONSE_CACHE_URL"):
+        jobs.run_worker(once=True)
+
+    monkeypatch.setattr(response_cache, "backend", SharedBackend(LocalSharedStore()))
+    assert not response_cache.reaches_other_processes
+    monkeypatch.setattr(response_cache, "backend", SharedBackend(object()))
+    assert response_cache.reaches_other_processes
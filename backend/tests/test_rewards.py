@@ -0,0 +1,116 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+from app.database import AsyncSessionLocal
+from app.models.models import RewardType, User, UserPointsPeriod, UserReward
+from app.services import rewards
+
+
+def _user(db, name: str) -> str:
+    user = User(id=str(uuid4()), name=name, email=f"{uuid4().hex}@example.com",
+                hashed_password="x", total_points=0)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def _earn(db, user_id: str, points: int, when: datetime = None,
+          transaction_type: RewardType = RewardType.VERIFIED_REPORT):
+    db.add(rewards.ledger_entry(user_id, points, transaction_type, now=when or datetime.utcnow()))
+    db.commit()
+
+
+def _period_points(db) -> dict:
+    db.expire_all()
+    return {(row.user_id, row.period, row.period_start): row.points for row in db.query(UserPointsPeriod)}
+
+
+def _rank(period: str, user_id: str):
+    async def lookup():
+        async with AsyncSessionLocal() as session:
+            return await rewards.period_user_rank(session, period, user_id)
+    return asyncio.run(lookup())
+
+
+def _page(period: str, offset: int = 0, limit: int = 100):
+    async def lookup():
+        async with AsyncSessionLocal() as session:
+            return await rewards.period_page(session, period, offset, limit)
+    return asyncio.run(lookup())
+
+
+def test_rollup_counts_every_ledger_row_once(db):
+    user_id = _user(db, "reporter")
+    _earn(db, user_id, 10)
+    _earn(db, user_id, 15)
+    _earn(db, user_id, -5, transaction_type=RewardType.REDEEMED)
+
+    # Totals only move when a rollup (the worker's job) runs
+    assert db.get(User, user_id).total_points == 0
+    assert rewards.rollup_rewards(db) == 3
+    db.commit()
+    assert rewards.rollup_rewards(db) == 0
+    db.commit()
+
+    db.expire_all()
+    assert db.get(User, user_id).total_points == 20
+    # Spending points does not lower what was earned in a period
+    today = datetime.utcnow()
+    assert _period_points(db) == {
+        (user_id, period, rewards.period_start(period, today)): 25 for period in rewards.PERIODS
+    }
+
+
+def test_rollup_splits_points_by_period_start(db):
+    user_id = _user(db, "reporter")
+    sunday, monday = datetime(2026, 3, 1, 23, 30), datetime(2026, 3, 2, 0, 30)
+    _earn(db, user_id, 10, sunday)
+    _earn(db, user_id, 20, monday)
+
+    rewards.rollup_rewards(db, batch_size=1)
+    rewards.rollup_rewards(db, batch_size=1)
+    db.commit()
+
+    assert _period_points(db) == {
+        (user_id, "day", date(2026, 3, 1)): 10,
+        (user_id, "day", date(2026, 3, 2)): 20,
+        (user_id, "week", date(2026, 2, 23)): 10,
+        (user_id, "week", date(2026, 3, 2)): 20,
+        (user_id, "month", date(2026, 3, 1)): 30,
+    }
+
+
+def test_rebuild_reproduces_the_incremental_totals(db):
+    first, second = _user(db, "first"), _user(db, "second")
+    for days_ago, user_id, points in [(0, first, 10), (3, second, 15), (40, first, 5), (0, second, -10)]:
+        _earn(db, user_id, points, datetime.utcnow() - timedelta(days=days_ago),
+              RewardType.REDEEMED if points < 0 else RewardType.VERIFIED_REPORT)
+    rewards.rollup_rewards(db)
+    db.commit()
+    incremental = _period_points(db), {user.id: user.total_points for user in db.query(User)}
+
+    assert rewards.rebuild_rollups(db) == 4
+
+    assert (_period_points(db), {user.id: user.total_points for user in db.query(User)}) == incremental
+    assert db.query(UserReward).filter(UserReward.rollup_id.is_(None)).count() == 0
+
+
+def test_period_rank_agrees_with_the_page_order(db):
+    users = {name: _user(db, name) for name in ("a", "b", "c", "d")}
+    for name, points in [("a", 10), ("b", 30), ("c", 10), ("d", 20)]:
+        _earn(db, users[name], points)
+    idle = _user(db, "idle")
+    rewards.rollup_rewards(db)
+    db.commit()
+
+    page = _page("week")
+
+    assert [entry["total_points"] for entry in page] == [30, 20, 10, 10]
+    by_name = {entry["name"]: entry["rank"] for entry in page}
+    assert {name: _rank("week", user_id) for name, user_id in users.items()} == by_name
+    # Ties are broken by user id, the same way in both
+    tied = sorted(["a", "c"], key=users.get)
+    assert [by_name[name] for name in tied] == [3, 4]
+    assert _rank("week", idle) is None
+    assert [entry["rank"] for entry in _page("week", offset=2, limit=1)] == [3]
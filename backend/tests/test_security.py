@@ -0,0 +1,48 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils import security
+
+
+@pytest.fixture
+def tiny_pool(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(security, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(security, "PASSWORD_HASH_QUEUE_DEPTH", 1)
+    monkeypatch.setattr(security, "_password_executor", executor)
+    yield
+    executor.shutdown(wait=True)
+
+
+def test_saturated_password_pool_fails_fast_with_503(tiny_pool, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(security, "hash_password", lambda password: release.wait(5) and f"hashed-{password}")
+
+    async def burst():
+        # One call runs, one waits in the queue: the pool is now full
+        running = [asyncio.ensure_future(security.hash_password_async(str(n))) for n in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as rejected:
+            await security.hash_password_async("one too many")
+        release.set()
+        return rejected.value, await asyncio.gather(*running)
+
+    rejected, hashed = asyncio.run(burst())
+    assert rejected.status_code == 503
+    assert rejected.headers == {"Retry-After": "1"}
+    assert hashed == ["hashed-0", "hashed-1"]
+    assert security._password_jobs["in_flight"] == 0
+
+
+def test_login_reports_backpressure_to_the_client(client, tiny_pool, monkeypatch):
+    registered = client.post("/api/auth/register", json={"name": "a", "email": "a@example.com", "password": "pw"})
+    assert registered.status_code == 200, registered.text
+    monkeypatch.setitem(security._password_jobs, "in_flight", 2)
+
+    response = client.post("/api/auth/login", json={"email": "a@example.com", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
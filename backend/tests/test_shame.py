@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from conftest import count_statements, make_report, make_user, verify
+from app.models.models import OffenderStatistic, UserRole, ViolationCounter
+from app.database import AsyncSessionLocal
+from app.services import trends
+from app.services.hotspots import rebuild_hotspots, top_offenders, top_offenders_from_reports
+
+
+def _top_offender_statements(client) -> int:
+    # An Authorization header bypasses the response cache
+    with count_statements() as statements:
+        response = client.get("/api/shame/top-offenders", headers={"Authorization": "none"})
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_top_offenders_statement_count_does_not_grow_with_reports(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporters = [make_user(db) for _ in range(12)]
+
+    verify(client, admin, make_report(client, reporters[0])["id"])
+    baseline = _top_offender_statements(client)
+
+    for index, token in enumerate(reporters[1:], start=1):
+        report = make_report(client, token, latitude=12.9716 + index * 0.01)
+        verify(client, admin, report["id"])
+    response = client.get("/api/shame/top-offenders", headers={"Authorization": "none"})
+    assert len(response.json()["data"]["recent_activity"]) == 12
+
+    # Reporter names come from one batched lookup, not one query per report
+    assert _top_offender_statements(client) == baseline
+    assert baseline <= 10
+
+
+def _buckets(db):
+    db.expire_all()
+    return sorted(
+        (row.detected_object_type, row.bucket_date, row.total_violations, row.points_sum)
+        for row in db.query(OffenderStatistic)
+    )
+
+
+def test_rebuild_buckets_days_like_the_live_path(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    for index, violation_type in enumerate(("car", "car", "bike")):
+        report = make_report(client, reporter, violation_type=violation_type, latitude=12.9716 + index * 0.0001)
+        verify(client, admin, report["id"])
+    live = _buckets(db)
+    assert live
+
+    rebuild_hotspots(db)
+    assert _buckets(db) == live
+
+
+def test_windowed_totals_and_reporters_cover_the_same_days(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    verify(client, admin, make_report(client, make_user(db))["id"])
+    # Later the same UTC day: the report's bucket is in the window, so its reporter is too
+    start = datetime.utcnow()
+
+    async def both_modes():
+        async with AsyncSessionLocal() as session:
+            return (await top_offenders(session, 10, "all", start),
+                    await top_offenders_from_reports(session, 10, "all", start))
+
+    for result in asyncio.run(both_modes()):
+        stats = result["overall_stats"]
+        assert stats["total_verified_reports"] == 1
+        assert stats["unique_reporters"] == 1
+        assert result["offenders"][0]["statistics"]["unique_reporters"] == 1
+
+
+def test_query_mode_matches_the_aggregate(client, db, monkeypatch):
+    from app.routes import shame
+
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporters = [make_user(db) for _ in range(3)]
+    # Two places, mixed types and reporters, one rejected report that must not count
+    for index, (token, violation_type, latitude) in enumerate([
+        (reporters[0], "car", 12.9716), (reporters[1], "car", 12.9716), (reporters[1], "bike", 12.9716),
+        (reporters[2], "bike", 13.0500), (reporters[0], "bike", 13.0500),
+    ]):
+        verify(client, admin, make_report(client, token, violation_type=violation_type,
+                                          latitude=latitude + index * 0.00001)["id"])
+    verify(client, admin, make_report(client, reporters[2])["id"], verified=False)
+
+    results = {}
+    for source in ("aggregate", "query"):
+        monkeypatch.setattr(shame, "HOTSPOT_SOURCE", source)
+        response = client.get("/api/shame/top-offenders", params={"time_range": "all"},
+                              headers={"Authorization": "none"})
+        assert response.status_code == 200, response.text
+        results[source] = response.json()["data"]
+
+    assert results["query"]["offenders"] == results["aggregate"]["offenders"]
+    assert results["query"]["overall_stats"] == results["aggregate"]["overall_stats"]
+    assert results["query"]["overall_stats"]["total_verified_reports"] == 5
+    assert [offender["violation_type"] for offender in results["query"]["offenders"]] == ["car", "bike"]
+
+
+def test_trend_buckets_are_utc_aware():
+    naive = datetime(2026, 3, 1, 23, 45, 10)
+    ist = timezone(timedelta(hours=5, minutes=30))
+
+    assert trends.bucket_start("hour", naive) == datetime(2026, 3, 1, 23, tzinfo=timezone.utc)
+    # 05:15 in India is still the previous UTC day
+    assert trends.bucket_start("day", datetime(2026, 3, 2, 5, 15, tzinfo=ist)) == \
+        datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert trends.bucket_start("day", None).tzinfo == timezone.utc
+
+
+def _counters(db):
+    db.expire_all()
+    return sorted(
+        (row.granularity, trends.bucket_start(row.granularity, row.bucket_start), row.status, row.count)
+        for row in db.query(ViolationCounter)
+    )
+
+
+def test_trend_series_reports_utc_buckets_and_rebuilds_identically(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    verify(client, admin, make_report(client, reporter)["id"])
+    make_report(client, reporter)
+
+    series = client.get("/api/shame/trends", params={"time_range": "1", "interval": "hour"}).json()["data"]
+    assert all(datetime.fromisoformat(bucket["bucket"]).utcoffset() == timedelta(0) for bucket in series["series"])
+    assert (series["totals"]["total"], series["totals"]["verified"], series["totals"]["pending"]) == (2, 1, 1)
+
+    live = _counters(db)
+    trends.rebuild_trends(db)
+    assert _counters(db) == live
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.models import ReportStatus, UserRole
+from app.services import spatial
+from app.utils import geo
+from conftest import auth, count_statements, make_report, make_user, verify
+
+
+def _covered(ranges, lat, lng) -> bool:
+    cell = geo.encode(lat, lng)
+    return any(start <= cell and (end is None or cell < end) for start, end in ranges)
+
+
+def _verified(client, db, points):
+    admin, reporter = make_user(db, role=UserRole.ADMIN), make_user(db)
+    for lat, lng in points:
+        verify(client, admin, make_report(client, reporter, latitude=lat, longitude=lng)["id"])
+    return reporter
+
+
+def test_nearby_reads_only_the_requested_rows(client, db):
+    admin = make_user(db, role=UserRole.ADMIN)
+    reporter = make_user(db)
+    # 0 m, ~111 m, ... ~778 m north of the query point, then one outside the radius
+    for step in (3, 0, 7, 1, 5, 20):
+        report = make_report(client, reporter, latitude=12.9716 + step * 0.001, longitude=77.5946)
+        verify(client, admin, report["id"])
+
+    with count_statements() as statements:
+        response = client.get("/api/reports/nearby",
+                              params={"lat": 12.9716, "lng": 77.5946, "radius": 1000, "limit": 2},
+                              headers=auth(reporter))
+    assert response.status_code == 200, response.text
+
+    distances = [entry["distance_m"] for entry in response.json()["reports"]]
+    assert distances[0] == 0
+    assert 100 < distances[1] < 120
+    queries = [statement for statement in statements if "FROM reports" in statement]
+    assert len(queries) == 1
+    assert "ORDER BY" in queries[0] and "LIMIT" in queries[0]
+
+    response = client.get("/api/reports/nearby",
+                          params={"lat": 12.9716, "lng": 77.5946, "radius": 1000, "limit": 50},
+                          headers=auth(reporter))
+    assert len(response.json()["reports"]) == 5
+
+
+def test_cover_bbox_across_the_antimeridian_covers_both_sides():
+    ranges = geo.cover_bbox(-1, 179.5, 1, -179.5)
+
+    for lng in (179.6, 179.999, -180, -179.999, -179.6):
+        assert _covered(ranges, 0.5, lng), lng
+    for lng in (0, 90, 170, -170):
+        assert not _covered(ranges, 0.5, lng), lng
+    assert sum(1 for _ in ranges) <= geo.MAX_COVER_CELLS
+
+
+def test_bbox_around_wraps_at_the_antimeridian_and_opens_at_the_poles():
+    min_lat, min_lng, max_lat, max_lng = geo.bbox_around(0, 179.999, 1000)
+    assert min_lng > max_lng
+    assert min_lng == pytest.approx(179.99, abs=1e-3) and max_lng == pytest.approx(-179.992, abs=1e-3)
+
+    assert geo.bbox_around(89.995, 10, 1000) == (pytest.approx(89.986, abs=1e-3), -180.0, 90.0, 180.0)
+    assert geo.bbox_around(-89.995, 10, 1000)[1:4:2] == (-180.0, 180.0)
+    # The widest point of a circle at high latitude lies poleward of its centre
+    min_lat, min_lng, max_lat, max_lng = geo.bbox_around(89.9, 0, 5000)
+    assert max_lng == pytest.approx(26.7, abs=0.1)
+
+
+def test_map_viewport_across_the_antimeridian(client, db):
+    _verified(client, db, [(0.5, 179.9), (0.5, -179.9), (0.5, 0.0), (0.5, 179.0)])
+
+    response = client.get("/api/shame/map", params={"min_lat": 0, "min_lng": 179.5, "max_lat": 1, "max_lng": -179.5})
+    assert response.status_code == 200, response.text
+    assert sorted(v["longitude"] for v in response.json()["data"]["violations"]) == [-179.9, 179.9]
+
+    response = client.get("/api/shame/map", params={"min_lat": 1, "min_lng": 0, "max_lat": 0, "max_lng": 1})
+    assert response.status_code == 400
+
+
+def test_nearby_across_the_antimeridian(client, db):
+    reporter = _verified(client, db, [(0.0, -179.9995), (0.0, 179.99), (0.0, 179.0)])
+
+    response = client.get("/api/reports/nearby", params={"lat": 0, "lng": 179.9995, "radius": 2000},
+                          headers=auth(reporter))
+    found = [(entry["location"]["longitude"], entry["distance_m"]) for entry in response.json()["reports"]]
+    assert [lng for lng, _ in found] == [-179.9995, 179.99]
+    assert found[0][1] == pytest.approx(111.2, abs=0.5)
+
+
+def test_nearby_over_the_pole(client, db):
+    # Both ~1.1 km from the query point, on opposite sides of the pole
+    reporter = _verified(client, db, [(89.995, 0.0), (89.995, 180.0), (89.9, 0.0)])
+
+    response = client.get("/api/reports/nearby", params={"lat": 89.995, "lng": 0, "radius": 1500, "limit": 1},
+                          headers=auth(reporter))
+    assert [entry["distance_m"] for entry in response.json()["reports"]] == [0]
+
+    response = client.get("/api/reports/nearby", params={"lat": 89.995, "lng": 90, "radius": 1500},
+                          headers=auth(reporter))
+    distances = [entry["distance_m"] for entry in response.json()["reports"]]
+    assert distances == pytest.approx([786.2, 786.2], abs=1)
+
+
+def test_postgresql_queries_use_the_gist_index_expression():
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=postgresql.dialect()))
+    query = spatial._in_bbox(db, 0, 179.5, 1, -179.5, None, ReportStatus.VERIFIED)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert sql.count("point(reports.longitude, reports.latitude) <@ box(") == 2
+    assert "reports.geohash >=" not in sql